@@ -1,6 +1,15 @@
 
 import pandas as pd
+from collections import deque
 from datetime import datetime
+from pathlib import Path
+import sys
+import gl_rules
+import money
+from nav_sharding import write_journal_shards
+from nav_validator import validate_frame, warn_violations
+from posting_ledger import make_key, number_keys, split_posted
+from stage_profiler import profiled
 
 # Constants
 NAV_COLUMNS = [
@@ -9,128 +18,186 @@ NAV_COLUMNS = [
     "Amount", "Bal. Account Type", "Bal. Account No."
 ]
 
-ABBREV_MAP = {
-    "PO on-time accuracy": "PO Accuracy",
-    "Prep-Bagging": "Prep-Bagging",
-    "Shortage Claim for Invoice": "Shortage Claim",
-    "Missed Adjustment Claim for Invoice": "Missed Adjustment Claim",
-    "Ship In Own Container": "Ship in Own Container",
-    "Price Claim for Invoice": "Price Claim",
-    "PROVISION_FOR_RECEIVABLE": "Provision for Receivable",
-    "Damage Allowance": "Defective Allowance",
-    "Defective": "Defective Allowance",
-    "Co-op": "Co-op",
-    "Quantity/Bulk Buy Allowance": "Quantity/Bulk Allowance",
-    "Bulk Buy Allowance": "Quantity/Bulk Allowance"
-    "Incorrect Quantity": "Incorrect Quantity"
-}
-
-GL_ACCOUNT_MAP_NORMALIZED = {
-    "po on-time accuracy": "825000",
-    "prep-bagging": "825000",
-    "shortage claim for invoice": "486000",
-    "missed adjustment claim for invoice": "486000",
-    "ship in own container": "825000",
-    "price claim for invoice": "482100",
-    "provision_for_receivable": "109500",
-    "damage allowance": "488000",
-    "defective": "488000",
-    "co-op": "226000",
-    "quantity/bulk buy allowance": "482100",
-    "bulk buy allowance": "482100"
-    "Incorrect Quantity": "485300"
-}
+# Description patterns, G/L accounts and abbreviations: amazon section of gl_rules.json
 
 # Utility functions
-def clean_amount(value):
-    s = str(value).replace("*", "").replace(",", "").strip()
-    if s.startswith("(") and s.endswith(")"):
-        s = "-" + s[1:-1]
-    return pd.to_numeric(s, errors="coerce")
-
-def calculate_chargeback_amount(entry):
-    paid = clean_amount(entry.get("Amount Paid", 0))
-    remaining = clean_amount(entry.get("Amount Remaining", 0))
-    return paid + remaining
-
-def extract_base_description(description):
-    desc_lower = description.lower()
-    if "reverse for" in desc_lower or "reversal for" in desc_lower:
-        return None  # Explicitly exclude reversal lines
-    if "co-op" in desc_lower:
-        return "Co-op"
-    if "prep - bagging" in desc_lower or "prep-bagging" in desc_lower:
-        return "Prep-Bagging"
-    if "shortage claim for invoice" in desc_lower:
-        return "Shortage Claim for Invoice"
-    if "missed adjustment claim for invoice" in desc_lower:
-        return "Missed Adjustment Claim for Invoice"
-    if "ship in own container" in desc_lower:
-        return "Ship In Own Container"
-    if "po on-time accuracy" in desc_lower:
-        return "PO on-time accuracy"
-    if "provision_for_receivable" in desc_lower:
-        return "PROVISION_FOR_RECEIVABLE"
-    if "damage allowance" in desc_lower:
-        return "Damage Allowance"
-    if "price claim for invoice" in desc_lower:
-        return "Price Claim"
-    if "quantity/bulk buy allowance" in desc_lower:
-        return "Quantity/Bulk Buy Allowance"
-    if "bulk buy allowance" in desc_lower:
-        return "Bulk Buy Allowance"
+def extract_base_description(description, patterns=None):
+    """First matching amazon pattern's base description (None for reversals), else the text before ' - ' / ','."""
+    patterns = patterns or gl_rules.get_rules().amazon_patterns
+    k = patterns.first_match(description)
+    if k >= 0:
+        return patterns.fields["base"][k]
     if " - " in description:
         return description.split(" - ")[0].strip()
     return description.split(",")[0].strip()
 
-def extract_base_description_normalized(description):
-    base = extract_base_description(description)
+def extract_base_description_normalized(description, patterns=None):
+    base = extract_base_description(description, patterns)
     return base.strip().lower() if base else None
 
-def generate_description(payment_number, invoice_number, full_description):
-    base_desc = extract_base_description(full_description)
-    if not base_desc:
+def reversal_phrase(description, patterns=None):
+    """The reversal pattern ('reversal for' ...) that occurs in the description, else None."""
+    patterns = patterns or gl_rules.get_rules().amazon_patterns
+    text = description.lower()
+    for phrase, base in patterns.rules("base"):
+        if base is None and phrase in text:
+            return phrase
+    return None
+
+def reversal_target(description, patterns=None):
+    """
+    Normalized base description of the chargeback a reversal line reverses
+    ("Reversal for Shortage Claim for Invoice 123" -> "shortage claim for invoice"); None when
+    the line isn't a reversal or the reversed text has no category.
+    """
+    patterns = patterns or gl_rules.get_rules().amazon_patterns
+    phrase = reversal_phrase(description, patterns)
+    if phrase is None:
         return None
-    abbrev = ABBREV_MAP.get(base_desc, base_desc)
-    return f"PMT {payment_number} {invoice_number} {abbrev}"
+    rest = description[description.lower().index(phrase) + len(phrase):].strip(" :-")
+    return extract_base_description_normalized(rest, patterns) if rest else None
 
-def process_chargebacks(data, payment_number, payment_amount, posting_date):
-    rows = []
-    for entry in data:
+def net_reversals(data, amounts, bases, patterns=None):
+    """
+    Nets reversal lines against the chargebacks they reverse (linear: one pass to index, one to pair).
+    Originals - lines with a base description and a non-zero amount - are indexed by
+    (invoice number, base description) in a dict of FIFO queues; each reversal takes its amount
+    off the opposite-signed originals under its key until it is used up. '*' lines are left out
+    on both sides, as process_chargebacks never posts them.
+    Returns (net amount per line, unmatched): reversal lines get None, fully reversed originals 0;
+    unmatched has one dict per reversal (or leftover part of one) that found no original.
+    """
+    patterns = patterns or gl_rules.get_rules().amazon_patterns
+    net = list(amounts)
+    originals = {}
+    reversals = []
+    for i, (entry, amount, base) in enumerate(zip(data, amounts, bases)):
+        desc = entry.get("Description")
+        if not isinstance(desc, str) or "*" in str(entry.get("Amount Paid", "")):
+            continue
+        if pd.isna(amount) or amount == 0:
+            continue
+        invoice = str(entry.get("Invoice Number", "")).strip()
+        if base:
+            originals.setdefault((invoice, base), deque()).append(i)
+        elif reversal_phrase(desc, patterns):
+            reversals.append((i, invoice, reversal_target(desc, patterns)))
+
+    unmatched = []
+    for i, invoice, target in reversals:
+        net[i] = None
+        left = amounts[i]
+        queue = originals.get((invoice, target), deque()) if target else deque()
+        while left and queue:
+            j = queue[0]
+            if net[j] == 0 or (net[j] > 0) == (left > 0):
+                queue.popleft()
+                continue
+            applied = left if abs(left) <= abs(net[j]) else -net[j]
+            net[j] += applied
+            left -= applied
+        if left:
+            if not target:
+                reason = "reversed text has no category"
+            elif left == amounts[i]:
+                reason = "no original chargeback"
+            else:
+                reason = "exceeds the original chargeback"
+            unmatched.append({"Invoice Number": invoice, "Description": data[i]["Description"],
+                              "Category": target or "", "Reversal Amount": amounts[i],
+                              "Unmatched Amount": left, "Reason": reason})
+    # cents -> "12.34" text in one vectorized call per column
+    for col in ("Reversal Amount", "Unmatched Amount"):
+        for row, text in zip(unmatched, money.format_cents([u[col] for u in unmatched])):
+            row[col] = text
+    return net, unmatched
+
+@profiled("amazon.classify")
+def process_chargebacks(data, payment_number, payment_amount, posting_date, ledger=None, repost=False,
+                        netting=True):
+    """
+    With a PostingLedger, chargebacks already posted for this payment are skipped (kept with a
+    warning when repost=True); keys of the journaled lines are left in df.attrs["posting_keys"]
+    and recorded by export_chargebacks_to_excel once the file is written.
+    With netting (default), reversal lines are netted into the chargebacks they reverse
+    (net_reversals) and fully reversed chargebacks drop out; reversals without an original are
+    left in df.attrs["unmatched_reversals"]. Ledger keys keep the gross remittance amount.
+    """
+    paid_raw = pd.Series([entry.get("Amount Paid", 0) for entry in data], dtype=object)
+    remaining_raw = pd.Series([entry.get("Amount Remaining", 0) for entry in data], dtype=object)
+    amounts = (money.to_cents(paid_raw) + money.to_cents(remaining_raw)).tolist()
+    rules = gl_rules.get_rules()
+    bases = [extract_base_description_normalized(entry["Description"], rules.amazon_patterns)
+             if isinstance(entry.get("Description"), str) else None for entry in data]
+    gl_accounts = rules.amazon.column("gl", bases)
+    abbrevs = rules.amazon.column("abbrev", bases)
+    unmatched = []
+    if netting:
+        net, unmatched = net_reversals(data, amounts, bases, rules.amazon_patterns)
+    else:
+        net = amounts
+    lines = []
+    for entry, amount, net_amount, base_desc, gl_account, abbrev in zip(data, amounts, net, bases, gl_accounts,
+                                                                        abbrevs):
         if "*" in str(entry.get("Amount Paid", "")):
             continue
-        amount = calculate_chargeback_amount(entry)
-        if amount == 0 or pd.isna(amount):
+        if net_amount is None or pd.isna(net_amount) or net_amount == 0:
             continue
-        base_desc = extract_base_description_normalized(entry["Description"])
-        if not base_desc:
+        if not base_desc or not gl_account:
             continue
-        gl_account = GL_ACCOUNT_MAP_NORMALIZED.get(base_desc, None)
-        if not gl_account:
+        lines.append((entry, amount, net_amount, base_desc, gl_account, abbrev))
+
+    keys = number_keys(make_key("amazon", payment_number, entry["Invoice Number"], base_desc, amount)
+                       for entry, amount, _, base_desc, _, _ in lines)
+    fresh = split_posted(ledger, keys, f"Amazon payment {payment_number}", repost=repost)
+
+    rows = []
+    for (entry, _, net_amount, base_desc, gl_account, abbrev), is_fresh in zip(lines, fresh):
+        if not is_fresh:
             continue
-        abbrev = ABBREV_MAP.get(base_desc.title(), base_desc.title())
         desc = f"PMT {payment_number} {entry['Invoice Number']} {abbrev}"
-        for amt in [amount, -amount]:
+        for amt in money.journal_pairs([net_amount]):
             rows.append([
                 posting_date, " ", " ", "Customer", "1287", desc,
-                " ", " ", " ", amt, "G/L Account", gl_account
+                " ", " ", " ", money.to_float(amt), "G/L Account", gl_account
             ])
     df = pd.DataFrame(rows, columns=NAV_COLUMNS)
+    df.attrs["posting_keys"] = [k for k, f in zip(keys, fresh) if f]
+    df.attrs["unmatched_reversals"] = unmatched
     return df
 
 
 # === PATCHED EXPORT FUNCTION (v3.1.4) ===
-def export_chargebacks_to_excel(df, payment_number, payment_amount, export_dir="/mnt/data"):
+@profiled("amazon.export")
+def export_chargebacks_to_excel(df, payment_number, payment_amount, export_dir="/mnt/data", ledger=None,
+                                shard_rows=None):
     """
     Applies final formatting and saves to Excel using desired filename and date format.
+    With a PostingLedger, records the journaled keys from process_chargebacks after the save.
+    With shard_rows, journals longer than that are written as _partNN files and the index path is returned.
+    Unmatched reversals from process_chargebacks go to <file>_unmatched_reversals.csv.
     """
     # Ensure date format is mm/dd/yyyy
     df["Posting Date"] = pd.to_datetime(df["Posting Date"]).dt.strftime("%m/%d/%Y")
 
     # Create filename
-    filename = f"{payment_number}_{payment_amount:.2f}.xlsx"
+    filename = f"{payment_number}_{money.format_cents(money.cents(payment_amount))}.xlsx"
     filepath = f"{export_dir}/{filename}"
 
+    warn_violations(validate_frame(df, "journal"), f"Amazon payment {payment_number}")
+
     # Save file
-    df.to_excel(filepath, index=False)
+    if shard_rows and len(df) > shard_rows:
+        _, filepath = write_journal_shards(df, filepath, shard_rows)
+        filepath = str(filepath)
+    else:
+        df.to_excel(filepath, index=False)
+    if ledger is not None:
+        ledger.record(df.attrs.get("posting_keys", []), output=filepath)
+    unmatched = df.attrs.get("unmatched_reversals")
+    if unmatched:
+        report = f"{export_dir}/{Path(filename).stem}_unmatched_reversals.csv"
+        pd.DataFrame(unmatched).to_csv(report, index=False)
+        print(f"WARNING: {len(unmatched)} Amazon reversal(s) without an original chargeback were not posted; "
+              f"see {report}", file=sys.stderr)
     return filepath
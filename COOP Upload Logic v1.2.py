@@ -3,6 +3,14 @@
 
 import pandas as pd
 import re
+from pathlib import Path
+import gl_rules
+import money
+from nav_sharding import write_credit_memo_shards
+from nav_validator import validate_credit_memo, warn_violations
+from posting_ledger import make_key, number_keys, split_posted
+from stage_profiler import stage
+from txt_chunks import read_records
 
 def read_txt_file(file_path):
     """
@@ -57,6 +65,7 @@ def populate_sales_line(records, ascr_numbers):
     Populates the Sales Line tab as a DataFrame with two lines per ASCR.
     Applies label shortening for non-SI entries and integer line numbers.
     """
+    gl_no, gl_desc = gl_rules.get_rules().fixed_account("coop")
     line_data = []
     for record, ascr in zip(records, ascr_numbers):
         invoice_no = record["InvoiceNumber"]
@@ -67,9 +76,9 @@ def populate_sales_line(records, ascr_numbers):
             "Document No.": ascr,
             "Line No.": 10000,
             "Type": "G/L Account",
-            "No.": 226000,
+            "No.": gl_no,
             "Location Code": "W01",
-            "Description": "ACCR-COOP ADVERTISING",
+            "Description": gl_desc,
             "Quantity": 1,
             "Unit Price": record["Amount"],
             "Amount": record["Amount"],
@@ -81,7 +90,7 @@ def populate_sales_line(records, ascr_numbers):
             "Document No.": ascr,
             "Line No.": 20000,
             "Type": "G/L Account",
-            "No.": 226000,
+            "No.": gl_no,
             "Location Code": "W01",
             "Description": f"COOP {invoice_no}" if not is_si else f"COOP TO COVER {invoice_no}",
             "Quantity": 0,
@@ -91,51 +100,85 @@ def populate_sales_line(records, ascr_numbers):
         })
     return pd.DataFrame(line_data)
 
-def generate_credit_memo_excel(txt_file_path, start_ascr, output_path):
+def ledger_keys(records, amount_cents, file_name):
+    """
+    Posting ledger keys: SI lines key on the invoice they credit, other lines on the file name and
+    record number, so editing the free-text description doesn't make a line look new.
+    """
+    keys = []
+    for n, (record, c) in enumerate(zip(records, amount_cents), start=1):
+        invoice_no = record["InvoiceNumber"]
+        doc = invoice_no if invoice_no.upper().startswith("SI") else f"{file_name} line {n}"
+        keys.append(make_key("coop", record["CustomerNumber"], doc, "", c))
+    return number_keys(keys)
+
+def generate_credit_memo_excel(txt_file_path, start_ascr, output_path, ledger=None, repost=False, shard_rows=None):
     """
     Main function to generate the Excel file for COOP Credit Memo batch.
+    With a PostingLedger, invoices already credited are skipped before ASCR numbers are assigned
+    (kept with a warning when repost=True) and the new ones are recorded after the workbook is saved.
+    With shard_rows, larger batches are written as _partNN workbooks (documents never split) plus an index.
     """
-    records = read_txt_file(txt_file_path)
+    with stage("coop.parse_txt") as st:
+        records = read_txt_file(txt_file_path)
+        st.rows_out = len(records)
+    amount_cents = money.to_cents([r["Amount"] for r in records]).fillna(0).tolist()
+    keys = ledger_keys(records, amount_cents, Path(txt_file_path).name)
+    fresh = split_posted(ledger, keys, "COOP credit memo", repost=repost)
+    records = [r for r, f in zip(records, fresh) if f]
     ascr_numbers = generate_ascr_numbers(start_ascr, len(records))
     header_df = populate_sales_header(records, ascr_numbers)
     line_df = populate_sales_line(records, ascr_numbers)
 
-    with pd.ExcelWriter(output_path, engine='xlsxwriter') as writer:
-        header_df.to_excel(writer, sheet_name='Sales Header', index=False)
-        line_df.to_excel(writer, sheet_name='Sales Line', index=False)
+    warn_violations(validate_credit_memo(header_df, line_df), output_path)
+    with stage("coop.write_xlsx", rows_in=len(header_df) + len(line_df)) as st:
+        if shard_rows and len(header_df) + len(line_df) > shard_rows:
+            _, output_path = write_credit_memo_shards(header_df, line_df, output_path, shard_rows)
+        else:
+            with pd.ExcelWriter(output_path, engine='xlsxwriter') as writer:
+                header_df.to_excel(writer, sheet_name='Sales Header', index=False)
+                line_df.to_excel(writer, sheet_name='Sales Line', index=False)
+        st.rows_out = len(header_df) + len(line_df)
+    if ledger is not None:
+        ledger.record([k for k, f in zip(keys, fresh) if f], output=output_path)
     print(f"Credit memo Excel generated: {output_path}")
 
 
-def read_txt_file(file_path):
+def parse_txt_line(raw):
+    """
+    One TXT line -> record dict, or None for blank/short lines and unparseable amounts.
+    Handles tab-delimited rows or rows separated by runs of 2+ spaces.
+    """
+    line = raw.strip()
+    if not line:
+        return None
+    # Prefer tabs if present, otherwise split on 2+ spaces
+    if "\t" in line:
+        parts = line.split("\t")
+    else:
+        parts = re.split(r"\s{2,}", line)
+    # Allow 3 or more parts; join middle parts back together
+    if len(parts) < 3:
+        return None
+    customer_no = parts[0].strip()
+    amount_str = parts[-1].strip()
+    middle = " ".join(p.strip() for p in parts[1:-1] if p.strip())
+    try:
+        amount = float(re.sub(r"[^\d.-]", "", amount_str))
+    except ValueError:
+        return None
+    return {
+        "CustomerNumber": customer_no,
+        "InvoiceNumber": middle,
+        "Amount": amount
+    }
+
+
+def read_txt_file(file_path, workers=None):
     """
     Reads and parses a .txt file with three columns:
       Customer Number, Description (may contain spaces), Amount.
-    Handles tab-delimited rows or rows separated by runs of 2+ spaces.
-    Returns a list of dictionaries.
+    Returns a list of dictionaries in file order. Large files are parsed in parallel
+    byte ranges (txt_chunks.py); workers=1 forces the sequential read.
     """
-    records = []
-    with open(file_path, "r", encoding="utf-8") as file:
-        for raw in file:
-            line = raw.strip()
-            if not line:
-                continue
-            # Prefer tabs if present, otherwise split on 2+ spaces
-            if "\t" in line:
-                parts = line.split("\t")
-            else:
-                parts = re.split(r"\s{2,}", line)
-            # Allow 3 or more parts; join middle parts back together
-            if len(parts) >= 3:
-                customer_no = parts[0].strip()
-                amount_str = parts[-1].strip()
-                middle = " ".join(p.strip() for p in parts[1:-1] if p.strip())
-                try:
-                    amount = float(re.sub(r"[^\d.-]", "", amount_str))
-                except ValueError:
-                    continue
-                records.append({
-                    "CustomerNumber": customer_no,
-                    "InvoiceNumber": middle,
-                    "Amount": amount
-                })
-    return records
\ No newline at end of file
+    return read_records(file_path, parse_txt_line, "coop", encoding="utf-8", workers=workers)
\ No newline at end of file
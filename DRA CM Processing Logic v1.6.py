@@ -19,6 +19,9 @@ What’s new (v1.5):
 from dataclasses import dataclass
 from typing import List, Tuple
 from openpyxl import Workbook
+import gl_rules
+import money
+from stage_profiler import profiled
 
 
 __version__ = "1.5"
@@ -32,6 +35,7 @@ class LineItem:
     unit_price: float
 
 
+@profiled("dra.build_export")
 def build_export(audit_trails: List[Tuple[str, str, float, float]], ra_number: str) -> str:
     """
     Build an Excel file for NAV import using the SOP layout.
@@ -48,6 +52,7 @@ def build_export(audit_trails: List[Tuple[str, str, float, float]], ra_number: s
             invoice, item_no, qty, price = row
             _rows.append(LineItem(invoice=invoice, item_no=item_no, qty=float(qty), unit_price=float(price)))
 
+    gl_no, gl_desc = gl_rules.get_rules().fixed_account("dra")
     wb = Workbook()
     ws = wb.active
     ws.title = "Sheet1"
@@ -59,14 +64,16 @@ def build_export(audit_trails: List[Tuple[str, str, float, float]], ra_number: s
     ]
     ws.append(headers)
 
-    for li in _rows:
-        line_amount = float(li.qty) * float(li.unit_price)
-        unit_price_fmt = f"{float(li.unit_price):.2f}"
-        line_amount_fmt = f"{line_amount:.2f}"
+    # Money for every line in one pass
+    prices = [li.unit_price for li in _rows]
+    unit_fmts = money.format_cents(money.line_cents(prices, [1] * len(prices)))
+    # The line is priced from the unrounded unit price (one rounding), as qty * price always was
+    amount_fmts = money.format_cents(money.line_cents(prices, [li.qty for li in _rows]))
 
+    for li, unit_price_fmt, line_amount_fmt in zip(_rows, unit_fmts, amount_fmts):
         # CM line
         ws.append([
-            "G/L Account", 488000, "DEFECTIVE ALLOWANCES", "W01", li.qty, "EA",
+            "G/L Account", gl_no, gl_desc, "W01", li.qty, "EA",
             unit_price_fmt, "NONTAXABLE", line_amount_fmt, line_amount_fmt,
             " ", 0, " "
         ])
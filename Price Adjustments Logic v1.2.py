@@ -1,11 +1,16 @@
 
 from openpyxl import Workbook
+import gl_rules
+import money
+from stage_profiler import profiled
 
+@profiled("price_adj.build_export")
 def process_price_adjustments_from_prices(price_data, invoice_number):
     """
     price_data: list of tuples (item_no, PO_price, Invoice_price, qty)
     invoice_number: str
     """
+    gl_no, gl_desc = gl_rules.get_rules().fixed_account("price_adjustments")
     wb = Workbook()
 
     # Sheet 1: Audit Trail
@@ -18,21 +23,27 @@ def process_price_adjustments_from_prices(price_data, invoice_number):
     ]
     ws.append(headers)
 
+    po_cents = money.to_cents([po for _, po, _, _ in price_data])
+    inv_cents = money.to_cents([inv for _, _, inv, _ in price_data])
+    overcharge_cents = (inv_cents - po_cents).fillna(0).to_numpy(dtype="int64")
+    qtys = [qty for _, _, _, qty in price_data]
+    total_cents = money.mul_qty(overcharge_cents, qtys)
+    unit_fmts = money.format_cents(overcharge_cents)
+    total_fmts = money.format_cents(total_cents)
+
     adjustments = []
-    for item_no, po_price, inv_price, qty in price_data:
-        overcharge = round(inv_price - po_price, 2)
-        if overcharge <= 0:
+    for k, (item_no, po_price, inv_price, qty) in enumerate(price_data):
+        if overcharge_cents[k] <= 0:
             continue
 
-        total_line = qty * overcharge
-        adjustments.append((invoice_number, item_no, qty, overcharge))
+        adjustments.append((invoice_number, item_no, qty, money.to_float(overcharge_cents[k])))
 
-        unit_price_fmt = f"{overcharge:.2f}"
-        line_amount_fmt = f"{total_line:.2f}"
+        unit_price_fmt = unit_fmts[k]
+        line_amount_fmt = total_fmts[k]
         description = f"({qty}) {item_no} @ ${unit_price_fmt} EA {invoice_number}"
 
         ws.append([
-            "G/L Account", 482100, "PRICE ADJUSTMENTS", "W01", qty, "EA",
+            "G/L Account", gl_no, gl_desc, "W01", qty, "EA",
             unit_price_fmt, "NONTAXABLE", line_amount_fmt, line_amount_fmt,
             " ", 0, " "
         ])
@@ -1,8 +1,13 @@
 
 from openpyxl import Workbook
 from collections import defaultdict
+import gl_rules
+import money
+from stage_profiler import profiled
 
+@profiled("rebill.build_export")
 def export_to_excel_with_customer_names(audit_trails, ra_number, invoice_no, customer_1, customer_2, customer_1_name, customer_2_name, output_path=None):
+    gl_no, gl_desc = gl_rules.get_rules().fixed_account("rebill")
     wb = Workbook()
     default_sheet = wb.active
     wb.remove(default_sheet)
@@ -11,7 +16,17 @@ def export_to_excel_with_customer_names(audit_trails, ra_number, invoice_no, cus
     for invoice, item_no, qty, price in audit_trails:
         grouped_lines[invoice].append((item_no, qty, price))
 
-    for invoice_id, lines in grouped_lines.items():
+    # Money for every line in one pass; both sheets below reuse the strings
+    flat = [line for lines in grouped_lines.values() for line in lines]
+    qty_floats = [float(qty) for _, qty, _ in flat]
+    prices = [price for _, _, price in flat]
+    # The line is priced from the unrounded unit price (one rounding), as qty * price always was
+    priced = iter(zip(qty_floats, money.format_cents(money.line_cents(prices, [1] * len(prices))),
+                      money.format_cents(money.line_cents(prices, qty_floats))))
+    priced_lines = {invoice_id: [(item_no, qty, *next(priced)) for item_no, qty, _ in lines]
+                    for invoice_id, lines in grouped_lines.items()}
+
+    for invoice_id, lines in priced_lines.items():
         ws = wb.create_sheet(title=invoice_id)
 
         journal_headers = [
@@ -21,16 +36,9 @@ def export_to_excel_with_customer_names(audit_trails, ra_number, invoice_no, cus
         ]
         ws.append(journal_headers)
 
-        for item_no, qty, price in lines:
-            qty_float = float(qty)
-            price_float = float(price)
-            line_amount = qty_float * price_float
-
-            unit_price_fmt = f"{price_float:.2f}"
-            line_amount_fmt = f"{line_amount:.2f}"
-
+        for item_no, qty, qty_float, unit_price_fmt, line_amount_fmt in lines:
             ws.append([
-                "G/L Account", 485300, "MISC. ALLOWANCES", "W01", qty_float, "EA",
+                "G/L Account", gl_no, gl_desc, "W01", qty_float, "EA",
                 unit_price_fmt, "NONTAXABLE", line_amount_fmt, line_amount_fmt,
                 " ", 0, " "
             ])
@@ -54,18 +62,12 @@ def export_to_excel_with_customer_names(audit_trails, ra_number, invoice_no, cus
     ]
     ws_sales.append(sales_headers)
 
-    for invoice_id, lines in grouped_lines.items():
-        for item_no, qty, price in lines:
-            qty_float = float(qty)
-            price_float = float(price)
-            line_amount = qty_float * price_float
-
-            unit_price_fmt = f"{price_float:.2f}"
-            line_amount_fmt = f"{line_amount:.2f}"
+    for invoice_id, lines in priced_lines.items():
+        for item_no, qty, qty_float, unit_price_fmt, line_amount_fmt in lines:
             description = f"({qty}) {item_no} @ ${unit_price_fmt} EA {invoice_id}"
 
             ws_sales.append([
-                "G/L Account", 485300, description, "W01", qty_float, "EA",
+                "G/L Account", gl_no, description, "W01", qty_float, "EA",
                 unit_price_fmt, "", "", line_amount_fmt, line_amount_fmt, 0
             ])
 
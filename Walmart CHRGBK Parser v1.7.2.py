@@ -8,11 +8,24 @@ Walmart_CB_Parser_v1.7.2.py
 - Inserts "Internal Invoice Date" at column C and populates per 3-check nearest-invoice-below logic
 - Removes the helper column that previously sat at O (internal row index), and also removes the raw file column
 - Applies short date format
+- Optional --profile [trace.ndjson] records per-stage timings (see stage_profiler.py)
+- Optional --compact memory mode: drops the column-O raw column at ingest, parses date columns once,
+  downcasts integer columns, stores repeated strings (Store/DC/Division/codes/Check No/_file) as
+  categoricals, and prints a before/after memory_usage(deep=True) report
+- Optional --format xlsx|csv|parquet (default from the --output extension); --constant-memory streams
+  the xlsx sheet row by row (autofilter instead of an Excel table, which xlsxwriter can't stream)
+- Optional --invoice-index [path] fills deductions the same-file search missed from a persistent index
+  of invoice lines on earlier checks, this run's included (invoice_index.py; default NAV_INVOICE_INDEX or
+  nav_invoice_index.sqlite) and adds an "Internal Invoice Date Source" column (same file / index)
+- Optional --store [path] adds the checks not seen before to the deduction analytics store
+  (deduction_store.py; default NAV_DEDUCTION_STORE or nav_deductions.sqlite)
 """
 import argparse, os, sys, re
 from pathlib import Path
 import pandas as pd
 import numpy as np
+import stage_profiler
+from stage_profiler import stage
 
 def to_num(x):
     if pd.isna(x): return np.nan
@@ -35,29 +48,98 @@ def normalize_str(x):
     if pd.isna(x): return None
     return str(x).strip()
 
-def read_check_files(input_dir: Path) -> pd.DataFrame:
-    frames = []
-    for p in sorted(input_dir.glob("Check_*.xlsx")):
-        try:
-            xls = pd.ExcelFile(p)
-            first = xls.sheet_names[0]
-            df = xls.parse(first)
-            df["_file"] = p.name
-            df["_row_in_file"] = np.arange(len(df))
-            # Extract check number string (preserve leading zeros)
-            m = re.search(r"Check_(\d+)\.xlsx$", p.name, flags=re.IGNORECASE)
-            check_no = m.group(1) if m else ""
-            df["Check No"] = check_no
-            frames.append(df)
-        except Exception as e:
-            print(f"WARNING: failed to read {p}: {e}", file=sys.stderr)
+# Raw source column that lands at column O after "Check No" and "Internal Invoice Date" are inserted
+RAW_COL_O_INDEX = 12
+CATEGORY_COLS = ["store number", "store #", "store", "dc number", "dc #", "dc", "division",
+                 "deduction code", "check no", "_file"]
+CATEGORY_MAX_RATIO = 0.5
+
+def parse_date_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert text date columns to datetime64 once, only when every non-blank value parses."""
+    for col in df.columns:
+        if "date" not in str(col).lower() or pd.api.types.is_datetime64_any_dtype(df[col]):
+            continue
+        parsed = pd.to_datetime(df[col], errors="coerce")
+        if parsed.notna().sum() == df[col].notna().sum():
+            df[col] = parsed
+    return df
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Downcast integer columns and turn repeated-string columns into categoricals."""
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_integer_dtype(series):
+            df[col] = pd.to_numeric(series, downcast="integer")
+        elif (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)) and len(series):
+            named = str(col).strip().lower() in CATEGORY_COLS
+            if named or series.nunique(dropna=True) / len(series) <= CATEGORY_MAX_RATIO:
+                df[col] = series.astype("category")
+    return df
+
+def memory_report(before: pd.Series, after: pd.Series) -> str:
+    """Per-column deep memory before/after, largest first, plus totals."""
+    table = pd.DataFrame({"before": before, "after": after}).fillna(0).astype("int64")
+    table = table.sort_values("before", ascending=False)
+    lines = [f"{'column':<28}{'before MB':>12}{'after MB':>12}"]
+    for col, row in table.iterrows():
+        lines.append(f"{str(col)[:27]:<28}{row['before'] / 1e6:>12.2f}{row['after'] / 1e6:>12.2f}")
+    total_b, total_a = table["before"].sum(), table["after"].sum()
+    saved = (1 - total_a / total_b) * 100 if total_b else 0.0
+    lines.append(f"{'TOTAL':<28}{total_b / 1e6:>12.2f}{total_a / 1e6:>12.2f}  ({saved:.1f}% smaller)")
+    return "\n".join(lines)
+
+def read_check_file(p: Path, compact: bool = False) -> pd.DataFrame:
+    """
+    One Check_*.xlsx with its _file/_row_in_file/Check No helper columns. In compact mode the
+    raw per-column memory is left in df.attrs["raw_memory"] for the memory report.
+    """
+    xls = pd.ExcelFile(p)
+    first = xls.sheet_names[0]
+    df = xls.parse(first)
+    if compact:
+        raw_cols = list(df.columns)
+    df["_file"] = p.name
+    df["_row_in_file"] = np.arange(len(df))
+    # Extract check number string (preserve leading zeros)
+    m = re.search(r"Check_(\d+)\.xlsx$", p.name, flags=re.IGNORECASE)
+    check_no = m.group(1) if m else ""
+    df["Check No"] = check_no
+    if compact:
+        raw_memory = df.memory_usage(deep=True, index=False)
+        # final_order would drop this column anyway; don't carry it through the concat
+        if len(raw_cols) > RAW_COL_O_INDEX:
+            df = df.drop(columns=[raw_cols[RAW_COL_O_INDEX]])
+        df["_row_in_file"] = df["_row_in_file"].astype(np.int32)
+        df = parse_date_columns(df)
+        df.attrs["raw_memory"] = raw_memory
+    return df
+
+def combine_check_frames(frames, compact: bool = False) -> pd.DataFrame:
+    """Concatenate per-file frames in (_file, _row_in_file) order; compact mode applies categoricals."""
+    before = pd.Series(dtype="int64")
+    for df in frames:
+        if "raw_memory" in df.attrs:
+            before = before.add(df.attrs.pop("raw_memory"), fill_value=0)
     if frames:
         all_df = pd.concat(frames, ignore_index=True, sort=False)
         all_df = all_df.sort_values(by=["_file", "_row_in_file"], kind="stable").reset_index(drop=True)
     else:
         all_df = pd.DataFrame()
+    if compact and not all_df.empty:
+        all_df = compact_frame(all_df)
+        print("Memory usage (deep), raw vs compact:")
+        print(memory_report(before, all_df.memory_usage(deep=True, index=False)))
     return all_df
 
+def read_check_files(input_dir: Path, compact: bool = False) -> pd.DataFrame:
+    frames = []
+    for p in sorted(input_dir.glob("Check_*.xlsx")):
+        try:
+            frames.append(read_check_file(p, compact=compact))
+        except Exception as e:
+            print(f"WARNING: failed to read {p}: {e}", file=sys.stderr)
+    return combine_check_frames(frames, compact=compact)
+
 def fill_internal_invoice_dates(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty:
         df["Internal Invoice Date"] = pd.NaT
@@ -129,7 +211,7 @@ def fill_internal_invoice_dates(df: pd.DataFrame) -> pd.DataFrame:
 
     return df
 
-def final_order(df: pd.DataFrame) -> pd.DataFrame:
+def final_order(df: pd.DataFrame, drop_col_o: bool = True) -> pd.DataFrame:
     # Ensure Check No at B and Internal Invoice Date at C
     cols = list(df.columns)
     # 1) Move/insert "Check No" to index 1
@@ -144,8 +226,8 @@ def final_order(df: pd.DataFrame) -> pd.DataFrame:
         cols = list(df.columns)
     if cols.index("Internal Invoice Date") != 2:
         cols.insert(2, cols.pop(cols.index("Internal Invoice Date")))
-    # 3) Drop column O (15th) if it exists in this frame
-    if len(cols) >= 15:
+    # 3) Drop column O (15th) if it exists in this frame (compact reads already dropped it at ingest)
+    if drop_col_o and len(cols) >= 15:
         # Determine which name sits at O (index 14)
         col_O = cols[14]
         cols.remove(col_O)
@@ -237,25 +319,30 @@ def clean_rows_postparse(df: pd.DataFrame) -> pd.DataFrame:
 
 
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--input", required=True, help="Directory with Check_*.xlsx files")
-    ap.add_argument("--output", required=True, help="Final output .xlsx path")
-    args = ap.parse_args()
+OUTPUT_FORMATS = ("xlsx", "csv", "parquet")
+TABLE_NAME = "WalmartDeductionsTable"
+DATE_FORMAT = "mm/dd/yyyy"
+STREAM_CHUNK_ROWS = 50_000
 
-    input_dir = Path(args.input)
-    df = read_check_files(input_dir)
-    df = fill_internal_invoice_dates(df)
-    df = final_order(df)
-    df = clean_rows_postparse(df)
+def output_format(path, fmt=None) -> str:
+    """Explicit --format wins; otherwise the output extension decides, defaulting to xlsx."""
+    if fmt:
+        return fmt
+    suffix = Path(path).suffix.lower().lstrip(".")
+    return suffix if suffix in OUTPUT_FORMATS else "xlsx"
+
+def is_date_col(df: pd.DataFrame, col) -> bool:
+    return ("date" in str(col).lower()) or pd.api.types.is_datetime64_any_dtype(df[col])
 
-    with pd.ExcelWriter(args.output, engine="xlsxwriter", datetime_format="mm/dd/yyyy", date_format="mm/dd/yyyy") as writer:
+def write_xlsx(df: pd.DataFrame, path) -> None:
+    """Formatted workbook: one sheet, short dates, Excel table over the written range."""
+    with pd.ExcelWriter(path, engine="xlsxwriter", datetime_format=DATE_FORMAT, date_format=DATE_FORMAT) as writer:
         df.to_excel(writer, sheet_name="Deductions_All", index=False)
         wb = writer.book
         ws = writer.sheets["Deductions_All"]
-        date_fmt = wb.add_format({"num_format": "mm/dd/yyyy"})
+        date_fmt = wb.add_format({"num_format": DATE_FORMAT})
         for idx, col in enumerate(df.columns):
-            if ("date" in str(col).lower()) or pd.api.types.is_datetime64_any_dtype(df[col]):
+            if is_date_col(df, col):
                 ws.set_column(idx, idx, 12, date_fmt)
         if len(df.columns) > 0:
             ws.set_column(0, len(df.columns)-1, 14)
@@ -265,11 +352,119 @@ def main():
         last_col = ncols - 1
         if ncols > 0:
             ws.add_table(0, 0, last_row, last_col, {
-                "name": "WalmartDeductionsTable",
+                "name": TABLE_NAME,
                 "columns": [{"header": str(col)} for col in df.columns]
             })
 
-    print(f"Single-sheet workbook written to: {args.output}")
+def write_xlsx_streaming(df: pd.DataFrame, path) -> None:
+    """
+    Constant-memory workbook: xlsxwriter flushes each row to disk once the next one starts,
+    so rows go out strictly in order, STREAM_CHUNK_ROWS at a time. Column formats and the
+    filter range are declared up front. xlsxwriter refuses add_table() in this mode, so the
+    header row gets an autofilter (same dropdowns, no table style) and is frozen.
+    """
+    import xlsxwriter
+    nrows, ncols = df.shape
+    wb = xlsxwriter.Workbook(str(path), {"constant_memory": True, "default_date_format": DATE_FORMAT})
+    try:
+        ws = wb.add_worksheet("Deductions_All")
+        header_fmt = wb.add_format({"bold": True, "border": 1})
+        date_fmt = wb.add_format({"num_format": DATE_FORMAT})
+        if ncols > 0:
+            ws.set_column(0, ncols - 1, 14)
+        for idx, col in enumerate(df.columns):
+            if is_date_col(df, col):
+                ws.set_column(idx, idx, 12, date_fmt)
+        ws.write_row(0, 0, [str(c) for c in df.columns], header_fmt)
+        if ncols > 0:
+            ws.autofilter(0, 0, nrows, ncols - 1)
+            ws.freeze_panes(1, 0)
+        for start in range(0, nrows, STREAM_CHUNK_ROWS):
+            chunk = df.iloc[start:start + STREAM_CHUNK_ROWS]
+            # Python scalars column by column; NaN/NaT/<NA> become None, which leaves the cell empty
+            cols = [chunk[c].astype(object).where(chunk[c].notna(), None).tolist() for c in chunk.columns]
+            for r, row in enumerate(zip(*cols), start=start + 1):
+                ws.write_row(r, 0, row)
+    finally:
+        wb.close()
+
+def write_csv(df: pd.DataFrame, path) -> None:
+    """Plain CSV; datetime columns are written as mm/dd/yyyy like the workbook shows them."""
+    df.to_csv(path, index=False, date_format="%m/%d/%Y")
+
+def write_parquet(df: pd.DataFrame, path) -> None:
+    """Parquet keeps dtypes (datetimes, categoricals); needs pyarrow or fastparquet."""
+    import importlib.util
+    if not any(importlib.util.find_spec(m) for m in ("pyarrow", "fastparquet")):
+        raise SystemExit("ERROR: --format parquet needs pyarrow (pip install pyarrow) or fastparquet")
+    out = df.copy()
+    for col in out.columns:
+        # Mixed str/int object columns (e.g. Invoice Number) aren't valid Parquet; store them as text
+        if pd.api.types.is_object_dtype(out[col]):
+            out[col] = out[col].where(out[col].isna(), out[col].astype(str))
+    out.to_parquet(path, index=False)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--input", required=True, help="Directory with Check_*.xlsx files")
+    ap.add_argument("--output", required=True, help="Final output path (.xlsx, .csv or .parquet)")
+    ap.add_argument("--format", choices=OUTPUT_FORMATS, default=None,
+                    help="Output format (default: from the --output extension, else xlsx)")
+    ap.add_argument("--constant-memory", action="store_true",
+                    help="xlsx only: stream rows to disk instead of holding the sheet in memory")
+    ap.add_argument("--compact", action="store_true",
+                    help="Memory-optimized read (categoricals, downcasts, prune column O) with a memory report")
+    ap.add_argument("--profile", nargs="?", const="", default=None,
+                    help="Record per-stage timings to an NDJSON trace (default nav_profile.ndjson)")
+    ap.add_argument("--invoice-index", nargs="?", const="", default=None,
+                    help="Cross-check Internal Invoice Date lookback through the invoice index")
+    ap.add_argument("--store", nargs="?", const="", default=None,
+                    help="Also ingest new checks into the deduction analytics store")
+    args = ap.parse_args()
+    if args.profile is not None:
+        stage_profiler.enable(args.profile or None)
+
+    input_dir = Path(args.input)
+    with stage("parser.read") as st:
+        df = read_check_files(input_dir, compact=args.compact)
+        st.rows_out = len(df)
+    with stage("parser.date_fill", rows_in=len(df)) as st:
+        df = fill_internal_invoice_dates(df)
+        st.rows_out = len(df)
+    with stage("parser.final_order", rows_in=len(df)) as st:
+        df = final_order(df, drop_col_o=not args.compact)
+        st.rows_out = len(df)
+    with stage("parser.clean", rows_in=len(df)) as st:
+        df = clean_rows_postparse(df)
+        st.rows_out = len(df)
+
+    if args.invoice_index is not None:
+        from invoice_index import InvoiceIndex, fill_from_index
+        with (InvoiceIndex(args.invoice_index) if args.invoice_index else InvoiceIndex.from_env()) as index:
+            # Index the batch first: a deduction may fill from an earlier check of this same batch
+            index.add(df)
+            df = fill_from_index(df, index)
+
+    fmt = output_format(args.output, args.format)
+    with stage(f"parser.write_{fmt}", rows_in=len(df)) as st:
+        if fmt == "csv":
+            write_csv(df, args.output)
+        elif fmt == "parquet":
+            write_parquet(df, args.output)
+        elif args.constant_memory:
+            write_xlsx_streaming(df, args.output)
+        else:
+            write_xlsx(df, args.output)
+        st.rows_out = len(df)
+
+    print(f"Deductions_All ({fmt}) written to: {args.output}")
+
+    if args.store is not None:
+        from deduction_store import DeductionStore
+        with (DeductionStore(args.store) if args.store else DeductionStore.from_env()) as store:
+            new, skipped, n = store.ingest(df, source=args.output)
+        print(f"Deduction store {store.path}: {len(new)} new check(s), {n} deduction line(s); "
+              f"{len(skipped)} already stored")
 
 if __name__ == "__main__":
     main()
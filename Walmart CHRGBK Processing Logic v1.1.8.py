@@ -3,6 +3,13 @@ import pandas as pd
 import re
 from datetime import datetime
 import os
+import numpy as np
+import gl_rules
+import money
+from nav_sharding import shard_rows_from_env, write_journal_shards
+from nav_validator import validate_frame, warn_violations
+from posting_ledger import PostingLedger, make_key, number_keys, split_posted
+from stage_profiler import stage, profiled
 
 # NAV Column Headers
 NAV_COLUMNS = [
@@ -11,42 +18,7 @@ NAV_COLUMNS = [
     "Amount", "Bal. Account Type", "Bal. Account No."
 ]
 
-# Walmart G/L Account Mapping
-GL_ACCOUNT_MAP_WALMART = {
-    "0100": "482100",
-    "0022": "486000",
-    "0024": "486000",
-    "0780": "636300",
-    "0059": "488000",
-    "0057": "482100",
-    "0775": "825000",
-    "0025": "486000",
-    "0088": "485300",
-    "0762": "825000",
-    "0130": "482100",
-    "0054": "482100",
-    "0087": "825000"
-}
-
-# Abbreviated Descriptions
-ABBREV_DESC_MAP = {
-    "0100": "UNSEAL/QUANTITY ALLOWANCE",
-    "0022": "MERCHANDISE SHORTAGE",
-    "0024": "CARTON SHORTAGE FREIGHT",
-    "0780": "TRANSPORT BILLING",
-    "0059": "DEFECTIVE ALLOWANCE",
-    "0057": "QUANTITY DISC ALLOWANCE",
-    "0775": "MARKDOWN BILLING",
-    "0025": "POD/NO MERCHANDISE SHORTAGE",
-    "0088": "MERCHANDISE RETURNS",
-    "0762": "COMPLIANCE BILLING",
-    "0130": "SUBSTITUTION OVERCHARGE",
-    "0054": "WAREHOUSE ALLOWANCE",
-    "0087": "OTHER"
-}
-
-# Codes to Sum
-SUM_CODES = ["0100", "0057", "0059"]
+# G/L accounts, abbreviated descriptions and summed codes: walmart section of gl_rules.json
 
 def extract_code(description):
     if pd.isna(description):
@@ -54,57 +26,122 @@ def extract_code(description):
     match = re.search(r"\[(\d{4})\]", str(description))
     return match.group(1) if match else None
 
-def clean_amount(val):
-    s = str(val).replace(",", "").replace("(", "-").replace(")", "").strip()
-    return pd.to_numeric(s, errors="coerce")
-
-def process_walmart_file(df, payment_number, posting_date):
+def journal_frame(posting_date, descriptions, amount_cents, gl_accounts):
+    """One debit/credit pair per amount: [amt, -amt] with the same description and G/L account."""
+    descriptions = np.repeat(np.asarray(descriptions, dtype=object), 2)
+    gl_accounts = np.repeat(np.asarray(gl_accounts, dtype=object), 2)
+    amounts = money.to_float(money.journal_pairs(amount_cents))
+    n = len(amounts)
+    return pd.DataFrame({
+        "Posting Date": [posting_date] * n,
+        "Document Type": " ",
+        "Document No.": " ",
+        "Account Type": "Customer",
+        "Account No.": "8501",
+        "Description": descriptions,
+        "Gen. Posting Group": " ",
+        "Gen. Bus. Posting Group": " ",
+        "Gen. Prod. Posting Group": " ",
+        "Amount": amounts,
+        "Bal. Account Type": "G/L Account",
+        "Bal. Account No.": gl_accounts,
+    }, columns=NAV_COLUMNS, index=range(n))
+
+@profiled("walmart.journal_build")
+def process_walmart_file(df, payment_number, posting_date, ledger=None, repost=False):
+    """
+    Build the NAV journal for one check. With a PostingLedger, lines already posted for this
+    check are skipped (kept with a warning when repost=True); the keys of the journaled lines are
+    left in result.attrs["posting_keys"] for the caller to record once the file is written.
+    """
+    rules = gl_rules.get_rules()
+    table, sum_codes = rules.walmart, list(rules.walmart_sum_codes)
     df["Deduction Code"] = df["DEDUCTION CODE"].apply(extract_code)
-    df["Amount"] = df["Amount Paid($)"].apply(clean_amount)
-
-    rows = []
-
-    for code in SUM_CODES:
-        subset = df[df["Deduction Code"] == code]
-        total = subset["Amount"].sum()
+    cents = money.to_cents(df["Amount Paid($)"])
+    df["Amount"] = money.to_float(cents)
+    codes = df["Deduction Code"]
+    gl = pd.Series(table.column("gl", codes), index=codes.index)
+
+    candidate = (codes.isin(sum_codes) | gl.notna()) & cents.notna()
+    cand_idx = df.index[candidate]
+    keys = number_keys(
+        make_key("walmart", payment_number, inv, code, c)
+        for inv, code, c in zip(df.loc[candidate, "Invoice Number"], codes[candidate], cents[candidate])
+    )
+    fresh = split_posted(ledger, keys, f"Walmart check {payment_number}", repost=repost)
+    if not fresh.all():
+        drop = cand_idx[~fresh]
+        codes = codes.drop(drop)
+        gl = gl.drop(drop)
+        cents = cents.drop(drop)
+        df = df.drop(index=drop)
+
+    # Summed codes: one pair per code with the exact cent total
+    sum_desc, sum_cents, sum_gl = [], [], []
+    for code in sum_codes:
+        total = int(cents[codes == code].sum())
         if total != 0:
-            desc = f"PMT {payment_number} {ABBREV_DESC_MAP.get(code, code)}"
-            for amt in [total, -total]:
-                rows.append([
-                    posting_date, " ", " ", "Customer", "8501", desc,
-                    " ", " ", " ", amt, "G/L Account", GL_ACCOUNT_MAP_WALMART[code]
-                ])
-
-    other_df = df[~df["Deduction Code"].isin(SUM_CODES)]
-
-    for _, row in other_df.iterrows():
-        code = row["Deduction Code"]
-        gl_code = GL_ACCOUNT_MAP_WALMART.get(code)
-        if not gl_code or pd.isna(row["Amount"]):
-            continue
-        abbrev_desc = ABBREV_DESC_MAP.get(code, code)
-        desc = f"PMT {payment_number} {row['Invoice Number']} {abbrev_desc}"
-        for amt in [row["Amount"], -row["Amount"]]:
-            rows.append([
-                posting_date, " ", " ", "Customer", "8501", desc,
-                " ", " ", " ", amt, "G/L Account", gl_code
-            ])
-
-    return pd.DataFrame(rows, columns=NAV_COLUMNS)
-
-if __name__ == "__main__":
-    file_path = input("Enter path to Walmart remittance .xlsx file: ").strip()
-    df = pd.read_excel(file_path)
-
-    file_name = os.path.basename(file_path)
+            sum_desc.append(f"PMT {payment_number} {table.get(code, 'abbrev', code)}")
+            sum_cents.append(total)
+            sum_gl.append(table.get(code, "gl"))
+
+    # Everything else: one pair per line that has a mapped G/L account and an amount
+    keep = ~codes.isin(sum_codes) & gl.notna() & cents.notna()
+    other_codes = codes[keep]
+    abbrev = pd.Series(table.column("abbrev", other_codes), index=other_codes.index).fillna(other_codes)
+    other_desc = ("PMT " + str(payment_number) + " " + df.loc[keep, "Invoice Number"].astype(object).map(str)
+                  + " " + abbrev)
+
+    result = journal_frame(
+        posting_date,
+        sum_desc + other_desc.tolist(),
+        np.concatenate([np.asarray(sum_cents, dtype="int64"), cents[keep].to_numpy(dtype="int64")]),
+        sum_gl + gl[keep].tolist(),
+    )
+    result.attrs["posting_keys"] = [k for k, f in zip(keys, fresh) if f]
+    return result
+
+def remittance_header(df, file_name):
+    """(check number from Check_<n>, posting date = latest Date Paid, absolute payment cents)."""
     check_number_match = re.search(r"Check_(\d+)", file_name)
     check_number = check_number_match.group(1) if check_number_match else "WMT001"
-
     df["Date Paid"] = pd.to_datetime(df["Date Paid"], errors='coerce')
     posting_date = df["Date Paid"].max().strftime('%m/%d/%Y')
-    payment_amount = abs(df["Amount Paid($)"].apply(clean_amount).sum())
+    payment_cents = abs(int(money.to_cents(df["Amount Paid($)"]).sum()))
+    return check_number, posting_date, payment_cents
+
+def output_file_name(check_number, payment_cents):
+    return f"{check_number}_{money.format_cents(payment_cents)}.xlsx"
 
-    result_df = process_walmart_file(df, check_number, posting_date)
-    output_path = f"{check_number}_{payment_amount:.2f}.xlsx"
-    result_df.to_excel(output_path, index=False)
+if __name__ == "__main__":
+    file_path = input("Enter path to Walmart remittance .xlsx file: ").strip()
+    with stage("walmart.read") as st:
+        df = pd.read_excel(file_path)
+        st.rows_out = len(df)
+
+    with stage("walmart.clean", rows_in=len(df)) as st:
+        check_number, posting_date, payment_cents = remittance_header(df, os.path.basename(file_path))
+        st.rows_out = len(df)
+
+    ledger = PostingLedger.from_env()
+    try:
+        result_df = process_walmart_file(df, check_number, posting_date, ledger=ledger)
+        if ledger is not None and not result_df.attrs["posting_keys"]:
+            print(f"Nothing new to post for check {check_number}; no file written.")
+            raise SystemExit(0)
+        warn_violations(validate_frame(result_df, "journal"), f"Walmart check {check_number}")
+        output_path = output_file_name(check_number, payment_cents)
+        shard_rows = shard_rows_from_env()
+        with stage("walmart.write_xlsx", rows_in=len(result_df)) as st:
+            if shard_rows and len(result_df) > shard_rows:
+                shard_paths, output_path = write_journal_shards(result_df, output_path, shard_rows)
+                print(f"Split into {len(shard_paths)} files of at most {shard_rows} rows")
+            else:
+                result_df.to_excel(output_path, index=False)
+            st.rows_out = len(result_df)
+        if ledger is not None:
+            ledger.record(result_df.attrs["posting_keys"], output=output_path)
+    finally:
+        if ledger is not None:
+            ledger.close()
     print(f"NAV export saved to: {output_path}")
@@ -1,69 +1,136 @@
 import pandas as pd
 import re
+import sys
+from pathlib import Path
+import gl_rules
+import money
+from ledger_reconciliation import find_col, normalize_doc_no
+from nav_sharding import write_credit_memo_shards
+from nav_validator import validate_credit_memo, warn_violations
+from posting_ledger import make_key, number_keys, split_posted
+from stage_profiler import stage
+from txt_chunks import read_records
 
-# Mapping descriptions to account numbers
-CHARGEBACK_ACCOUNT_MAP = {
-    "MULTI INVOICE PRICE DIFFERENCE": ("482100", "PRICE ADJUSTMENTS"),
-    "UNSEAL/QUANTITY ALLOWANCE": ("482100", "PRICE ADJUSTMENTS"),
-    "QUANTITY DISC ALLOWANCE": ("482100", "PRICE ADJUSTMENTS"),
-    "DEFECTIVE ALLOWANCE": ("488000", "DEFECTIVE ALLOWANCES"),
-    "MARKDOWN BILLING": ("825000", "VENDOR VIOLATIONS"),
-    "WAREHOUSE ALLOWANCE": ("482100", "PRICE ADJUSTMENTS"),
-    "MERCHANDISE SHORTAGE": ("486000", "SHORTAGES"),
-    "MECHANDISE SHORTAGE": ("486000", "SHORTAGES"),
-    "CARTON SHORTAGE FREIGHT": ("486000", "SHORTAGES"),
-    "POD/NO MERCHANDISE SHORTAGE": ("486000", "SHORTAGES"),
-}
+# Phrase -> G/L account and phrase -> abbreviation rules: walmart_cm section of gl_rules.json
 
-# Abbreviations for long chargeback descriptions
-DESCRIPTION_ABBREVIATIONS = {
-    "UNSEAL/QUANTITY ALLOWANCE": "UNSEAL/QTY ALLOW",
-    "QUANTITY DISC ALLOWANCE": "QTY DISC ALLOW",   
-    "DEFECTIVE ALLOWANCE": "DEFECTIVE ALLOW",
-    "MARKDOWN BILLING": "MARKDOWN BILL",
-    "WAREHOUSE ALLOWANCE": "WAREHOUSE ALLOW",
-    "MERCHANDISE SHORTAGE": "MERCHANDISE SHORT",
-    "MECHANDISE SHORTAGE": "MERCHANDISE SHORT",
-    "CARTON SHORTAGE FREIGHT": "FREIGHT SHORT",
-    "POD/NO MERCHANDISE SHORTAGE": "POD SHORTAGE",
-}
-
-def abbreviate_and_truncate(description, max_length=35):
+def abbreviate_and_truncate(description, max_length=35, rules=None):
     # Apply abbreviation if applicable
-    for long_desc, short_desc in DESCRIPTION_ABBREVIATIONS.items():
+    rules = rules or gl_rules.get_rules()
+    for long_desc, short_desc in rules.walmart_cm_abbreviations.rules("abbrev"):
         if long_desc in description.upper():
             description = description.upper().replace(long_desc, short_desc)
     return description[:max_length]
 
-def read_txt_file(file_path):
-    records = []
-    with open(file_path, 'r') as file:
-        for line in file:
-            parts = re.split(r'\s{2,}', line.strip())
-            if len(parts) == 3:
-                customer_no, chargeback_no, amount_str = parts
-                amount = float(re.sub(r'[^\d.-]', '', amount_str))
-                records.append({
-                    "CustomerNumber": customer_no,
-                    "ChargebackNumber": chargeback_no,
-                    "Amount": amount
-                })
-    return records
+def parse_txt_line(line):
+    parts = re.split(r'\s{2,}', line.strip())
+    if len(parts) != 3:
+        return None
+    customer_no, chargeback_no, amount_str = parts
+    amount = float(re.sub(r'[^\d.-]', '', amount_str))
+    return {
+        "CustomerNumber": customer_no,
+        "ChargebackNumber": chargeback_no,
+        "Amount": amount
+    }
+
+def read_txt_file(file_path, workers=None):
+    # Large files are parsed in parallel byte ranges (txt_chunks.py), still in file order
+    return read_records(file_path, parse_txt_line, "walmart_cm", workers=workers)
 
 def generate_ascr_numbers(start_ascr, count):
     prefix, start_num = start_ascr.split('-')
     return [f"{prefix}-{int(start_num) + i:06d}" for i in range(count)]
 
-def find_account_info(description):
-    for key_phrase, (gl_no, desc) in CHARGEBACK_ACCOUNT_MAP.items():
-        if key_phrase in description.upper():
-            return gl_no, desc
-    return "UNKNOWN", "UNKNOWN"
+# Description tables: the parser's Deductions_All (Invoice Number -> DEDUCTION CODE) or any
+# chargeback -> description table
+CHARGEBACK_COLS = ["chargeback number", "chargeback no.", "chargeback no", "chargeback #", "chargeback",
+                   "invoice number"]
+DESCRIPTION_COLS = ["description", "deduction description", "deduction code"]
+
+def description_index(table, key_col=None, desc_col=None):
+    """
+    Chargeback -> description Series on a unique hash index of normalized chargeback numbers.
+    Accepts a DataFrame, a Series or dict keyed by chargeback. Blank descriptions are dropped
+    (Deductions_All repeats the invoice number on the original invoice line); the first
+    description per chargeback wins. A leading "[NNNN] " deduction code is removed.
+    Chargebacks with more than one distinct description are listed in attrs["conflicts"]
+    (chargeback -> every description in table order, the kept one first).
+    """
+    if isinstance(table, dict):
+        table = pd.Series(table, dtype=object)
+    if isinstance(table, pd.Series):
+        keys, descs = table.index.to_numpy(), table.to_numpy()
+    else:
+        key_col = key_col or find_col(table.columns, CHARGEBACK_COLS)
+        desc_col = desc_col or find_col(table.columns, DESCRIPTION_COLS)
+        if key_col is None or desc_col is None:
+            raise ValueError("Description table needs a chargeback/invoice number and a description column")
+        keys, descs = table[key_col].to_numpy(), table[desc_col].to_numpy()
+    descs = pd.Series(descs, dtype=object)
+    descs = descs.where(descs.notna(), "").astype(str).str.strip()
+    descs = descs.str.replace(r"^\[\d{4}\]\s*", "", regex=True)
+    index = pd.Series(descs.to_numpy(), index=normalize_doc_no(keys, prefix="").to_numpy())
+    index = index[(index != "").to_numpy() & (index.index != "")]
+    distinct = pd.DataFrame({"key": index.index, "desc": index.to_numpy()}).drop_duplicates()
+    distinct = distinct[distinct["key"].duplicated(keep=False)]
+    unique = index[~index.index.duplicated()]
+    unique.attrs["conflicts"] = distinct.groupby("key", sort=False)["desc"].agg(list).to_dict()
+    return unique
+
+def join_descriptions(records, table, key_col=None, desc_col=None, output_path=None):
+    """
+    Description per record by chargeback number (one get_indexer call); None where unmatched.
+    Records whose chargeback has conflicting descriptions in the table are reported.
+    """
+    index = description_index(table, key_col, desc_col)
+    keys = normalize_doc_no([r["ChargebackNumber"] for r in records], prefix="")
+    pos = index.index.get_indexer(keys)
+    found = index.to_numpy()
+    conflicts = index.attrs["conflicts"]
+    if conflicts:
+        hit = dict.fromkeys(k for k in keys if k in conflicts)
+        if hit:
+            report_conflicts({k: conflicts[k] for k in hit}, output_path)
+    return [found[p] if p >= 0 else None for p in pos]
 
-def populate_sales_header(records, ascr_numbers, descriptions):
+def report_unmatched(records, output_path):
+    """Write the records without a description next to the output and warn on stderr."""
+    path = Path(output_path)
+    path = path.with_name(f"{path.stem}_unmatched.csv")
+    pd.DataFrame(records, columns=["CustomerNumber", "ChargebackNumber", "Amount"]).to_csv(path, index=False)
+    sample = ", ".join(r["ChargebackNumber"] for r in records[:5])
+    more = f" (+{len(records) - 5} more)" if len(records) > 5 else ""
+    print(f"WARNING: {len(records)} Walmart credit memo record(s) have no description and were left out: "
+          f"{sample}{more}; listed in {path}", file=sys.stderr)
+    return path
+
+def report_conflicts(conflicts, output_path=None):
+    """Warn about chargebacks with several descriptions (the first is used); listed next to the output."""
+    where = ""
+    if output_path is not None:
+        path = Path(output_path)
+        path = path.with_name(f"{path.stem}_conflicting_descriptions.csv")
+        pd.DataFrame([(k, d[0], " | ".join(d[1:])) for k, d in conflicts.items()],
+                     columns=["ChargebackNumber", "Used Description", "Other Descriptions"]).to_csv(path, index=False)
+        where = f"; listed in {path}"
+    keys = list(conflicts)
+    sample = ", ".join(keys[:5])
+    more = f" (+{len(keys) - 5} more)" if len(keys) > 5 else ""
+    print(f"WARNING: {len(keys)} Walmart chargeback(s) have conflicting descriptions, the first was used: "
+          f"{sample}{more}{where}", file=sys.stderr)
+
+def find_account_info(description, rules=None):
+    accounts = (rules or gl_rules.get_rules()).walmart_cm_accounts
+    k = accounts.first_match(description)
+    if k < 0:
+        return "UNKNOWN", "UNKNOWN"
+    return accounts.fields["gl"][k], accounts.fields["gl_desc"][k]
+
+def populate_sales_header(records, ascr_numbers, descriptions, rules=None):
+    rules = rules or gl_rules.get_rules()
     header_data = []
     for record, ascr, desc in zip(records, ascr_numbers, descriptions):
-        truncated_desc = abbreviate_and_truncate(desc)
+        truncated_desc = abbreviate_and_truncate(desc, rules=rules)
         header_data.append({
             "Document Type": "Credit Memo",
             "No.": ascr,
@@ -77,11 +144,15 @@ def populate_sales_header(records, ascr_numbers, descriptions):
         })
     return pd.DataFrame(header_data)
 
-def populate_sales_line(records, ascr_numbers, descriptions):
+def populate_sales_line(records, ascr_numbers, descriptions, rules=None):
+    rules = rules or gl_rules.get_rules()
+    accounts = rules.walmart_cm_accounts
+    hits = accounts.positions(list(descriptions))
+    gl_nos = [g if g is not None else "UNKNOWN" for g in accounts.fields["gl"][hits]]
+    gl_descs = [g if g is not None else "UNKNOWN" for g in accounts.fields["gl_desc"][hits]]
     line_data = []
-    for record, ascr, desc in zip(records, ascr_numbers, descriptions):
-        gl_no, gl_desc = find_account_info(desc)
-        truncated_desc = abbreviate_and_truncate(desc)
+    for record, ascr, desc, gl_no, gl_desc in zip(records, ascr_numbers, descriptions, gl_nos, gl_descs):
+        truncated_desc = abbreviate_and_truncate(desc, rules=rules)
         line_data.append({
             "Document Type": "Credit Memo",
             "Document No.": ascr,
@@ -110,14 +181,51 @@ def populate_sales_line(records, ascr_numbers, descriptions):
         })
     return pd.DataFrame(line_data)
 
-def generate_credit_memo_excel(txt_file_path, start_ascr, descriptions, output_path):
-    records = read_txt_file(txt_file_path)
-    if len(records) != len(descriptions):
+def generate_credit_memo_excel(txt_file_path, start_ascr, descriptions, output_path, ledger=None, repost=False,
+                               shard_rows=None):
+    """
+    descriptions: a list aligned with the TXT records, or a table joined by chargeback number
+    (the parser's Deductions_All frame, any chargeback/description DataFrame, a Series or dict).
+    Joined records without a description are left out and reported (<output>_unmatched.csv);
+    chargebacks with conflicting descriptions use the first and are reported
+    (<output>_conflicting_descriptions.csv).
+    """
+    with stage("walmart_cm.parse_txt") as st:
+        records = read_txt_file(txt_file_path)
+        st.rows_out = len(records)
+    if isinstance(descriptions, (pd.DataFrame, pd.Series, dict)):
+        with stage("walmart_cm.join_descriptions", rows_in=len(records)) as st:
+            descriptions = join_descriptions(records, descriptions, output_path=output_path)
+            unmatched = [r for r, d in zip(records, descriptions) if d is None]
+            if unmatched:
+                report_unmatched(unmatched, output_path)
+                records = [r for r, d in zip(records, descriptions) if d is not None]
+                descriptions = [d for d in descriptions if d is not None]
+            st.rows_out = len(records)
+        if not records:
+            print(f"No Walmart credit memo record matched a description; {output_path} not written")
+            return
+    elif len(records) != len(descriptions):
         raise ValueError("Mismatch between record count and description count")
+    amount_cents = money.to_cents([r["Amount"] for r in records]).fillna(0).tolist()
+    keys = number_keys(make_key("walmart_cm", r["CustomerNumber"], r["ChargebackNumber"], "", c)
+                       for r, c in zip(records, amount_cents))
+    fresh = split_posted(ledger, keys, "Walmart credit memo", repost=repost)
+    records = [r for r, f in zip(records, fresh) if f]
+    descriptions = [d for d, f in zip(descriptions, fresh) if f]
     ascr_numbers = generate_ascr_numbers(start_ascr, len(records))
-    header_df = populate_sales_header(records, ascr_numbers, descriptions)
-    line_df = populate_sales_line(records, ascr_numbers, descriptions)
-    with pd.ExcelWriter(output_path, engine='xlsxwriter') as writer:
-        header_df.to_excel(writer, sheet_name='Sales Header', index=False)
-        line_df.to_excel(writer, sheet_name='Sales Line', index=False)
+    rules = gl_rules.get_rules()  # once per run; the helpers would stat the rule file per record
+    header_df = populate_sales_header(records, ascr_numbers, descriptions, rules)
+    line_df = populate_sales_line(records, ascr_numbers, descriptions, rules)
+    warn_violations(validate_credit_memo(header_df, line_df), output_path)
+    with stage("walmart_cm.write_xlsx", rows_in=len(header_df) + len(line_df)) as st:
+        if shard_rows and len(header_df) + len(line_df) > shard_rows:
+            _, output_path = write_credit_memo_shards(header_df, line_df, output_path, shard_rows)
+        else:
+            with pd.ExcelWriter(output_path, engine='xlsxwriter') as writer:
+                header_df.to_excel(writer, sheet_name='Sales Header', index=False)
+                line_df.to_excel(writer, sheet_name='Sales Line', index=False)
+        st.rows_out = len(header_df) + len(line_df)
+    if ledger is not None:
+        ledger.record([k for k, f in zip(keys, fresh) if f], output=output_path)
     print(f"Walmart Credit Memo Excel generated: {output_path}")
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+benchmark_suite.py
+- Times the public functions of every processing script on synthetic inputs (synthetic_data.py)
+- Sizes: 1k / 10k / 100k / 1m rows (--sizes 1k,10k); each benchmark has a default row cap so
+  quadratic steps (fill_internal_invoice_dates) don't run for hours; --no-caps lifts them
+- Stores results as a JSON baseline (--save-baseline) and compares later runs against it
+  (--baseline); a benchmark whose median is more than --threshold slower fails the run (exit 1)
+- Exporters that write to the hard-coded /mnt/data directory are skipped when it isn't writable
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+import synthetic_data as sd
+from nav_scripts import load_script, SCRIPTS
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+MNT_DATA = "/mnt/data"
+
+
+class Skip(Exception):
+    pass
+
+
+def _mnt_data_writable():
+    return os.path.isdir(MNT_DATA) and os.access(MNT_DATA, os.W_OK)
+
+
+# Each benchmark: name -> (cap, setup(n, tmp) -> state, run(state))
+# setup does all input generation so only the function under test is timed.
+
+def _bench_read_check_files():
+    parser = load_script("walmart_parser")
+
+    def setup(n, tmp):
+        d = Path(tmp) / f"checks_{n}"
+        if not d.exists():
+            sd.write_walmart_check_files(d, n)
+        return d
+
+    return parser.read_check_files, setup, lambda fn, d: fn(d)
+
+
+def _walmart_parsed_frame(n):
+    """Frame shaped like read_check_files output, without the xlsx round trip."""
+    per_check = 2_000
+    frames = []
+    for k in range(0, n, per_check):
+        df = sd.make_walmart_check_frame(min(per_check, n - k), seed=k)
+        df["_file"] = f"Check_{1256261 + k // per_check:09d}.xlsx"
+        df["_row_in_file"] = range(len(df))
+        df["Check No"] = f"{1256261 + k // per_check:09d}"
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
+
+
+def _bench_fill_internal_invoice_dates():
+    parser = load_script("walmart_parser")
+
+    def setup(n, tmp):
+        return _walmart_parsed_frame(n)
+
+    return parser.fill_internal_invoice_dates, setup, lambda fn, df: fn(df.copy())
+
+
+def _bench_final_order():
+    parser = load_script("walmart_parser")
+
+    def setup(n, tmp):
+        df = _walmart_parsed_frame(n)
+        df["Internal Invoice Date"] = None
+        return df
+
+    return parser.final_order, setup, lambda fn, df: fn(df.copy())
+
+
+def _bench_clean_rows_postparse():
+    parser = load_script("walmart_parser")
+
+    def setup(n, tmp):
+        df = _walmart_parsed_frame(n)
+        df["Internal Invoice Date"] = None
+        return parser.final_order(df)
+
+    return parser.clean_rows_postparse, setup, lambda fn, df: fn(df.copy())
+
+
+def _bench_process_walmart_file():
+    proc = load_script("walmart_processing")
+
+    def setup(n, tmp):
+        return sd.make_walmart_check_frame(n)
+
+    return proc.process_walmart_file, setup, lambda fn, df: fn(df.copy(), "001256261", "01/06/2025")
+
+
+def _bench_process_chargebacks():
+    amazon = load_script("amazon")
+
+    def setup(n, tmp):
+        return sd.make_amazon_remittance(n)
+
+    return amazon.process_chargebacks, setup, lambda fn, rows: fn(rows, "9876543", 0.0, "01/06/2025")
+
+
+def _bench_export_chargebacks_to_excel():
+    amazon = load_script("amazon")
+
+    def setup(n, tmp):
+        df = amazon.process_chargebacks(sd.make_amazon_remittance(n), "9876543", 0.0, "01/06/2025")
+        return df, tmp
+
+    return (amazon.export_chargebacks_to_excel, setup,
+            lambda fn, st: fn(st[0].copy(), "9876543", 1234.56, export_dir=st[1]))
+
+
+def _bench_txt_reader(key, kind):
+    mod = load_script(key)
+
+    def setup(n, tmp):
+        return sd.write_txt_file(Path(tmp) / f"{kind}_{n}.txt", n, kind=kind)
+
+    return mod.read_txt_file, setup, lambda fn, path: fn(path)
+
+
+def _bench_coop_credit_memo():
+    coop = load_script("coop")
+
+    def setup(n, tmp):
+        return sd.write_txt_file(Path(tmp) / f"coop_{n}.txt", n, kind="coop"), Path(tmp) / "coop_out.xlsx"
+
+    return (coop.generate_credit_memo_excel, setup,
+            lambda fn, st: fn(st[0], "ASCR-000001", st[1]))
+
+
+def _bench_walmart_cm_credit_memo():
+    wcm = load_script("walmart_cm")
+
+    def setup(n, tmp):
+        path = sd.write_txt_file(Path(tmp) / f"walmart_cm_{n}.txt", n, kind="walmart_cm")
+        return path, sd.make_walmart_cm_descriptions(n), Path(tmp) / "walmart_cm_out.xlsx"
+
+    return (wcm.generate_credit_memo_excel, setup,
+            lambda fn, st: fn(st[0], "ASCR-000001", st[1], st[2]))
+
+
+def _bench_walmart_cm_joined():
+    wcm = load_script("walmart_cm")
+
+    def setup(n, tmp):
+        path = sd.write_txt_file(Path(tmp) / f"walmart_cm_{n}.txt", n, kind="walmart_cm")
+        table = pd.DataFrame({
+            "Invoice Number": [r["ChargebackNumber"] for r in wcm.read_txt_file(path)],
+            "DEDUCTION CODE": sd.make_walmart_cm_descriptions(n),
+        }).sample(frac=1, random_state=0)
+        return path, table, Path(tmp) / "walmart_cm_out.xlsx"
+
+    return (wcm.generate_credit_memo_excel, setup,
+            lambda fn, st: fn(st[0], "ASCR-000001", st[1], st[2]))
+
+
+def _bench_build_export():
+    dra = load_script("dra")
+
+    def setup(n, tmp):
+        if not _mnt_data_writable():
+            raise Skip(f"{MNT_DATA} is not writable")
+        return sd.make_audit_trails(n)
+
+    return dra.build_export, setup, lambda fn, rows: fn(rows, "RA999999")
+
+
+def _bench_price_adjustments():
+    price = load_script("price_adjustments")
+
+    def setup(n, tmp):
+        if not _mnt_data_writable():
+            raise Skip(f"{MNT_DATA} is not writable")
+        return sd.make_price_data(n)
+
+    return price.process_price_adjustments_from_prices, setup, lambda fn, rows: fn(rows, "SI999999")
+
+
+def _bench_rebill():
+    rebill = load_script("rebill")
+
+    def setup(n, tmp):
+        return sd.make_audit_trails(n), Path(tmp) / "rebill_out.xlsx"
+
+    return (rebill.export_to_excel_with_customer_names, setup,
+            lambda fn, st: fn(st[0], "RA999999", "SI999999", "C001", "C002", "Customer One", "Customer Two",
+                              output_path=str(st[1])))
+
+
+# name -> (default row cap, factory)
+BENCHMARKS = {
+    "read_check_files": (100_000, _bench_read_check_files),
+    "fill_internal_invoice_dates": (1_000, _bench_fill_internal_invoice_dates),
+    "final_order": (None, _bench_final_order),
+    "clean_rows_postparse": (None, _bench_clean_rows_postparse),
+    "process_walmart_file": (100_000, _bench_process_walmart_file),
+    "process_chargebacks": (None, _bench_process_chargebacks),
+    "export_chargebacks_to_excel": (100_000, _bench_export_chargebacks_to_excel),
+    "coop.read_txt_file": (None, lambda: _bench_txt_reader("coop", "coop")),
+    "walmart_cm.read_txt_file": (None, lambda: _bench_txt_reader("walmart_cm", "walmart_cm")),
+    "coop.generate_credit_memo_excel": (100_000, _bench_coop_credit_memo),
+    "walmart_cm.generate_credit_memo_excel": (100_000, _bench_walmart_cm_credit_memo),
+    "walmart_cm.generate_credit_memo_excel[joined]": (100_000, _bench_walmart_cm_joined),
+    "build_export": (100_000, _bench_build_export),
+    "process_price_adjustments_from_prices": (100_000, _bench_price_adjustments),
+    "export_to_excel_with_customer_names": (100_000, _bench_rebill),
+}
+
+
+def run_benchmarks(names, sizes, repeat=3, no_caps=False, work_dir=None):
+    """Returns {"<name>@<rows>": {"median_s", "min_s", "runs", "rows"}} plus skip notes."""
+    results, skipped = {}, {}
+    tmp_ctx = tempfile.TemporaryDirectory(prefix="nav_bench_") if work_dir is None else None
+    tmp = work_dir or tmp_ctx.name
+    try:
+        for name in names:
+            cap, factory = BENCHMARKS[name]
+            try:
+                fn, setup, call = factory()
+            except SyntaxError as e:
+                skipped[name] = f"script does not parse: {e}"
+                continue
+            for n in sizes:
+                key = f"{name}@{n}"
+                if cap is not None and n > cap and not no_caps:
+                    skipped[key] = f"above default cap of {cap} rows (use --no-caps)"
+                    continue
+                try:
+                    state = setup(n, tmp)
+                except Skip as e:
+                    skipped[key] = str(e)
+                    continue
+                runs = max(1, repeat if n <= 100_000 else 1)
+                times = []
+                for _ in range(runs):
+                    t0 = time.perf_counter()
+                    call(fn, state)
+                    times.append(time.perf_counter() - t0)
+                results[key] = {
+                    "rows": n,
+                    "median_s": round(statistics.median(times), 6),
+                    "min_s": round(min(times), 6),
+                    "runs": runs,
+                }
+                print(f"{key:<50} median {results[key]['median_s']:>10.4f}s  ({runs} run(s))")
+    finally:
+        if tmp_ctx is not None:
+            tmp_ctx.cleanup()
+    return results, skipped
+
+
+def compare_to_baseline(results, baseline, threshold):
+    """List of (key, baseline_s, current_s, ratio) for benchmarks slower than 1 + threshold."""
+    regressions = []
+    for key, cur in results.items():
+        base = baseline.get("results", {}).get(key)
+        if not base or base["median_s"] <= 0:
+            continue
+        ratio = cur["median_s"] / base["median_s"]
+        if ratio > 1 + threshold:
+            regressions.append((key, base["median_s"], cur["median_s"], ratio))
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the NAV processing scripts on synthetic data")
+    ap.add_argument("--sizes", default="1k,10k", help="Comma list of 1k, 10k, 100k, 1m or integers")
+    ap.add_argument("--only", default="", help="Comma list of benchmark names (default: all)")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--no-caps", action="store_true", help="Run every size even above a benchmark's cap")
+    ap.add_argument("--baseline", default=None, help="Compare against this baseline JSON")
+    ap.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, default=None,
+                    help=f"Write results as a new baseline (default {DEFAULT_BASELINE})")
+    ap.add_argument("--threshold", type=float, default=0.25,
+                    help="Allowed slowdown vs baseline before failing (0.25 = 25%%)")
+    ap.add_argument("--list", action="store_true", help="List benchmark names and exit")
+    args = ap.parse_args()
+
+    if args.list:
+        for name, (cap, _) in BENCHMARKS.items():
+            print(f"{name:<45} cap={cap or '-'}")
+        return 0
+
+    names = [n.strip() for n in args.only.split(",") if n.strip()] or list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        ap.error(f"unknown benchmark(s): {', '.join(unknown)}")
+    sizes = [sd.parse_size(s) for s in args.sizes.split(",") if s.strip()]
+
+    results, skipped = run_benchmarks(names, sizes, repeat=args.repeat, no_caps=args.no_caps)
+    for key, why in skipped.items():
+        print(f"SKIP {key}: {why}")
+
+    if args.save_baseline:
+        payload = {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.node(),
+            "scripts": SCRIPTS,
+            "results": results,
+        }
+        Path(args.save_baseline).write_text(json.dumps(payload, indent=2), encoding="utf-8")
+        print(f"Baseline written to: {args.save_baseline}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        for key, base_s, cur_s, ratio in regressions:
+            print(f"REGRESSION {key}: {base_s:.4f}s -> {cur_s:.4f}s ({ratio:.2f}x)", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+deduction_store.py
+- Local analytics store of Walmart deductions, fed by the parser output, so totals by deduction
+  code / store / DC / month come from one query instead of re-parsing every Check_*.xlsx
+- SQLite file (NAV_DEDUCTION_STORE=<path>, default nav_deductions.sqlite in the working directory):
+  checks     one row per ingested check (rows, deduction total, source, time)
+  deductions append-only detail: one row per deduction line (amount < 0), amounts in int cents
+  rollup     sum/count per (code, store, DC, month), maintained incrementally
+- Ingest is per check: checks already in the store are skipped, and only the new checks' lines are
+  added to the rollup (upsert adding sums/counts) in the same transaction as their detail rows,
+  so the rollup always equals a full regroup of the detail table (verify checks that)
+- Month is the "Date Paid" month (YYYY-MM), falling back to "Invoice Date"; code is the [NNNN] code
+- Queries read only the rollup table; workbooks are never re-read
+- CLI: python deduction_store.py ingest Deductions_All.xlsx | --checks-dir ./checks (reads only
+       Check_*.xlsx files whose check isn't stored yet)
+       python deduction_store.py query --by code,month [--code 0100] [--month 2025-01] [--dc 6006]
+       python deduction_store.py checks | verify
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import money
+from stage_profiler import stage
+
+DEFAULT_STORE_PATH = "nav_deductions.sqlite"
+DIMENSIONS = ("code", "store", "dc", "month")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checks (
+    check_no     TEXT    PRIMARY KEY,
+    lines        INTEGER NOT NULL,
+    amount_cents INTEGER NOT NULL,
+    source       TEXT,
+    ingested_at  TEXT    NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS deductions (
+    check_no     TEXT    NOT NULL,
+    line         INTEGER NOT NULL,
+    code         TEXT    NOT NULL,
+    store        TEXT    NOT NULL,
+    dc           TEXT    NOT NULL,
+    month        TEXT    NOT NULL,
+    invoice      TEXT    NOT NULL,
+    amount_cents INTEGER NOT NULL,
+    PRIMARY KEY (check_no, line)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup (
+    code         TEXT    NOT NULL,
+    store        TEXT    NOT NULL,
+    dc           TEXT    NOT NULL,
+    month        TEXT    NOT NULL,
+    amount_cents INTEGER NOT NULL,
+    lines        INTEGER NOT NULL,
+    PRIMARY KEY (code, store, dc, month)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rollup_month ON rollup (month);
+CREATE INDEX IF NOT EXISTS rollup_dc ON rollup (dc, month);
+CREATE INDEX IF NOT EXISTS rollup_store ON rollup (store, month);
+"""
+
+_ROLLUP_UPSERT = """
+INSERT INTO rollup (code, store, dc, month, amount_cents, lines) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (code, store, dc, month) DO UPDATE SET
+    amount_cents = amount_cents + excluded.amount_cents,
+    lines = lines + excluded.lines
+"""
+
+# Parser output column names (same lookups the parser uses)
+COLUMN_NAMES = {
+    "check": ["check no"],
+    "amount": ["amount paid($)", "amount paid ($)", "amount paid"],
+    "code": ["deduction code"],
+    "store": ["store number", "store #", "store"],
+    "dc": ["dc number", "dc #", "dc"],
+    "invoice": ["invoice number"],
+    "paid": ["date paid"],
+    "invoice_date": ["invoice date"],
+}
+
+
+def find_col(df, names):
+    low = {str(c).strip().lower(): c for c in df.columns}
+    for n in names:
+        if n in low:
+            return low[n]
+    return None
+
+
+def _text(df, col):
+    """Stripped strings, '' for blanks; whole-number floats (Excel store numbers) lose the .0."""
+    if col is None:
+        return np.full(len(df), "", dtype=object)
+    s = df[col]
+    if pd.api.types.is_float_dtype(s):
+        s = s.map(lambda v: "" if pd.isna(v) else (str(int(v)) if float(v).is_integer() else str(v)))
+    return s.astype(object).where(s.notna(), "").astype(str).str.strip().to_numpy(dtype=object)
+
+
+def deduction_lines(df):
+    """
+    Parser output -> one row per deduction line: check_no, line, code, store, dc, month,
+    invoice, amount_cents. line is the row's position within its check in the parser output.
+    """
+    cols = {k: find_col(df, names) for k, names in COLUMN_NAMES.items()}
+    missing = [k for k in ("check", "amount") if cols[k] is None]
+    if missing:
+        raise ValueError(f"Parser output has no {', '.join(missing)} column")
+    check = _text(df, cols["check"])
+    cents = money.to_cents(df[cols["amount"]].reset_index(drop=True))
+    line = pd.Series(check).groupby(check, sort=False).cumcount().to_numpy(dtype="int64")
+    codes = pd.Series(_text(df, cols["code"])).str.extract(r"\[(\d{4})\]", expand=False).fillna("")
+    month = pd.Series(pd.NaT, index=range(len(df)), dtype="datetime64[ns]")
+    for key in ("paid", "invoice_date"):
+        if cols[key] is not None:
+            month = month.fillna(pd.to_datetime(df[cols[key]].reset_index(drop=True), errors="coerce"))
+    out = pd.DataFrame({
+        "check_no": check,
+        "line": line,
+        "code": codes.to_numpy(dtype=object),
+        "store": _text(df, cols["store"]),
+        "dc": _text(df, cols["dc"]),
+        "month": month.dt.strftime("%Y-%m").fillna("").to_numpy(dtype=object),
+        "invoice": _text(df, cols["invoice"]),
+        "amount_cents": cents,
+    })
+    keep = (out["amount_cents"].notna() & (out["amount_cents"] < 0)).to_numpy(dtype=bool)
+    out = out.loc[keep].reset_index(drop=True)
+    out["amount_cents"] = out["amount_cents"].astype("int64")
+    return out
+
+
+class DeductionStore:
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = str(path)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.environ.get("NAV_DEDUCTION_STORE", "").strip() or DEFAULT_STORE_PATH)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def known_checks(self):
+        return {row[0] for row in self.conn.execute("SELECT check_no FROM checks")}
+
+    def ingest(self, df, source=None):
+        """
+        Add the checks in a parser output frame that aren't stored yet; returns
+        (new checks, skipped checks, deduction lines added). One transaction for the batch.
+        """
+        with stage("store.ingest", rows_in=len(df)) as st:
+            lines = deduction_lines(df)
+            all_checks = pd.unique(_text(df, find_col(df, COLUMN_NAMES["check"])))
+            known = self.known_checks()
+            new_checks = [c for c in all_checks if c and c not in known]
+            skipped = [c for c in all_checks if c in known]
+            lines = lines[lines["check_no"].isin(new_checks)]
+            if not new_checks:
+                st.rows_out = 0
+                return [], skipped, 0
+            per_check = lines.groupby("check_no")["amount_cents"].agg(["size", "sum"])
+            groups = lines.groupby(list(DIMENSIONS), sort=False)["amount_cents"].agg(["sum", "size"]).reset_index()
+            now = datetime.now().isoformat(timespec="seconds")
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT INTO checks (check_no, lines, amount_cents, source, ingested_at) VALUES (?, ?, ?, ?, ?)",
+                    ((c, int(per_check["size"].get(c, 0)), int(per_check["sum"].get(c, 0)),
+                      None if source is None else str(source), now) for c in new_checks),
+                )
+                self.conn.executemany(
+                    "INSERT INTO deductions (check_no, line, code, store, dc, month, invoice, amount_cents) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    zip(lines["check_no"], lines["line"].tolist(), lines["code"], lines["store"], lines["dc"],
+                        lines["month"], lines["invoice"], lines["amount_cents"].tolist()),
+                )
+                self.conn.executemany(
+                    _ROLLUP_UPSERT,
+                    zip(groups["code"], groups["store"], groups["dc"], groups["month"],
+                        groups["sum"].tolist(), groups["size"].tolist()),
+                )
+            st.rows_out = len(lines)
+        return new_checks, skipped, len(lines)
+
+    def query(self, by=("code",), **filters):
+        """
+        Totals from the rollup: one row per combination of the `by` dimensions, with
+        amount_cents and lines. filters: code/store/dc/month = value or list of values;
+        month_from / month_to bound the month (inclusive, YYYY-MM).
+        """
+        by = [d for d in by if d]
+        bad = [d for d in by if d not in DIMENSIONS]
+        if bad:
+            raise ValueError(f"Unknown dimension(s): {', '.join(bad)} (use {', '.join(DIMENSIONS)})")
+        where, args = [], []
+        for dim in DIMENSIONS:
+            val = filters.get(dim)
+            if val is None:
+                continue
+            vals = [val] if isinstance(val, str) else list(val)
+            where.append(f"{dim} IN ({', '.join('?' * len(vals))})")
+            args.extend(vals)
+        if filters.get("month_from"):
+            where.append("month >= ?")
+            args.append(filters["month_from"])
+        if filters.get("month_to"):
+            where.append("month <= ?")
+            args.append(filters["month_to"])
+        select = ", ".join(by + ["SUM(amount_cents)", "SUM(lines)"])
+        sql = f"SELECT {select} FROM rollup"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if by:
+            sql += f" GROUP BY {', '.join(by)} ORDER BY {', '.join(by)}"
+        rows = self.conn.execute(sql, args).fetchall()
+        out = pd.DataFrame(rows, columns=by + ["amount_cents", "lines"])
+        out = out[out["lines"].notna()]
+        return out.astype({"amount_cents": "int64", "lines": "int64"})
+
+    def checks(self):
+        return self.conn.execute(
+            "SELECT check_no, lines, amount_cents, source, ingested_at FROM checks ORDER BY check_no"
+        ).fetchall()
+
+    def verify(self):
+        """Rollup rows that differ from a full regroup of the detail table (empty list when consistent)."""
+        sql = """
+        SELECT r.code, r.store, r.dc, r.month, r.amount_cents, r.lines, d.amount_cents, d.lines
+        FROM rollup r LEFT JOIN (
+            SELECT code, store, dc, month, SUM(amount_cents) AS amount_cents, COUNT(*) AS lines
+            FROM deductions GROUP BY code, store, dc, month
+        ) d USING (code, store, dc, month)
+        WHERE d.lines IS NULL OR d.lines != r.lines OR d.amount_cents != r.amount_cents
+        """
+        bad = self.conn.execute(sql).fetchall()
+        detail_groups = self.conn.execute(
+            "SELECT COUNT(*) FROM (SELECT 1 FROM deductions GROUP BY code, store, dc, month)").fetchone()[0]
+        rollup_groups = self.conn.execute("SELECT COUNT(*) FROM rollup").fetchone()[0]
+        if detail_groups != rollup_groups:
+            bad.append(("group count", detail_groups, rollup_groups))
+        return bad
+
+
+# ---------- parser feed ----------
+
+def check_number(path):
+    m = re.search(r"Check_(\d+)\.xlsx$", Path(path).name, flags=re.IGNORECASE)
+    return m.group(1) if m else ""
+
+
+def parse_new_checks(input_dir, known):
+    """
+    Parser output for the Check_*.xlsx files whose check isn't in `known`, read per file with the
+    parser's own read / final_order / clean steps. The Internal Invoice Date fill is skipped: the
+    rollups don't use it.
+    """
+    parser = _parser()
+    paths = [p for p in sorted(Path(input_dir).glob("Check_*.xlsx")) if check_number(p) not in known]
+    frames = []
+    for p in paths:
+        try:
+            frames.append(parser.read_check_file(p))
+        except Exception as e:
+            print(f"WARNING: failed to read {p}: {e}", file=sys.stderr)
+    df = parser.combine_check_frames(frames)
+    if df.empty:
+        return df
+    df = parser.final_order(df)
+    return parser.clean_rows_postparse(df)
+
+
+def _parser():
+    from nav_scripts import load_script
+    return load_script("walmart_parser")
+
+
+def read_parser_output(path):
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        return pd.read_csv(path, dtype=str, keep_default_na=False)
+    if suffix == ".parquet":
+        return pd.read_parquet(path)
+    return pd.read_excel(path, dtype={"Check No": str})
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Walmart deduction analytics store")
+    ap.add_argument("--db", default=os.environ.get("NAV_DEDUCTION_STORE") or DEFAULT_STORE_PATH,
+                    help=f"Store file (default NAV_DEDUCTION_STORE or {DEFAULT_STORE_PATH})")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    ing = sub.add_parser("ingest", help="Add new checks from parser output or a Check_*.xlsx folder")
+    ing.add_argument("outputs", nargs="*", help="Parser output files (.xlsx/.csv/.parquet)")
+    ing.add_argument("--checks-dir", help="Read only the not-yet-stored Check_*.xlsx files here")
+
+    q = sub.add_parser("query", help="Totals from the rollup")
+    q.add_argument("--by", default="code", help=f"Comma list of {', '.join(DIMENSIONS)} ('' for a grand total)")
+    for dim in DIMENSIONS:
+        q.add_argument(f"--{dim}", action="append", help=f"Only this {dim} (repeatable)")
+    q.add_argument("--from", dest="month_from", help="First month, YYYY-MM")
+    q.add_argument("--to", dest="month_to", help="Last month, YYYY-MM")
+    q.add_argument("--csv", help="Also write the result to this CSV")
+
+    sub.add_parser("checks", help="List ingested checks")
+    sub.add_parser("verify", help="Check the rollup against the detail rows")
+    args = ap.parse_args()
+
+    with DeductionStore(args.db) as store:
+        if args.cmd == "ingest":
+            if not args.outputs and not args.checks_dir:
+                ap.error("ingest needs parser output files or --checks-dir")
+            sources = [(p, lambda p=p: read_parser_output(p)) for p in args.outputs]
+            if args.checks_dir:
+                sources.append((args.checks_dir, lambda: parse_new_checks(args.checks_dir, store.known_checks())))
+            for source, load in sources:
+                df = load()
+                if df.empty:
+                    print(f"{source}: no new checks")
+                    continue
+                new, skipped, n = store.ingest(df, source=source)
+                print(f"{source}: {len(new)} new check(s), {n} deduction line(s); "
+                      f"{len(skipped)} already stored")
+            return 0
+
+        if args.cmd == "query":
+            by = [d.strip() for d in args.by.split(",") if d.strip()]
+            filters = {d: getattr(args, d) for d in DIMENSIONS}
+            t0 = time.perf_counter()
+            try:
+                result = store.query(by, month_from=args.month_from, month_to=args.month_to, **filters)
+            except ValueError as e:
+                ap.error(str(e))
+            elapsed = (time.perf_counter() - t0) * 1000
+            shown = result.assign(amount=money.format_cents(result["amount_cents"].to_numpy(dtype="int64")))
+            print(shown.drop(columns="amount_cents").to_string(index=False))
+            print(f"{len(result)} row(s) in {elapsed:.1f} ms", file=sys.stderr)
+            if args.csv:
+                shown.drop(columns="amount_cents").to_csv(args.csv, index=False)
+            return 0
+
+        if args.cmd == "checks":
+            for check_no, lines, cents, source, at in store.checks():
+                print(f"{check_no}\t{lines}\t{money.format_cents(cents)}\t{source or ''}\t{at}")
+            return 0
+
+        bad = store.verify()
+        for row in bad:
+            print("MISMATCH:", *row)
+        print("rollup OK" if not bad else f"{len(bad)} rollup mismatch(es)")
+        return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+"""
+equivalence_harness.py
+- Runs the frozen reference implementation (reference/*.py, copies of the scripts as they were
+  before any performance rewrite) and the current scripts on the same inputs, then compares
+  the resulting frames cell by cell
+- Cases: fill_internal_invoice_dates, clean_rows_postparse, process_walmart_file,
+  process_walmart_file_text, process_chargebacks, parser_pipeline (read -> date fill -> final
+  order -> clean), amazon_netting, money_rounding,
+  cm_description_conflicts, invoice_index_batch
+- process_chargebacks compares the gross journal (netting=False): the reference predates
+  reversal netting. amazon_netting checks net_reversals instead against a small hand-computed
+  remittance (full, partial and exceeding reversals, no original, no category, '*' originals):
+  the netted journal and attrs["unmatched_reversals"] must match the expected values exactly
+- money_rounding pins the money rounding rules against hand-computed cents: line_cents prices
+  qty x the unrounded unit price with one half-up rounding, mul_qty rounds fractional
+  quantities half up, to_cents still reads float() text such as '1e3'
+- cm_description_conflicts joins Walmart credit memo records to a description table where one
+  chargeback has two descriptions: the first is used and the chargeback is listed in
+  <output>_conflicting_descriptions.csv
+- invoice_index_batch runs the parser pipeline with an empty invoice index over two checks in one
+  folder: the deduction on the later check fills from the invoice on the earlier one on that
+  first run ("index (Check <no>)")
+- process_walmart_file_text is a known behavior change: the current script reads $1,234.56 /
+  ($1,234.56) text amounts, the reference's clean_amount turns them into NaN and posts nothing
+  (0 journal lines). The case therefore runs the reference on the same amounts as numbers and
+  requires the current output on the text frame to equal it
+- Inputs are generated (synthetic_data.py, --rows) or recorded (--checks-dir, --remittance, --amazon-json)
+- Numbers compare with --rtol/--atol, date columns compare on the calendar date, everything
+  else compares as exact text; NaN/None/NaT are equal to each other
+- The reference parser fill is O(n^2) (an iloc scan per deduction), so the generated inputs of
+  the parser cases are capped at --parser-rows (default 1,000: about ten seconds per case on a
+  cold start); the other cases use --rows. Recorded --checks-dir inputs are never capped
+- Reference outputs are cached per input hash in --golden-dir; the cache is a local speed-up
+  only (not committed), and CI starts without it, which the parser cap keeps affordable
+- --compare-workbooks a.xlsx b.xlsx compares two written workbooks sheet by sheet, raw cells
+  with the header row included as data; --compact-dates is the one normalization for a parser
+  --compact run (its text date columns become datetime cells): data cells under a header naming
+  a date compare on the calendar date; header cells and every other column stay strict
+- Exits 1 and prints the first differing rows when anything differs
+"""
+import argparse
+import hashlib
+import json
+import pickle
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import money
+import synthetic_data as sd
+from nav_scripts import load_script, REPO_DIR, SCRIPTS
+
+REFERENCE_DIR = REPO_DIR / "reference"
+DEFAULT_GOLDEN_DIR = REPO_DIR / ".golden_cache"
+# The reference fill_internal_invoice_dates is quadratic; keep cold (uncached) CI runs short
+PARSER_ROW_CAP = 1_000
+
+
+def load_reference(key):
+    return load_script(REFERENCE_DIR / SCRIPTS[key], module_name=f"ref_{key}")
+
+
+# ---------- comparison ----------
+
+def _is_date_col(name, a, b):
+    return ("date" in str(name).lower()
+            or pd.api.types.is_datetime64_any_dtype(a)
+            or pd.api.types.is_datetime64_any_dtype(b))
+
+
+def _as_dates(s):
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s.dt.normalize()
+    return pd.to_datetime(s, errors="coerce", format="mixed").dt.normalize()
+
+
+def compare_series(name, a, b, rtol=1e-9, atol=0.005):
+    """Boolean mask (aligned on position) of cells that differ."""
+    a = a.reset_index(drop=True)
+    b = b.reset_index(drop=True)
+    na_a, na_b = a.isna().to_numpy(), b.isna().to_numpy()
+    equal = na_a & na_b
+    pending = ~equal & ~(na_a ^ na_b)   # both present; one-sided NaN is a difference
+
+    if _is_date_col(name, a, b):
+        da, db = _as_dates(a), _as_dates(b)
+        both = (da.notna() & db.notna()).to_numpy() & pending
+        equal |= both & (da.to_numpy() == db.to_numpy())
+        pending &= ~both
+
+    num_a = pd.to_numeric(a, errors="coerce").to_numpy(dtype="float64")
+    num_b = pd.to_numeric(b, errors="coerce").to_numpy(dtype="float64")
+    both_num = ~np.isnan(num_a) & ~np.isnan(num_b) & pending
+    with np.errstate(invalid="ignore"):
+        equal |= both_num & np.isclose(num_a, num_b, rtol=rtol, atol=atol)
+    pending &= ~both_num
+
+    text_eq = a.astype(str).to_numpy() == b.astype(str).to_numpy()
+    equal |= pending & text_eq
+    return ~equal
+
+
+def compare_frames(ref, cand, rtol=1e-9, atol=0.005, max_report=10):
+    """
+    Returns a list of human-readable differences (empty when equivalent). Shape and column
+    mismatches are reported first; then up to max_report differing rows with their cells.
+    """
+    problems = []
+    if list(ref.columns) != list(cand.columns):
+        missing = [c for c in ref.columns if c not in cand.columns]
+        extra = [c for c in cand.columns if c not in ref.columns]
+        problems.append(f"columns differ: missing={missing} extra={extra} "
+                        f"order_equal={sorted(map(str, ref.columns)) == sorted(map(str, cand.columns))}")
+    if len(ref) != len(cand):
+        problems.append(f"row count differs: reference={len(ref)} candidate={len(cand)}")
+
+    n = min(len(ref), len(cand))
+    common = [c for c in ref.columns if c in cand.columns]
+    if n == 0 or not common:
+        return problems
+    diff = np.zeros((n, len(common)), dtype=bool)
+    for k, col in enumerate(common):
+        diff[:, k] = compare_series(col, ref[col].iloc[:n], cand[col].iloc[:n], rtol=rtol, atol=atol)
+    bad_rows = np.flatnonzero(diff.any(axis=1))
+    if len(bad_rows):
+        problems.append(f"{len(bad_rows)} row(s) differ; first at position {bad_rows[0]}")
+    for r in bad_rows[:max_report]:
+        cells = [
+            f"{common[k]!s}: {ref[common[k]].iloc[r]!r} != {cand[common[k]].iloc[r]!r}"
+            for k in np.flatnonzero(diff[r])
+        ]
+        problems.append(f"  row {r} (ref index {ref.index[r]!r}): " + "; ".join(cells))
+    return problems
+
+
+def read_workbook(path):
+    """{sheet name: DataFrame of raw cell values, header row included as data}."""
+    return pd.read_excel(path, sheet_name=None, header=None)
+
+
+def normalize_compact_dates(frame):
+    """
+    For a parser --compact workbook only: data cells of columns whose header cell names a date
+    become 'YYYY-MM-DD' text (cells that don't parse are left as they are).
+    """
+    out = frame.copy()
+    if out.empty:
+        return out
+    for col in out.columns:
+        if "date" not in str(out[col].iloc[0]).lower():
+            continue
+        cells = out[col].iloc[1:].astype(object)
+        parsed = pd.to_datetime(cells, errors="coerce", format="mixed")
+        out[col] = pd.concat([out[col].iloc[:1].astype(object),
+                              parsed.dt.strftime("%Y-%m-%d").where(parsed.notna(), cells)])
+    return out
+
+
+def compare_workbooks(ref_path, cand_path, compact_dates=False, **kw):
+    ref, cand = read_workbook(ref_path), read_workbook(cand_path)
+    if compact_dates:
+        ref = {name: normalize_compact_dates(f) for name, f in ref.items()}
+        cand = {name: normalize_compact_dates(f) for name, f in cand.items()}
+    problems = []
+    if list(ref) != list(cand):
+        problems.append(f"sheets differ: reference={list(ref)} candidate={list(cand)}")
+    for sheet in ref:
+        if sheet not in cand:
+            continue
+        for p in compare_frames(ref[sheet], cand[sheet], **kw):
+            problems.append(f"[{sheet}] {p}")
+    return problems
+
+
+# ---------- inputs ----------
+
+def _hash_input(obj):
+    h = hashlib.sha1()
+    if isinstance(obj, pd.DataFrame):
+        h.update(json.dumps([str(c) for c in obj.columns]).encode())
+        h.update(pd.util.hash_pandas_object(obj.astype(str), index=True).to_numpy().tobytes())
+    else:
+        h.update(json.dumps(obj, sort_keys=True, default=str).encode())
+    return h.hexdigest()[:16]
+
+
+def _walmart_checks_frame(args, parser):
+    if args.checks_dir:
+        return parser.read_check_files(Path(args.checks_dir))
+    rows = min(args.rows, args.parser_rows) if args.parser_rows else args.rows
+    with tempfile.TemporaryDirectory(prefix="nav_equiv_") as tmp:
+        sd.write_walmart_check_files(tmp, rows, rows_per_check=args.rows_per_check, seed=args.seed)
+        return parser.read_check_files(Path(tmp))
+
+
+def _remittance_frame(args):
+    if args.remittance:
+        return pd.read_excel(args.remittance)
+    return sd.make_walmart_check_frame(args.rows, seed=args.seed)
+
+
+def _amazon_rows(args):
+    if args.amazon_json:
+        return json.loads(Path(args.amazon_json).read_text(encoding="utf-8"))
+    return sd.make_amazon_remittance(args.rows, seed=args.seed)
+
+
+# ---------- cases ----------
+# Each case: (args) -> (input, run(module, input) -> DataFrame, script key[, reference input])
+# The reference input defaults to the input itself
+
+def _case_fill(args):
+    df = _walmart_checks_frame(args, load_script("walmart_parser"))
+    return df, lambda m, x: m.fill_internal_invoice_dates(x.copy()), "walmart_parser"
+
+
+def _case_clean(args):
+    parser = load_script("walmart_parser")
+    df = _walmart_checks_frame(args, parser)
+    df["Internal Invoice Date"] = pd.NaT
+    df = parser.final_order(df)
+    return df, lambda m, x: m.clean_rows_postparse(x.copy()), "walmart_parser"
+
+
+def _case_pipeline(args):
+    df = _walmart_checks_frame(args, load_script("walmart_parser"))
+
+    def run(m, x):
+        out = m.fill_internal_invoice_dates(x.copy())
+        out = m.final_order(out)
+        return m.clean_rows_postparse(out)
+
+    return df, run, "walmart_parser"
+
+
+def _case_process_walmart(args):
+    df = _remittance_frame(args)
+    return (df, lambda m, x: m.process_walmart_file(x.copy(), "001256261", "01/06/2025"),
+            "walmart_processing")
+
+
+def _case_process_walmart_text(args):
+    # Generated only: the numeric twin must carry the same amounts as the formatted text
+    text = sd.make_walmart_check_frame(args.rows, seed=args.seed, money_text=True)
+    numeric = sd.make_walmart_check_frame(args.rows, seed=args.seed)
+    return (text, lambda m, x: m.process_walmart_file(x.copy(), "001256261", "01/06/2025"),
+            "walmart_processing", numeric)
+
+
+def _case_process_chargebacks(args):
+    rows = _amazon_rows(args)
+
+    def run(m, x):
+        # The current script nets reversals by default; the reference has no netting to compare
+        gross = {"netting": False} if hasattr(m, "net_reversals") else {}
+        return m.process_chargebacks([dict(r) for r in x], "9876543", 0.0, "01/06/2025", **gross)
+
+    return rows, run, "amazon"
+
+
+# ---------- hand-computed cases ----------
+# Each: () -> list of (label, expected DataFrame, actual DataFrame); no reference run
+
+NETTING_ROWS = [
+    # invoice, description, amount paid, amount remaining
+    ("111", "Shortage Claim for Invoice 111", "(50.00)", "0.00"),
+    ("222", "Damage Allowance - 222", "(30.00)", "(5.00)"),
+    ("333", "Co-op - Marketing Development Funds 333", "(10.00)", "0.00"),
+    ("111", "Reversal for Shortage Claim for Invoice 111", "20.00", "0.00"),      # partial: 111 nets to -30.00
+    ("222", "Reversal for Damage Allowance - 222", "35.00", "0.00"),             # full: 222 drops out
+    ("333", "Reversal for Co-op - Marketing Development Funds 333", "15.00", "0.00"),  # 5.00 over
+    ("444", "Reversal for Shortage Claim for Invoice 444", "7.50", "0.00"),      # no original
+    ("555", "Reversal for", "2.00", "0.00"),                                     # no category
+    ("666", "Shortage Claim for Invoice 666", "(12.00)*", "0.00"),               # '*': never posted
+    ("666", "Reversal for Shortage Claim for Invoice 666", "12.00", "0.00"),     # so no original
+    ("777", "Shortage Claim for Invoice 777", "(40.00)", "0.00"),
+    ("777", "Reversal for Damage Allowance - 777", "10.00", "0.00"),             # other category
+]
+
+NETTING_JOURNAL = [
+    # description, amount, G/L account
+    ("PMT 9876543 111 Shortage Claim For Invoice", -30.0, "486000"),
+    ("PMT 9876543 111 Shortage Claim For Invoice", 30.0, "486000"),
+    ("PMT 9876543 777 Shortage Claim For Invoice", -40.0, "486000"),
+    ("PMT 9876543 777 Shortage Claim For Invoice", 40.0, "486000"),
+]
+
+NETTING_UNMATCHED = [
+    ("333", "Reversal for Co-op - Marketing Development Funds 333", "co-op", "15.00", "5.00",
+     "exceeds the original chargeback"),
+    ("444", "Reversal for Shortage Claim for Invoice 444", "shortage claim for invoice", "7.50", "7.50",
+     "no original chargeback"),
+    ("555", "Reversal for", "", "2.00", "2.00", "reversed text has no category"),
+    ("666", "Reversal for Shortage Claim for Invoice 666", "shortage claim for invoice", "12.00", "12.00",
+     "no original chargeback"),
+    ("777", "Reversal for Damage Allowance - 777", "damage allowance", "10.00", "10.00",
+     "no original chargeback"),
+]
+
+
+def _expected_amazon_netting():
+    amazon = load_script("amazon")
+    rows = [dict(zip(["Invoice Number", "Description", "Amount Paid", "Amount Remaining"], r))
+            for r in NETTING_ROWS]
+    out = amazon.process_chargebacks(rows, "9876543", 0.0, "01/06/2025")
+    journal = pd.DataFrame([
+        ["01/06/2025", " ", " ", "Customer", "1287", desc, " ", " ", " ", amt, "G/L Account", gl]
+        for desc, amt, gl in NETTING_JOURNAL
+    ], columns=amazon.NAV_COLUMNS)
+    unmatched_cols = ["Invoice Number", "Description", "Category", "Reversal Amount", "Unmatched Amount",
+                      "Reason"]
+    unmatched = pd.DataFrame(NETTING_UNMATCHED, columns=unmatched_cols)
+    return [("journal", journal, out),
+            ("unmatched_reversals", unmatched,
+             pd.DataFrame(out.attrs["unmatched_reversals"], columns=unmatched_cols))]
+
+
+# (unit price, qty, line cents): one half-up rounding of qty x the unrounded unit price
+ROUNDING_LINES = [
+    (0.333, 3, 100),      # two roundings (0.33 x 3) gave 99
+    (1.005, 1, 101),      # f'{1.005:.2f}' gave 1.00
+    (2.675, 1, 268),      # f'{2.675:.2f}' gave 2.67
+    (-0.125, 1, -13),     # half away from zero, not half even (-12)
+    ("12.5", "0.5", 625),
+    (10, 2.5, 2500),
+]
+# (unit cents, qty, cents) for mul_qty and (text, cents) for to_cents
+ROUNDING_MUL_QTY = [(5, 2.5, 13), (-5, 2.5, -13), (100, 0.1, 10), (199, 3, 597)]
+ROUNDING_TEXT = [("1e3", 100000), ("$1,234.56", 123456), ("(2.50)", -250), ("0.125", 13)]
+
+
+def _expected_money_rounding():
+    prices, qtys, line = zip(*ROUNDING_LINES)
+    unit, qty, mul = zip(*ROUNDING_MUL_QTY)
+    text, parsed = zip(*ROUNDING_TEXT)
+    return [("line_cents", pd.DataFrame({"cents": line}),
+             pd.DataFrame({"cents": money.line_cents(prices, qtys)})),
+            ("mul_qty", pd.DataFrame({"cents": mul}),
+             pd.DataFrame({"cents": money.mul_qty(np.array(unit), np.array(qty))})),
+            ("to_cents", pd.DataFrame({"cents": parsed}),
+             pd.DataFrame({"cents": money.to_cents(pd.Series(text)).astype("int64")}))]
+
+
+# Deductions_All-style (invoice, deduction code) rows: 111 has two descriptions, 333 repeats one
+CM_DESCRIPTION_TABLE = [("111", "[0001] DAMAGE ALLOWANCE"), ("111", "DAMAGE ALLOWANCE"), ("111", "SHORTAGE"),
+                        ("222", ""), ("333", "CO-OP"), ("333", "CO-OP")]
+# (chargeback, joined description or None)
+CM_DESCRIPTION_JOINED = [("111", "DAMAGE ALLOWANCE"), ("222", None), ("333", "CO-OP"), ("444", None)]
+CM_DESCRIPTION_CONFLICTS = [("111", "DAMAGE ALLOWANCE", "SHORTAGE")]
+
+
+def _expected_cm_description_conflicts():
+    cm = load_script("walmart_cm")
+    table = pd.DataFrame(CM_DESCRIPTION_TABLE, columns=["Invoice Number", "DEDUCTION CODE"])
+    records = [{"CustomerNumber": "1", "ChargebackNumber": c, "Amount": 1.0} for c, _ in CM_DESCRIPTION_JOINED]
+    with tempfile.TemporaryDirectory(prefix="nav_equiv_") as tmp:
+        joined = cm.join_descriptions(records, table, output_path=Path(tmp) / "cm.xlsx")
+        report = pd.read_csv(Path(tmp) / "cm_conflicting_descriptions.csv", dtype=str)
+    return [("descriptions", pd.DataFrame({"description": [d for _, d in CM_DESCRIPTION_JOINED]}),
+             pd.DataFrame({"description": joined})),
+            ("conflicts", pd.DataFrame(CM_DESCRIPTION_CONFLICTS, columns=report.columns), report)]
+
+
+# (check, invoice, invoice date, amount paid, code): the deduction on check 11 has its invoice on
+# check 10 of the same batch only
+INDEX_BATCH_ROWS = [
+    ("000000010", "1111", "01/02/2025", 100.0, ""),
+    ("000000010", "2222", "01/03/2025", 50.0, ""),
+    ("000000011", "1111", "", -10.0, "[0001] SHORTAGE"),
+]
+# (check, invoice, amount, Internal Invoice Date, source) after one run on an empty index
+INDEX_BATCH_FILLED = [
+    ("000000010", "1111", 100.0, None, ""),
+    ("000000010", "2222", 50.0, None, ""),
+    ("000000011", "1111", -10.0, "2025-01-02", "index (Check 000000010)"),
+]
+
+
+def _expected_invoice_index_batch():
+    from invoice_index import InvoiceIndex, SOURCE_COL
+    from pipeline_runner import run_parser_job
+    cols = ["Check No", "Invoice Number", "Amount Paid($)", "Internal Invoice Date", SOURCE_COL]
+    with tempfile.TemporaryDirectory(prefix="nav_equiv_") as tmp:
+        tmp = Path(tmp)
+        for check in dict.fromkeys(r[0] for r in INDEX_BATCH_ROWS):
+            rows = [r for r in INDEX_BATCH_ROWS if r[0] == check]
+            frame = pd.DataFrame({
+                "Invoice Number": [r[1] for r in rows], "Invoice Date": [r[2] for r in rows],
+                "Date Paid": "01/06/2025", "Store Number": "12", "DC Number": "6006", "Division": "1",
+                "PO Number": "", "Micro Film Number": "", "Invoice Amount($)": [r[3] for r in rows],
+                "Discount Amount($)": 0.0, "Amount Paid($)": [r[3] for r in rows],
+                "DEDUCTION CODE": [r[4] for r in rows], "Pay Type": "ACH", "Tax Amount($)": 0.0,
+            }, columns=sd.WALMART_COLUMNS)
+            frame.to_excel(tmp / f"Check_{check}.xlsx", index=False)
+        with InvoiceIndex(tmp / "index.sqlite") as index:
+            out = run_parser_job(tmp, tmp / "out.csv", cpu_workers=1, invoice_index=index)
+    actual = out[cols].reset_index(drop=True)
+    actual["Internal Invoice Date"] = pd.to_datetime(actual["Internal Invoice Date"])
+    expected = pd.DataFrame(INDEX_BATCH_FILLED, columns=cols)
+    expected["Internal Invoice Date"] = pd.to_datetime(expected["Internal Invoice Date"])
+    return [("deductions", expected, actual)]
+
+
+EXPECTED_CASES = {
+    "amazon_netting": _expected_amazon_netting,
+    "money_rounding": _expected_money_rounding,
+    "cm_description_conflicts": _expected_cm_description_conflicts,
+    "invoice_index_batch": _expected_invoice_index_batch,
+}
+
+
+CASES = {
+    "fill_internal_invoice_dates": _case_fill,
+    "clean_rows_postparse": _case_clean,
+    "parser_pipeline": _case_pipeline,
+    "process_walmart_file": _case_process_walmart,
+    "process_walmart_file_text": _case_process_walmart_text,
+    "process_chargebacks": _case_process_chargebacks,
+}
+
+
+def run_case(name, args):
+    if name in EXPECTED_CASES:
+        problems = []
+        for label, expected, actual in EXPECTED_CASES[name]():
+            problems += [f"[{label}] {p}" for p in compare_frames(expected, actual, rtol=args.rtol, atol=0,
+                                                                   max_report=args.max_report)]
+        return problems
+    data, run, key, *ref_data = CASES[name](args)
+    ref_data = ref_data[0] if ref_data else data
+    golden = None
+    if args.golden_dir:
+        golden = Path(args.golden_dir) / f"{name}-{_hash_input(data)}.pkl"
+    if golden is not None and golden.exists():
+        ref_out = pickle.loads(golden.read_bytes())
+    else:
+        ref_out = run(load_reference(key), ref_data)
+        if golden is not None:
+            golden.parent.mkdir(parents=True, exist_ok=True)
+            golden.write_bytes(pickle.dumps(ref_out))
+    cand_out = run(load_script(key), data)
+    return compare_frames(ref_out, cand_out, rtol=args.rtol, atol=args.atol, max_report=args.max_report)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare current script output against the frozen reference")
+    ap.add_argument("--cases", default=",".join([*CASES, *EXPECTED_CASES]), help="Comma list of cases")
+    ap.add_argument("--rows", type=sd.parse_size, default=sd.parse_size("10k"))
+    ap.add_argument("--rows-per-check", type=int, default=2_000)
+    ap.add_argument("--parser-rows", type=sd.parse_size, default=PARSER_ROW_CAP,
+                    help="Row cap for the generated parser-case inputs (0 = use --rows)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--checks-dir", help="Recorded Check_*.xlsx directory for the parser cases")
+    ap.add_argument("--remittance", help="Recorded remittance .xlsx for process_walmart_file")
+    ap.add_argument("--amazon-json", help="Recorded Amazon rows (JSON list of dicts) for process_chargebacks")
+    ap.add_argument("--golden-dir", default=str(DEFAULT_GOLDEN_DIR),
+                    help="Cache of reference outputs keyed by input hash ('' to disable)")
+    ap.add_argument("--rtol", type=float, default=1e-9)
+    ap.add_argument("--atol", type=float, default=0.005)
+    ap.add_argument("--max-report", type=int, default=10)
+    ap.add_argument("--compare-workbooks", nargs=2, metavar=("REFERENCE", "CANDIDATE"))
+    ap.add_argument("--compact-dates", action="store_true",
+                    help="With --compare-workbooks: compare date columns of a parser --compact run on the calendar date")
+    args = ap.parse_args()
+
+    if args.compare_workbooks:
+        problems = compare_workbooks(*args.compare_workbooks, compact_dates=args.compact_dates,
+                                     rtol=args.rtol, atol=args.atol, max_report=args.max_report)
+        for p in problems:
+            print(p)
+        print("EQUIVALENT" if not problems else "DIFFERENT")
+        return 1 if problems else 0
+
+    failed = False
+    for name in [c.strip() for c in args.cases.split(",") if c.strip()]:
+        if name not in CASES and name not in EXPECTED_CASES:
+            ap.error(f"unknown case: {name}")
+        problems = run_case(name, args)
+        print(f"{name}: {'OK' if not problems else 'DIFFERENT'}")
+        for p in problems:
+            print(f"  {p}")
+        failed = failed or bool(problems)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+gl_rules.py
+- G/L account and description rules for every script, kept in one JSON file (gl_rules.json next to
+  the scripts, or NAV_GL_RULES=<path>) instead of dict literals in each script
+- Sections: walmart (deduction code -> gl/abbrev, summed codes), amazon (ordered description
+  patterns -> base description; base -> gl/abbrev), walmart_cm (ordered phrase -> gl/gl_desc and
+  phrase -> abbreviation), fixed_accounts (the single account each exporter posts to)
+- Tables are compiled once into array-backed lookups: a hash index maps key -> position and
+  numpy arrays hold the fields, so a whole Series maps in one get_indexer call
+- Phrase tables (first substring match wins) are evaluated once per distinct value
+- validate_rules() reports every problem (bad G/L numbers, codes, duplicate keys, unknown summed
+  codes, non-normalized keys); a file that fails validation is never used
+- get_rules() hot-reloads: when the file changes on disk the next call recompiles it; if the new
+  file is invalid the previous tables stay active and a warning goes to stderr
+- CLI: python gl_rules.py [--rules path] checks the file; --lookup walmart 0100 shows one entry
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_RULES_PATH = Path(__file__).resolve().with_name("gl_rules.json")
+SECTIONS = ("walmart", "amazon", "walmart_cm", "fixed_accounts")
+
+_cache = {"path": None, "stamp": None, "rules": None}
+
+
+class RuleError(ValueError):
+    """Rule file that can't be loaded; .problems lists every validation message."""
+
+    def __init__(self, path, problems):
+        self.problems = list(problems)
+        super().__init__(f"{path}: {len(self.problems)} problem(s): " + "; ".join(self.problems))
+
+
+class CodeTable:
+    """Exact-key table: key -> position (hash index) -> field arrays."""
+
+    def __init__(self, entries, fields):
+        self.index = pd.Index(list(entries), dtype=object)
+        self.fields = {f: np.array([e.get(f) for e in entries.values()] + [None], dtype=object)
+                       for f in fields}
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def positions(self, values):
+        """Positions for a Series/array of keys; -1 where the key is not in the table."""
+        return self.index.get_indexer(pd.Index(values, dtype=object))
+
+    def column(self, field, values):
+        """Field values for every key (None where missing); -1 lands on the trailing None."""
+        return self.fields[field][self.positions(values)]
+
+    def get(self, key, field, default=None):
+        pos = self.index.get_indexer([key])[0]
+        value = self.fields[field][pos] if pos >= 0 else None
+        return default if value is None else value
+
+
+class PhraseTable:
+    """Ordered substring rules; the first rule whose phrase occurs in the text wins."""
+
+    def __init__(self, rules, fields, case):
+        self.case = case
+        self.phrases = [r["match"] for r in rules]
+        self.fields = {f: np.array([r.get(f) for r in rules] + [None], dtype=object) for f in fields}
+
+    def _fold(self, text):
+        return text.lower() if self.case == "lower" else text.upper()
+
+    def first_match(self, text):
+        """Rule position for one string, -1 when nothing matches."""
+        folded = self._fold(text)
+        for k, phrase in enumerate(self.phrases):
+            if phrase in folded:
+                return k
+        return -1
+
+    def positions(self, values):
+        """Rule position per value (-1 when nothing matches), computed once per distinct value."""
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+        hits = np.array([self.first_match(str(u)) for u in uniques] + [-1], dtype=np.int64)
+        return hits[codes]
+
+    def column(self, field, values):
+        return self.fields[field][self.positions(values)]
+
+    def rules(self, *fields):
+        """(phrase, field values...) in rule order, for callers that apply every matching rule."""
+        return list(zip(self.phrases, *(self.fields[f][:-1] for f in fields)))
+
+
+class RuleSet:
+    """Compiled tables of one rule file."""
+
+    def __init__(self, raw, path=None):
+        self.path = path
+        self.version = raw.get("version")
+        wm = raw["walmart"]
+        self.walmart = CodeTable(wm["codes"], ("gl", "abbrev"))
+        self.walmart_sum_codes = tuple(wm.get("sum_codes", []))
+        amz = raw["amazon"]
+        self.amazon_patterns = PhraseTable(amz["patterns"], ("base",), case="lower")
+        self.amazon = CodeTable(amz["descriptions"], ("gl", "abbrev"))
+        cm = raw["walmart_cm"]
+        self.walmart_cm_accounts = PhraseTable(cm["accounts"], ("gl", "gl_desc"), case="upper")
+        self.walmart_cm_abbreviations = PhraseTable(cm["abbreviations"], ("abbrev",), case="upper")
+        self.fixed = {name: (entry["gl"], entry["gl_desc"]) for name, entry in raw["fixed_accounts"].items()}
+
+    def fixed_account(self, name):
+        """(G/L number as int, G/L description) for an exporter that always posts to one account."""
+        gl, desc = self.fixed[name]
+        return int(gl), desc
+
+
+# ---------- loading / validation ----------
+
+def _no_duplicates(pairs):
+    seen = {}
+    for key, value in pairs:
+        if key in seen:
+            raise ValueError(f"duplicate key {key!r}")
+        seen[key] = value
+    return seen
+
+
+def _gl_ok(value):
+    return isinstance(value, str) and value.isdigit() and len(value) == 6
+
+
+def validate_rules(raw):
+    """Every problem in a parsed rule file (empty list when it is usable)."""
+    problems = []
+    if not isinstance(raw, dict):
+        return ["top level must be an object"]
+    for section in SECTIONS:
+        if not isinstance(raw.get(section), dict):
+            problems.append(f"missing section {section!r}")
+    if problems:
+        return problems
+
+    codes = raw["walmart"].get("codes", {})
+    for code, entry in codes.items():
+        if not (code.isdigit() and len(code) == 4):
+            problems.append(f"walmart: code {code!r} is not a 4-digit deduction code")
+        if not _gl_ok(entry.get("gl")):
+            problems.append(f"walmart {code}: gl {entry.get('gl')!r} is not a 6-digit account")
+        if not entry.get("abbrev"):
+            problems.append(f"walmart {code}: abbrev is empty")
+    for code in raw["walmart"].get("sum_codes", []):
+        if code not in codes:
+            problems.append(f"walmart: summed code {code!r} has no gl entry")
+
+    amz = raw["amazon"]
+    for k, rule in enumerate(amz.get("patterns", [])):
+        match = rule.get("match")
+        if not match or match != match.lower():
+            problems.append(f"amazon pattern {k}: match {match!r} must be non-empty lower case")
+    for key, entry in amz.get("descriptions", {}).items():
+        if key != key.strip().lower():
+            problems.append(f"amazon: description key {key!r} must be stripped lower case (it can never match)")
+        if not _gl_ok(entry.get("gl")):
+            problems.append(f"amazon {key!r}: gl {entry.get('gl')!r} is not a 6-digit account")
+
+    cm = raw["walmart_cm"]
+    for part, field in (("accounts", "gl"), ("abbreviations", "abbrev")):
+        for k, rule in enumerate(cm.get(part, [])):
+            match = rule.get("match")
+            if not match or match != match.upper():
+                problems.append(f"walmart_cm {part} {k}: match {match!r} must be non-empty upper case")
+            if field == "gl" and not _gl_ok(rule.get("gl")):
+                problems.append(f"walmart_cm {match!r}: gl {rule.get('gl')!r} is not a 6-digit account")
+            if field == "abbrev" and not rule.get("abbrev"):
+                problems.append(f"walmart_cm {match!r}: abbrev is empty")
+
+    for name, entry in raw["fixed_accounts"].items():
+        if not _gl_ok(entry.get("gl")):
+            problems.append(f"fixed_accounts {name}: gl {entry.get('gl')!r} is not a 6-digit account")
+    return problems
+
+
+def rules_path(path=None):
+    return Path(path or os.environ.get("NAV_GL_RULES") or DEFAULT_RULES_PATH)
+
+
+def load_rules(path=None):
+    """Parse, validate and compile a rule file; raises RuleError listing every problem."""
+    path = rules_path(path)
+    try:
+        raw = json.loads(path.read_text(encoding="utf-8"), object_pairs_hook=_no_duplicates)
+    except (OSError, ValueError) as e:
+        raise RuleError(path, [str(e)]) from e
+    problems = validate_rules(raw)
+    if problems:
+        raise RuleError(path, problems)
+    return RuleSet(raw, path=path)
+
+
+def get_rules(path=None):
+    """
+    Current compiled rules. One os.stat per call; when the file changed since it was compiled,
+    it is reloaded. An invalid new file keeps the previous tables (warning on stderr).
+    """
+    path = rules_path(path)
+    st = path.stat()
+    stamp = (st.st_mtime_ns, st.st_size)
+    if _cache["rules"] is not None and _cache["path"] == path and _cache["stamp"] == stamp:
+        return _cache["rules"]
+    try:
+        rules = load_rules(path)
+    except RuleError as e:
+        if _cache["rules"] is None or _cache["path"] != path:
+            raise
+        print(f"WARNING: keeping previous G/L rules; {e}", file=sys.stderr)
+        _cache["stamp"] = stamp
+        return _cache["rules"]
+    _cache.update(path=path, stamp=stamp, rules=rules)
+    return rules
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Check the G/L rule file or look up one entry")
+    ap.add_argument("--rules", help=f"Rule file (default NAV_GL_RULES or {DEFAULT_RULES_PATH.name})")
+    ap.add_argument("--lookup", nargs=2, metavar=("SECTION", "KEY"),
+                    help="walmart <code> | amazon <base description> | walmart_cm <description> | fixed <exporter>")
+    args = ap.parse_args()
+    try:
+        rules = load_rules(args.rules)
+    except RuleError as e:
+        for p in e.problems:
+            print(f"ERROR: {p}")
+        return 1
+    if args.lookup:
+        section, key = args.lookup
+        if section == "walmart":
+            print(rules.walmart.get(key, "gl"), rules.walmart.get(key, "abbrev"),
+                  "summed" if key in rules.walmart_sum_codes else "")
+        elif section == "amazon":
+            norm = key.strip().lower()
+            print(rules.amazon.get(norm, "gl"), rules.amazon.get(norm, "abbrev"))
+        elif section == "walmart_cm":
+            print(*rules.walmart_cm_accounts.column("gl", [key]), *rules.walmart_cm_accounts.column("gl_desc", [key]))
+        else:
+            print(*rules.fixed_account(key))
+        return 0
+    print(f"{rules.path}: OK (walmart {len(rules.walmart)} codes, amazon {len(rules.amazon)} descriptions, "
+          f"walmart_cm {len(rules.walmart_cm_accounts.phrases)} phrases, {len(rules.fixed)} fixed accounts)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
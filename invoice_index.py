@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+invoice_index.py
+- Persistent index of Walmart invoice lines across every check parsed so far, so a deduction whose
+  original invoice was paid on an earlier check still gets an Internal Invoice Date
+- SQLite file (NAV_INVOICE_INDEX=<path>, default nav_invoice_index.sqlite in the working directory):
+  invoices  invoice number -> (store, DC, division, invoice date, check), keyed
+            (kind, key, store, dc, division) so a lookup is a primary-key seek; per key it keeps
+            the lowest check number seen, whatever order the checks were indexed in (kind is
+            always 'invoice': the parser output has no deduction without an invoice number to
+            look up by PO)
+  checks    checks already indexed; add() skips them, so the index grows incrementally
+- Only positive (invoice) lines with an invoice number and an invoice date are indexed
+- fill_from_index() resolves deductions the same-file search left without a date: one bulk join
+  for all of them, then the parser's store/DC/division rule (a blank side matches anything);
+  only checks earlier than the deduction's own count (never its own check), the earliest wins
+- Callers add() the batch before looking it up, so a deduction finds an invoice on an earlier
+  check of the same batch; its own and later checks are never candidates
+- "Internal Invoice Date Source" records where each date came from: "same file" or
+  "index (Check <no>)"
+- CLI: python invoice_index.py --build ./checks   (index Check_*.xlsx not indexed yet)
+       python invoice_index.py --lookup 12345678  (candidates for an invoice number)
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import money
+from stage_profiler import stage
+
+DEFAULT_INDEX_PATH = "nav_invoice_index.sqlite"
+SOURCE_COL = "Internal Invoice Date Source"
+SAME_FILE = "same file"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices (
+    kind         TEXT NOT NULL,
+    key          TEXT NOT NULL,
+    store        TEXT NOT NULL,
+    dc           TEXT NOT NULL,
+    division     TEXT NOT NULL,
+    invoice_date TEXT NOT NULL,
+    check_no     TEXT NOT NULL,
+    PRIMARY KEY (kind, key, store, dc, division)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS checks (
+    check_no   TEXT PRIMARY KEY,
+    lines      INTEGER NOT NULL,
+    indexed_at TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Parser column names (same lookups as fill_internal_invoice_dates)
+COLUMN_NAMES = {
+    "check": ["check no"],
+    "invoice_date": ["invoice date"],
+    "amount": ["amount paid($)", "amount paid ($)", "amount paid"],
+    "invoice": ["invoice number"],
+    "store": ["store number", "store #", "store"],
+    "dc": ["dc number", "dc #", "dc"],
+    "division": ["division"],
+}
+
+
+def find_col(df, names):
+    low = {str(c).strip().lower(): c for c in df.columns}
+    for n in names:
+        if n in low:
+            return low[n]
+    return None
+
+
+def _keys(df, col):
+    """normalize_str as the parser applies it, plus '12345.0' -> '12345' so float-typed columns
+    from one workbook match text from another; blanks become ''."""
+    if col is None:
+        return pd.Series("", index=df.index, dtype=object)
+    s = df[col]
+    s = s.astype(object).where(s.notna(), "").astype(str).str.strip()
+    return s.str.replace(r"^(\d+)\.0$", r"\1", regex=True)
+
+
+def _columns(df):
+    cols = {k: find_col(df, names) for k, names in COLUMN_NAMES.items()}
+    if cols["amount"] is None or cols["check"] is None:
+        raise ValueError("Parser output needs 'Check No' and 'Amount Paid($)' columns")
+    return cols
+
+
+class InvoiceIndex:
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = str(path)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.environ.get("NAV_INVOICE_INDEX", "").strip() or DEFAULT_INDEX_PATH)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def known_checks(self):
+        return {row[0] for row in self.conn.execute("SELECT check_no FROM checks")}
+
+    def add(self, df):
+        """Index the invoice lines of checks not indexed yet; returns (new checks, lines indexed)."""
+        with stage("invoice_index.add", rows_in=len(df)) as st:
+            cols = _columns(df)
+            check = _keys(df, cols["check"])
+            known = self.known_checks()
+            new_checks = [c for c in pd.unique(check) if c and c not in known]
+            if not new_checks:
+                st.rows_out = 0
+                return [], 0
+            cents = money.to_cents(df[cols["amount"]])
+            dates = (pd.to_datetime(df[cols["invoice_date"]], errors="coerce") if cols["invoice_date"] is not None
+                     else pd.Series(pd.NaT, index=df.index))
+            invoice = _keys(df, cols["invoice"])
+            keep = (check.isin(new_checks) & (cents > 0).fillna(False) & dates.notna()
+                    & (invoice != "")).to_numpy(dtype=bool)
+            lines = pd.DataFrame({
+                "invoice": invoice, "store": _keys(df, cols["store"]), "dc": _keys(df, cols["dc"]),
+                "division": _keys(df, cols["division"]),
+                "invoice_date": dates.dt.strftime("%Y-%m-%d"), "check_no": check,
+            })[keep]
+            rows = list(zip(["invoice"] * len(lines), lines["invoice"], lines["store"], lines["dc"],
+                            lines["division"], lines["invoice_date"], lines["check_no"]))
+            per_check = lines["check_no"].value_counts()
+            now = datetime.now().isoformat(timespec="seconds")
+            with self.conn:
+                # The earliest check (lowest number, not first indexed) keeps each key
+                self.conn.executemany(
+                    "INSERT INTO invoices VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (kind, key, store, dc, division) DO UPDATE SET "
+                    "invoice_date = excluded.invoice_date, check_no = excluded.check_no "
+                    "WHERE CAST(excluded.check_no AS INTEGER) < CAST(invoices.check_no AS INTEGER)",
+                    rows)
+                self.conn.executemany("INSERT INTO checks VALUES (?, ?, ?)",
+                                      ((c, int(per_check.get(c, 0)), now) for c in new_checks))
+            st.rows_out = len(lines)
+        return new_checks, len(lines)
+
+    def candidates(self, kinds, keys):
+        """All indexed lines for each (kind, key) probe as a frame with a 'pos' column (probe position)."""
+        cur = self.conn.cursor()
+        cur.execute("CREATE TEMP TABLE IF NOT EXISTS probe (pos INTEGER, kind TEXT, key TEXT)")
+        cur.execute("DELETE FROM probe")
+        cur.executemany("INSERT INTO probe VALUES (?, ?, ?)", zip(range(len(keys)), kinds, keys))
+        hits = cur.execute(
+            "SELECT p.pos, i.store, i.dc, i.division, i.invoice_date, i.check_no "
+            "FROM probe p JOIN invoices i ON i.kind = p.kind AND i.key = p.key "
+            "ORDER BY p.pos, CAST(i.check_no AS INTEGER)"
+        ).fetchall()
+        cur.execute("DELETE FROM probe")
+        return pd.DataFrame(hits, columns=["pos", "store", "dc", "division", "invoice_date", "check_no"])
+
+
+def fill_from_index(df, index):
+    """
+    Adds SOURCE_COL and fills the Internal Invoice Date of deductions that have none from the
+    index. A deduction matches an indexed line on its invoice number with store, DC and division
+    equal or blank on either side, as in the same-file search, on a check other than its own and,
+    when both check numbers are numeric, an earlier one.
+    """
+    with stage("invoice_index.fill", rows_in=len(df)) as st:
+        cols = _columns(df)
+        iid = pd.to_datetime(df["Internal Invoice Date"], errors="coerce")
+        source = np.where(iid.notna(), SAME_FILE, "").astype(object)
+        cents = money.to_cents(df[cols["amount"]])
+        invoice = _keys(df, cols["invoice"])
+        todo = (iid.isna() & (cents < 0).fillna(False) & (invoice != "")).to_numpy(dtype=bool)
+        rows = np.flatnonzero(todo)
+        filled = 0
+        if len(rows):
+            cand = index.candidates(["invoice"] * len(rows), invoice.to_numpy()[rows].tolist())
+            if len(cand):
+                pos = cand["pos"].to_numpy()
+                ok = np.ones(len(cand), dtype=bool)
+                for dim in ("store", "dc", "division"):
+                    mine = _keys(df, cols[dim]).to_numpy()[rows][pos]
+                    theirs = cand[dim].to_numpy()
+                    ok &= (mine == "") | (theirs == "") | (mine == theirs)
+                own = _keys(df, cols["check"]).to_numpy()[rows][pos]
+                theirs = cand["check_no"].to_numpy()
+                own_no = pd.to_numeric(pd.Series(own), errors="coerce").to_numpy()
+                their_no = pd.to_numeric(pd.Series(theirs), errors="coerce").to_numpy()
+                numeric = ~np.isnan(own_no) & ~np.isnan(their_no)
+                ok &= (own != theirs) & (~numeric | (their_no < own_no))
+                best = cand[ok].drop_duplicates("pos")
+                target = rows[best["pos"].to_numpy()]
+                iid.iloc[target] = pd.to_datetime(best["invoice_date"]).to_numpy()
+                source[target] = ("index (Check " + best["check_no"] + ")").to_numpy()
+                filled = len(best)
+        df = df.copy()
+        df["Internal Invoice Date"] = iid
+        df[SOURCE_COL] = source
+        st.rows_out = filled
+    return df
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Cross-check invoice index for Internal Invoice Date lookback")
+    ap.add_argument("--index", default=os.environ.get("NAV_INVOICE_INDEX") or DEFAULT_INDEX_PATH)
+    ap.add_argument("--build", metavar="CHECKS_DIR", help="Index the Check_*.xlsx files not indexed yet")
+    ap.add_argument("--lookup", metavar="NUMBER", help="Indexed lines for an invoice number")
+    args = ap.parse_args()
+
+    with InvoiceIndex(args.index) as index:
+        if args.build:
+            from nav_scripts import load_script
+            parser = load_script("walmart_parser")
+            known = index.known_checks()
+            for p in sorted(Path(args.build).glob("Check_*.xlsx")):
+                m = re.search(r"Check_(\d+)\.xlsx$", p.name, flags=re.IGNORECASE)
+                if m and m.group(1) in known:
+                    continue
+                try:
+                    new, n = index.add(parser.read_check_file(p))
+                except Exception as e:
+                    print(f"WARNING: failed to index {p}: {e}", file=sys.stderr)
+                    continue
+                print(f"{p.name}: {n} invoice line(s) indexed")
+        if args.lookup:
+            key = re.sub(r"^(\d+)\.0$", r"\1", args.lookup.strip())
+            found = index.candidates(["invoice"], [key])
+            print(found.drop(columns="pos").to_string(index=False) if len(found) else "not indexed")
+        if not (args.build or args.lookup):
+            checks, lines = index.conn.execute("SELECT COUNT(*), COALESCE(SUM(lines), 0) FROM checks").fetchone()
+            print(f"{index.path}: {checks} check(s), {lines} invoice line(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+ledger_reconciliation.py
+- Reconciles Walmart/Amazon deductions against a NAV customer ledger entries export (CSV or xlsx)
+- The ledger is loaded once (only the needed columns) and indexed by Document No. in a hash index
+- Deductions come from the parser output (clean_rows_postparse / Deductions_All sheet) or from a
+  process_chargebacks / process_walmart_file journal; invoice numbers are keyed as the SI filter
+  formulas build them ("SI" & invoice number)
+- One vectorized join flags each deduction: OK, UNMATCHED (no such document), CLOSED (not open or
+  nothing remaining) or OVER_REMAINING (running deductions on the document exceed the remaining amount)
+- Writes an exceptions report (.xlsx or .csv) and prints a status summary
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import money
+from stage_profiler import stage
+
+LEDGER_DOC_COLS = ["document no.", "document no", "document number"]
+LEDGER_TYPE_COLS = ["document type"]
+LEDGER_OPEN_COLS = ["open"]
+LEDGER_REMAINING_COLS = ["remaining amount", "remaining amt. (lcy)", "remaining amount (lcy)"]
+LEDGER_CUSTOMER_COLS = ["customer no.", "customer no"]
+
+INVOICE_PREFIX = "SI"
+KEY_COL = "Ledger Doc. No."   # join key on the deduction side; journals already have a "Document No." column
+STATUSES = ["OK", "UNMATCHED", "CLOSED", "OVER_REMAINING"]
+
+
+def find_col(columns, names):
+    low = {str(c).strip().lower(): c for c in columns}
+    for n in names:
+        if n in low:
+            return low[n]
+    return None
+
+
+def normalize_doc_no(values, prefix=INVOICE_PREFIX):
+    """
+    Vectorized document key: trimmed, upper-cased, float artefacts ('12345.0') removed, and the
+    SI prefix added to bare numbers, matching ="SI"&B2 in the filter formulas.
+    """
+    s = pd.Series(values, dtype=object)
+    s = s.where(s.notna(), "").astype(str).str.strip().str.upper()
+    # Only keys that don't already carry the prefix need the float/bare-number fix-ups
+    todo = ~s.str.startswith(prefix) if prefix else pd.Series(True, index=s.index)
+    if todo.any():
+        fixed = s[todo].str.replace(r"\.0$", "", regex=True)
+        if prefix:
+            fixed = fixed.where(~fixed.str.fullmatch(r"\d+"), prefix + fixed)
+        s[todo] = fixed
+    return s
+
+
+def _flag(values, accepted):
+    """Case/space-insensitive membership test for low-cardinality text columns (evaluated per distinct value)."""
+    codes, uniques = pd.factorize(values)
+    ok = np.array([str(u).strip().lower() in accepted for u in uniques] + [False], dtype=bool)
+    return ok[codes]   # code -1 (missing) lands on the trailing False
+
+
+def _read_table(path, usecols=None):
+    path = Path(path)
+    if path.suffix.lower() in (".csv", ".txt"):
+        return pd.read_csv(path, usecols=usecols, dtype=str, keep_default_na=False, na_values=[""])
+    return pd.read_excel(path, usecols=usecols, dtype=str)
+
+
+def load_ledger(path, prefix=INVOICE_PREFIX):
+    """
+    Read a NAV customer ledger entries export and index it by document number. Returns a frame
+    indexed by normalized Document No. (unique, hash-based) with remaining cents, open flag
+    and entry count. Entries of other document types are dropped when a Document Type column exists.
+    """
+    path = Path(path)
+    if path.suffix.lower() in (".csv", ".txt"):
+        header = pd.read_csv(path, nrows=0).columns
+    else:
+        header = pd.read_excel(path, nrows=0).columns
+    doc_col = find_col(header, LEDGER_DOC_COLS)
+    if doc_col is None:
+        raise ValueError(f"Ledger export {path} has no Document No. column")
+    wanted = {
+        "doc": doc_col,
+        "type": find_col(header, LEDGER_TYPE_COLS),
+        "open": find_col(header, LEDGER_OPEN_COLS),
+        "remaining": find_col(header, LEDGER_REMAINING_COLS),
+        "customer": find_col(header, LEDGER_CUSTOMER_COLS),
+    }
+    cols = [c for c in wanted.values() if c is not None]
+    raw = _read_table(path, usecols=cols)
+
+    if wanted["type"] is not None:
+        raw = raw[_flag(raw[wanted["type"]], {"invoice"})]
+
+    ledger = pd.DataFrame({KEY_COL: normalize_doc_no(raw[doc_col].to_numpy(), prefix)})
+    if wanted["remaining"] is not None:
+        ledger["remaining_cents"] = money.to_cents(raw[wanted["remaining"]].reset_index(drop=True)).abs()
+    else:
+        ledger["remaining_cents"] = pd.array([pd.NA] * len(ledger), dtype="Int64")
+    if wanted["open"] is not None:
+        ledger["open"] = _flag(raw[wanted["open"]], {"yes", "true", "1", "y"})
+    else:
+        ledger["open"] = ledger["remaining_cents"].fillna(0).gt(0)
+    if wanted["customer"] is not None:
+        ledger["customer"] = raw[wanted["customer"]].to_numpy()
+
+    agg = {"remaining_cents": "sum", "open": "any"}
+    if "customer" in ledger:
+        agg["customer"] = "first"
+    index = ledger.groupby(KEY_COL, sort=False).agg(agg)
+    index["entries"] = ledger.groupby(KEY_COL, sort=False).size()
+    return index
+
+
+def deductions_from_parser(df, prefix=INVOICE_PREFIX):
+    """Deduction lines (negative Amount Paid) from the parser output, keyed by SI document number."""
+    inv_col = find_col(df.columns, ["invoice number"])
+    amt_col = find_col(df.columns, ["amount paid($)", "amount paid ($)", "amount paid"])
+    if inv_col is None or amt_col is None:
+        raise ValueError("Parser output needs 'Invoice Number' and 'Amount Paid($)' columns")
+    cents = money.to_cents(df[amt_col])
+    keep = (cents < 0).fillna(False).to_numpy(dtype=bool)
+    out = df.loc[keep].copy()
+    out.insert(0, KEY_COL, normalize_doc_no(out[inv_col].to_numpy(), prefix).to_numpy())
+    out.insert(1, "deduction_cents", (-cents[keep]).to_numpy(dtype="int64"))
+    return out
+
+
+def deductions_from_journal(df, prefix=INVOICE_PREFIX):
+    """
+    Per-invoice lines from a NAV journal built by process_chargebacks/process_walmart_file. The
+    invoice is the third token of "PMT <payment> <invoice> <abbrev>"; only the first row of each
+    debit/credit pair is used. Summed-code lines without an invoice are skipped.
+    """
+    first = df.iloc[0::2]
+    parts = first["Description"].astype(str).str.split(" ", n=3, expand=True)
+    invoice = parts[2] if parts.shape[1] >= 3 else pd.Series("", index=first.index)
+    has_invoice = invoice.fillna("").str.contains(r"\d", regex=True).to_numpy(dtype=bool)
+    out = first.loc[has_invoice].copy()
+    out.insert(0, KEY_COL, normalize_doc_no(invoice[has_invoice].to_numpy(), prefix).to_numpy())
+    out.insert(1, "deduction_cents", money.to_cents(out["Amount"]).abs().to_numpy(dtype="int64"))
+    return out
+
+
+def reconcile(deductions, ledger_index):
+    """
+    Join deductions to the ledger index in one pass. Adds ledger columns, the running deduction
+    total per document, and a Status column (see STATUSES).
+    """
+    keys = deductions[KEY_COL].to_numpy()
+    pos = ledger_index.index.get_indexer(keys)
+    matched = pos >= 0
+    safe = np.where(matched, pos, 0)
+
+    out = deductions.copy()
+    remaining = ledger_index["remaining_cents"].to_numpy(dtype="float64", na_value=np.nan)[safe]
+    is_open = ledger_index["open"].to_numpy(dtype=bool)[safe]
+    out["Ledger Remaining"] = np.where(matched, remaining / 100.0, np.nan)
+    out["Ledger Open"] = np.where(matched, is_open, False)
+    running = out.groupby(KEY_COL, sort=False)["deduction_cents"].cumsum().to_numpy()
+    out["Running Deductions"] = running / 100.0
+    out["Deduction"] = out["deduction_cents"] / 100.0
+
+    closed = matched & (~is_open | (np.nan_to_num(remaining, nan=1.0) <= 0))
+    over = matched & ~closed & ~np.isnan(remaining) & (running > remaining)
+    out["Status"] = np.select([~matched, closed, over], ["UNMATCHED", "CLOSED", "OVER_REMAINING"], "OK")
+    return out
+
+
+def write_report(result, path):
+    """Exceptions (every non-OK row) to .csv or .xlsx; an xlsx also gets a Summary sheet."""
+    path = Path(path)
+    exceptions = result[result["Status"] != "OK"].drop(columns=["deduction_cents"])
+    if path.suffix.lower() == ".csv":
+        exceptions.to_csv(path, index=False)
+        return path
+    summary = result["Status"].value_counts().reindex(STATUSES, fill_value=0).rename_axis("Status") \
+        .reset_index(name="Lines")
+    with pd.ExcelWriter(path, engine="xlsxwriter") as writer:
+        exceptions.to_excel(writer, sheet_name="Exceptions", index=False)
+        summary.to_excel(writer, sheet_name="Summary", index=False)
+    return path
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Reconcile deductions against a NAV customer ledger export")
+    ap.add_argument("--ledger", required=True, help="NAV customer ledger entries export (.csv or .xlsx)")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--parser-output", help="Walmart parser workbook (Deductions_All sheet)")
+    src.add_argument("--journal", help="NAV journal workbook from process_walmart_file/process_chargebacks")
+    ap.add_argument("--report", required=True, help="Exceptions report path (.xlsx or .csv)")
+    ap.add_argument("--prefix", default=INVOICE_PREFIX, help="Prefix added to bare invoice numbers")
+    args = ap.parse_args()
+
+    with stage("recon.load_ledger") as st:
+        ledger_index = load_ledger(args.ledger, prefix=args.prefix)
+        st.rows_out = len(ledger_index)
+    with stage("recon.load_deductions") as st:
+        if args.parser_output:
+            deductions = deductions_from_parser(pd.read_excel(args.parser_output), prefix=args.prefix)
+        else:
+            deductions = deductions_from_journal(pd.read_excel(args.journal), prefix=args.prefix)
+        st.rows_out = len(deductions)
+    with stage("recon.join", rows_in=len(deductions)) as st:
+        result = reconcile(deductions, ledger_index)
+        st.rows_out = len(result)
+    write_report(result, args.report)
+
+    counts = result["Status"].value_counts()
+    print(" ".join(f"{s}={int(counts.get(s, 0))}" for s in STATUSES))
+    print(f"Exceptions report written to: {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
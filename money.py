@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+money.py
+- Exact money handling for the journal builders: amounts are int64 cents end to end
+- to_cents() parses remittance strings ($1,234.56 / (1,234.56) / -5 / trailing *) and numbers
+  into a nullable Int64 Series (int64 data + missing mask), vectorized; plain numeric text with
+  at most two decimals takes the C float parser (exact there), everything else the regex path;
+  text neither accepts ('1e3') falls back to the float parser, as float() accepted it
+- cents() is the scalar form; mul_qty() prices qty x unit cents exactly
+- line_cents() prices qty x the unrounded unit price with a single half-up rounding, so a
+  sub-cent unit price (0.333 x 3 = 1.00) isn't rounded twice; the unit price shown next to it
+  is still rounded on its own, so a line can differ from qty x shown unit price
+- Rounding is half up (away from zero) on the decimal value as written: 1.005 -> 1.01 and
+  2.675 -> 2.68, where f'{x:.2f}' rounded the binary float down (1.00, 2.67)
+- format_cents() renders "1234.56" strings from integers (no float formatting)
+- journal_pairs() interleaves [amount, -amount] so debit/credit pairs always net to zero
+- to_float() converts back to float only at the output boundary (Excel numeric cells)
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+import pandas as pd
+
+_AMOUNT_RE = r"^([+-]?)(\d*)(?:\.(\d*))?$"
+# Text the float parser reads exactly: no formatting and no third decimal to round
+_PLAIN_RE = r"\s*[+-]?(?:\d+\.?\d{0,2}|\.\d{1,2})\s*"
+
+
+def _float_cents(values):
+    """float/int values -> (int64 cents, missing mask), rounded exactly as f'{x:.2f}' rounds them."""
+    arr = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    missing = ~np.isfinite(arr)
+    arr = np.where(missing, 0.0, arr)
+    scaled = arr * 100.0
+    out = np.rint(scaled)
+    # Products within a hair of .5 can round differently from f'{x:.2f}'; settle those from the text
+    tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if tie.any():
+        out[tie] = np.char.replace(np.char.mod("%.2f", arr[tie]), ".", "").astype("int64")
+    return out.astype("int64"), missing
+
+
+def _string_cents(s):
+    """Strings -> (int64 cents, missing mask); anything that isn't a plain amount is missing."""
+    s = s.str.replace(r"[\s$,*]", "", regex=True)
+    paren = (s.str.startswith("(") & s.str.endswith(")")).to_numpy(dtype=bool)
+    parts = s.str.strip("()").str.extract(_AMOUNT_RE)
+    sign, whole, frac = parts[0], parts[1].fillna(""), parts[2].fillna("")
+    valid = (parts[0].notna() & (whole.ne("") | frac.ne(""))).to_numpy(dtype=bool)
+    whole_i = pd.to_numeric(whole.where(whole.ne(""), "0"), errors="coerce").fillna(0).to_numpy(dtype="int64")
+    # Third decimal digit rounds half up; anything past it is ignored
+    frac3 = pd.to_numeric(frac.str.ljust(3, "0").str[:3], errors="coerce").fillna(0).to_numpy(dtype="int64")
+    cents = whole_i * 100 + (frac3 + 5) // 10
+    negative = sign.eq("-").fillna(False).to_numpy(dtype=bool) ^ paren
+    cents = np.where(negative, -cents, cents)
+    return np.where(valid, cents, 0).astype("int64"), ~valid
+
+
+def to_cents(values):
+    """Series/list/array of amounts -> pandas Series of nullable Int64 cents (index preserved)."""
+    s = values if isinstance(values, pd.Series) else pd.Series([values] if np.ndim(values) == 0 else values)
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        data, missing = _float_cents(s)
+        return pd.Series(pd.arrays.IntegerArray(data, missing), index=s.index)
+    if pd.api.types.is_object_dtype(s):
+        is_str = s.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+    else:
+        is_str = s.notna().to_numpy(dtype=bool)
+    data, missing = _float_cents(s.where(~is_str))
+    if is_str.any():
+        # Plain text with <= 2 decimals parses in C; $ , ( ) * formatting and a third decimal
+        # (rounded half up) go through the regex path
+        text = s[is_str].astype(str)
+        plain = text.str.fullmatch(_PLAIN_RE).to_numpy(dtype=bool)
+        pos = np.flatnonzero(is_str)
+        if plain.any():
+            data[pos[plain]], missing[pos[plain]] = _float_cents(text[plain])
+        if not plain.all():
+            data[pos[~plain]], missing[pos[~plain]] = _string_cents(text[~plain])
+            # What float() accepts and the amount grammar doesn't ('1e3')
+            retry = pos[~plain][missing[pos[~plain]]]
+            if len(retry):
+                data[retry], missing[retry] = _float_cents(s.iloc[retry])
+    return pd.Series(pd.arrays.IntegerArray(data, missing), index=s.index)
+
+
+def cents(value):
+    """Scalar amount -> int cents, or None when it can't be parsed."""
+    v = to_cents(pd.Series([value], dtype=object)).iloc[0]
+    return None if pd.isna(v) else int(v)
+
+
+_CENT = Decimal("0.01")
+
+
+def _decimal(v):
+    """Decimal of an amount as written: floats through their shortest repr (0.1 -> '0.1')."""
+    return v if isinstance(v, Decimal) else Decimal(str(v).strip())
+
+
+def _half_up(amounts):
+    """Decimal dollars -> int cents, rounded half up (away from zero)."""
+    return [int(a.quantize(_CENT, rounding=ROUND_HALF_UP) * 100) for a in amounts]
+
+
+def mul_qty(unit_cents, qty):
+    """Exact qty x unit price in cents; fractional quantities round half up to the cent."""
+    c, q = np.broadcast_arrays(np.asarray(unit_cents, dtype="int64"), np.asarray(qty, dtype="float64"))
+    whole = q == np.floor(q)
+    out = np.array(c * np.where(whole, q, 0).astype("int64"))
+    if not whole.all():
+        # Decimal only for the fractional lines: c * q in floats can land a hair off a .5 tie
+        frac = ~whole
+        out[frac] = _half_up(Decimal(int(c_)) / 100 * _decimal(q_) for c_, q_ in zip(c[frac], q[frac].tolist()))
+    return int(out) if out.ndim == 0 else out
+
+
+def line_cents(unit_prices, qtys):
+    """
+    qty x unrounded unit price (numbers or plain numeric text) -> int64 cents array, one half-up
+    rounding per line.
+    """
+    return np.asarray(_half_up(_decimal(p) * _decimal(q) for p, q in zip(unit_prices, qtys)), dtype="int64")
+
+
+def format_cents(values):
+    """Int cents -> '1234.56' / '-0.50' strings. Scalars return a str, arrays a list."""
+    arr = np.asarray(values, dtype="int64")
+    scalar = arr.ndim == 0
+    arr = np.atleast_1d(arr)
+    mag = np.abs(arr)
+    whole = pd.Series(mag // 100).astype(str)
+    frac = pd.Series(mag % 100).astype(str).str.zfill(2)
+    sign = pd.Series(np.where(arr < 0, "-", ""))
+    out = (sign + whole + "." + frac).tolist()
+    return out[0] if scalar else out
+
+
+def journal_pairs(values):
+    """[a, b, ...] cents -> [a, -a, b, -b, ...]; each pair nets to exactly zero."""
+    arr = np.asarray(values, dtype="int64")
+    return np.column_stack([arr, -arr]).ravel()
+
+
+def to_float(values):
+    """Cents -> float dollars for numeric output cells; <NA> becomes NaN."""
+    if isinstance(values, pd.Series):
+        return values.astype("Float64").to_numpy(dtype="float64", na_value=np.nan) / 100.0
+    if np.ndim(values) == 0:
+        return int(values) / 100.0
+    return np.asarray(values, dtype="int64") / 100.0
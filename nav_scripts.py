@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+nav_scripts.py
+- Loads the versioned processing scripts (file names contain spaces/versions) as modules
+- Used by the benchmark, equivalence and pipeline tooling so they call the real functions
+- SCRIPTS maps a short key to the current script file; bump it when a script version changes
+"""
+import importlib.util
+import sys
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent
+
+SCRIPTS = {
+    "walmart_parser": "Walmart CHRGBK Parser v1.7.2.py",
+    "walmart_processing": "Walmart CHRGBK Processing Logic v1.1.8.py",
+    "walmart_cm": "Walmart CM Upload Logic v1.3.py",
+    "amazon": "Amazon CHRGBK Processing Logic v3.1.6.py",
+    "coop": "COOP Upload Logic v1.2.py",
+    "dra": "DRA CM Processing Logic v1.6.py",
+    "price_adjustments": "Price Adjustments Logic v1.2.py",
+    "rebill": "Rebill Logic v1.1.1.py",
+}
+
+_loaded = {}
+
+
+def load_script(key_or_path, module_name=None):
+    """
+    Import a processing script by SCRIPTS key or by file path and return the module.
+    Modules are cached per (path, module_name) so repeated loads are free.
+    """
+    if key_or_path in SCRIPTS:
+        path = REPO_DIR / SCRIPTS[key_or_path]
+        default_name = f"nav_{key_or_path}"
+    else:
+        path = Path(key_or_path).resolve()
+        default_name = "nav_" + "".join(ch if ch.isalnum() else "_" for ch in path.stem).lower()
+    name = module_name or default_name
+    cache_key = (str(path), name)
+    if cache_key in _loaded:
+        return _loaded[cache_key]
+    if not path.exists():
+        raise FileNotFoundError(f"Script not found: {path}")
+    # Scripts import shared helpers (stage_profiler, ...) that live next to them
+    if str(path.parent) not in sys.path:
+        sys.path.insert(0, str(path.parent))
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    _loaded[cache_key] = module
+    return module
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+nav_sharding.py
+- Splits oversized NAV import files into shards of at most N rows so the journal /
+  configuration-package import doesn't crawl or time out
+- Journals are cut only between debit/credit pairs; credit memos only between documents, so a
+  Sales Header always travels with all of its Sales Lines (both tabs count toward N)
+- Shards are written concurrently (thread pool) as <output stem>_part01.xlsx, _part02.xlsx, ...
+- <output stem>_index.csv lists every shard with its rows, pairs/documents and amount total, plus
+  a TOTAL line; shard totals add up to the total of the unsharded file
+- Script entry points take the shard size from NAV_SHARD_ROWS=<n> (unset/0 = no sharding)
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import money
+
+DEFAULT_WRITE_WORKERS = 4
+INDEX_COLUMNS = ["part", "file", "rows", "groups", "total"]
+
+
+def shard_rows_from_env():
+    """NAV_SHARD_ROWS as a positive int, else None."""
+    val = os.environ.get("NAV_SHARD_ROWS", "").strip()
+    return int(val) if val.isdigit() and int(val) > 0 else None
+
+
+def pack_groups(sizes, max_rows):
+    """
+    Greedy packing of consecutive groups (sizes in rows) into shards of <= max_rows rows.
+    Returns (first group, stop group) per shard; a group larger than max_rows gets a shard of its own.
+    """
+    if max_rows < 1:
+        raise ValueError("max_rows must be at least 1")
+    bounds = np.concatenate([[0], np.cumsum(np.asarray(sizes, dtype="int64"))])
+    shards = []
+    g, n = 0, len(bounds) - 1
+    while g < n:
+        stop = int(np.searchsorted(bounds, bounds[g] + max_rows, side="right")) - 1
+        stop = max(stop, g + 1)
+        shards.append((g, stop))
+        g = stop
+    return shards
+
+
+def part_paths(output_path, count):
+    """<stem>_part01<suffix> ... with at least two digits."""
+    output_path = Path(output_path)
+    width = max(2, len(str(count)))
+    return [output_path.with_name(f"{output_path.stem}_part{k:0{width}d}{output_path.suffix}")
+            for k in range(1, count + 1)]
+
+
+def index_path(output_path):
+    output_path = Path(output_path)
+    return output_path.with_name(f"{output_path.stem}_index.csv")
+
+
+def shard_journal(df, max_rows):
+    """Journal frame -> list of frames, cut only between (debit, credit) row pairs."""
+    n = len(df)
+    sizes = np.full((n + 1) // 2, 2, dtype="int64")
+    if n % 2:
+        sizes[-1] = 1
+    return [df.iloc[2 * a:min(2 * b, n)] for a, b in pack_groups(sizes, max_rows)]
+
+
+def shard_credit_memo(header_df, line_df, max_rows):
+    """(Sales Header, Sales Line) -> list of (header part, line part); a document is never split."""
+    docs = header_df["No."].astype(str).to_numpy()
+    line_docs = line_df["Document No."].astype(str)
+    line_counts = line_docs.value_counts().reindex(docs, fill_value=0).to_numpy()
+    parts = []
+    for a, b in pack_groups(1 + line_counts, max_rows):
+        keep = line_docs.isin(set(docs[a:b])).to_numpy()
+        parts.append((header_df.iloc[a:b], line_df.loc[keep]))
+    return parts
+
+
+def _journal_total(df):
+    """Customer-side total: first row of every pair."""
+    return int(money.to_cents(df["Amount"].iloc[0::2]).fillna(0).sum())
+
+
+def _write_index(output_path, rows, whole_total):
+    total = sum(r["total"] for r in rows)
+    if total != whole_total:
+        raise ValueError(f"Shard totals {total} != file total {whole_total} for {output_path}")
+    index = pd.DataFrame(rows, columns=INDEX_COLUMNS)
+    index.loc[len(index)] = ["TOTAL", "", int(index["rows"].sum()), int(index["groups"].sum()), total]
+    index["total"] = money.format_cents(index["total"].to_numpy(dtype="int64"))
+    path = index_path(output_path)
+    index.to_csv(path, index=False)
+    return path
+
+
+def _write_all(jobs, workers):
+    """jobs: [(write callable, path)]; written concurrently, first error re-raised."""
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="nav-shard") as pool:
+        for future in [pool.submit(fn, path) for fn, path in jobs]:
+            future.result()
+
+
+def write_journal_shards(df, output_path, max_rows, workers=DEFAULT_WRITE_WORKERS):
+    """Write a journal as pair-aligned shards plus the index; returns (shard paths, index path)."""
+    shards = shard_journal(df, max_rows)
+    paths = part_paths(output_path, len(shards))
+    jobs = [(lambda p, s=s: s.to_excel(p, index=False), p) for s, p in zip(shards, paths)]
+    _write_all(jobs, workers)
+    rows = [{"part": k, "file": p.name, "rows": len(s), "groups": (len(s) + 1) // 2, "total": _journal_total(s)}
+            for k, (s, p) in enumerate(zip(shards, paths), start=1)]
+    return paths, _write_index(output_path, rows, _journal_total(df))
+
+
+def _write_credit_memo(path, header_df, line_df):
+    with pd.ExcelWriter(path, engine="xlsxwriter") as writer:
+        header_df.to_excel(writer, sheet_name="Sales Header", index=False)
+        line_df.to_excel(writer, sheet_name="Sales Line", index=False)
+
+
+def write_credit_memo_shards(header_df, line_df, output_path, max_rows, workers=DEFAULT_WRITE_WORKERS):
+    """Write a credit memo batch as document-aligned shards plus the index; returns (shard paths, index path)."""
+    shards = shard_credit_memo(header_df, line_df, max_rows)
+    paths = part_paths(output_path, len(shards))
+    jobs = [(lambda p, h=h, ln=ln: _write_credit_memo(p, h, ln), p) for (h, ln), p in zip(shards, paths)]
+    _write_all(jobs, workers)
+
+    def total(lines):
+        return int(money.to_cents(lines["Amount"]).fillna(0).sum()) if len(lines) else 0
+
+    rows = [{"part": k, "file": p.name, "rows": len(h) + len(ln), "groups": len(h), "total": total(ln)}
+            for k, ((h, ln), p) in enumerate(zip(shards, paths), start=1)]
+    return paths, _write_index(output_path, rows, total(line_df))
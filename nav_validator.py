@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+nav_validator.py
+- Pre-upload checks for the generated NAV files, so problems show up before NAV rejects an import
+- Layouts are recognized by their columns: general journal (process_walmart_file /
+  process_chargebacks), Sales Header / Sales Line (COOP and Walmart CM credit memos) and the
+  openpyxl line exporters (DRA, Price Adjustments, Rebill)
+- Every rule is evaluated column-wise over the whole frame (one boolean mask per rule, no row loop)
+- Violations come back as one frame: sheet, Excel row (header is row 1), rule, column, value, message
+- Rules: unbalanced or mismatched debit/credit pairs, missing/NaN amounts, text over NAV field
+  lengths (LIMITS), UNKNOWN/blank G/L numbers, duplicate or blank document numbers, sales lines
+  without a header (and headers without lines), line amount != qty x unit price
+- CLI: python nav_validator.py out.xlsx [more.xlsx ...] [--report violations.csv]; exits 1 on violations
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import money
+
+# NAV/BC field lengths (Text[100] descriptions, Code[35] external document, Code[20] document numbers)
+LIMITS = {
+    "Description": 100,
+    "Posting Description": 100,
+    "External Document No.": 35,
+    "No.": 20,
+    "Document No.": 20,
+    "Applies-to Doc. No.": 20,
+}
+UNKNOWN_ACCOUNTS = {"", "UNKNOWN", "NONE", "NAN"}
+VIOLATION_COLUMNS = ["sheet", "row", "rule", "column", "value", "message"]
+
+JOURNAL_COLS = {"Posting Date", "Description", "Amount", "Bal. Account No."}
+SALES_HEADER_COLS = {"No.", "Sell-to Customer No.", "External Document No."}
+SALES_LINE_COLS = {"Document No.", "Line No.", "No.", "Amount"}
+EXPORT_LINE_COLS = {"Type", "No.", "Description", "Line Amount Excl. Tax"}
+
+
+def detect_layout(df):
+    cols = set(map(str, df.columns))
+    if JOURNAL_COLS <= cols:
+        return "journal"
+    if SALES_HEADER_COLS <= cols:
+        return "sales_header"
+    if SALES_LINE_COLS <= cols:
+        return "sales_line"
+    if EXPORT_LINE_COLS <= cols:
+        return "export_lines"
+    return None
+
+
+def _text(s):
+    """Column as stripped strings; missing values become ''. Work is done once per distinct value."""
+    codes, uniques = pd.factorize(s)
+    clean = pd.Series(uniques, dtype=object).astype(str).str.strip().to_numpy(dtype=object)
+    return pd.Series(np.append(clean, "")[codes], index=s.index, dtype=object)
+
+
+def _collect(found, sheet, df, rule, column, mask, message):
+    mask = np.asarray(mask, dtype=bool)
+    if not mask.any():
+        return
+    pos = np.flatnonzero(mask)
+    values = df[column].iloc[pos] if column in df.columns else pd.Series([None] * len(pos))
+    found.append(pd.DataFrame({
+        "sheet": sheet,
+        "row": pos + 2,
+        "rule": rule,
+        "column": column,
+        "value": values.to_numpy(dtype=object),
+        "message": message,
+    }))
+
+
+def _length_rules(found, sheet, df, columns):
+    for col in columns:
+        if col in df.columns and col in LIMITS:
+            too_long = _text(df[col]).str.len().to_numpy() > LIMITS[col]
+            _collect(found, sheet, df, "too_long", col, too_long, f"longer than {LIMITS[col]} characters")
+
+
+def _unknown_account(s):
+    return _text(s).str.upper().isin(UNKNOWN_ACCOUNTS).to_numpy()
+
+
+def _check_journal(found, sheet, df):
+    cents = money.to_cents(df["Amount"])
+    missing = cents.isna().to_numpy()
+    _collect(found, sheet, df, "amount_missing", "Amount", missing, "amount is blank or not a number")
+    _collect(found, sheet, df, "unknown_account", "Bal. Account No.", _unknown_account(df["Bal. Account No."]),
+             "no G/L account")
+    codes, uniques = pd.factorize(df["Posting Date"])
+    parsed = pd.to_datetime(pd.Series(uniques, dtype=object), errors="coerce", format="mixed")
+    bad_date = np.append(parsed.isna().to_numpy(), True)[codes]
+    _collect(found, sheet, df, "bad_posting_date", "Posting Date", bad_date,
+             "posting date missing or unreadable")
+    _length_rules(found, sheet, df, ["Description", "Document No."])
+
+    # Lines are written as debit/credit pairs: rows (0,1), (2,3), ... must net to zero on one account
+    n = len(df)
+    paired = n - n % 2
+    if n % 2:
+        odd = np.zeros(n, dtype=bool)
+        odd[-1] = True
+        _collect(found, sheet, df, "unpaired_line", "Amount", odd, "last line has no offsetting line")
+    if paired:
+        amt = cents.fillna(0).to_numpy(dtype="int64")[:paired].reshape(-1, 2)
+        desc = _text(df["Description"]).to_numpy()[:paired].reshape(-1, 2)
+        acct = _text(df["Bal. Account No."]).to_numpy()[:paired].reshape(-1, 2)
+        bad_sum = (amt.sum(axis=1) != 0) & ~missing[:paired].reshape(-1, 2).any(axis=1)
+        bad_match = (desc[:, 0] != desc[:, 1]) | (acct[:, 0] != acct[:, 1])
+        pad = np.zeros(n % 2, dtype=bool)
+        _collect(found, sheet, df, "unbalanced_pair", "Amount", np.concatenate([np.repeat(bad_sum, 2), pad]),
+                 "debit/credit pair does not net to zero")
+        _collect(found, sheet, df, "pair_mismatch", "Description", np.concatenate([np.repeat(bad_match, 2), pad]),
+                 "paired lines differ in description or G/L account")
+
+
+def _check_sales_header(found, sheet, df):
+    no = _text(df["No."])
+    _collect(found, sheet, df, "blank_document_no", "No.", no.eq("").to_numpy(), "credit memo number is blank")
+    dup = no.duplicated(keep=False).to_numpy() & no.ne("").to_numpy()
+    _collect(found, sheet, df, "duplicate_document_no", "No.", dup, "credit memo number used more than once")
+    _collect(found, sheet, df, "blank_customer", "Sell-to Customer No.",
+             _text(df["Sell-to Customer No."]).eq("").to_numpy(), "no customer")
+    _length_rules(found, sheet, df, ["No.", "External Document No.", "Posting Description", "Applies-to Doc. No."])
+
+
+def _check_sales_line(found, sheet, df):
+    gl = _text(df["Type"]).eq("G/L Account").to_numpy() if "Type" in df.columns else np.ones(len(df), dtype=bool)
+    _collect(found, sheet, df, "unknown_account", "No.", gl & _unknown_account(df["No."]), "no G/L account")
+    for col in ("Unit Price", "Amount"):
+        if col in df.columns:
+            _collect(found, sheet, df, "amount_missing", col,
+                     money.to_cents(df[col]).isna().to_numpy(),
+                     "amount is blank or not a number")
+    key = _text(df["Document No."]) + "\x1f" + _text(df["Line No."])
+    _collect(found, sheet, df, "duplicate_line_no", "Line No.", key.duplicated(keep=False).to_numpy(),
+             "same Document No. and Line No. used more than once")
+    _length_rules(found, sheet, df, ["Description", "Document No."])
+
+
+def _check_export_lines(found, sheet, df):
+    gl = _text(df["Type"]).eq("G/L Account").to_numpy()
+    _collect(found, sheet, df, "unknown_account", "No.", gl & _unknown_account(df["No."]), "no G/L account")
+    line_cents = money.to_cents(df["Line Amount Excl. Tax"])
+    _collect(found, sheet, df, "amount_missing", "Line Amount Excl. Tax", gl & line_cents.isna().to_numpy(),
+             "amount is blank or not a number")
+    if {"Quantity", "Unit Price Excl. Tax"} <= set(df.columns):
+        unit = money.to_cents(df["Unit Price Excl. Tax"])
+        qty = pd.to_numeric(df["Quantity"], errors="coerce").to_numpy(dtype="float64")
+        ok = gl & unit.notna().to_numpy() & line_cents.notna().to_numpy() & ~np.isnan(qty)
+        expected = np.zeros(len(df), dtype="int64")
+        if ok.any():
+            expected[ok] = money.mul_qty(unit.to_numpy(dtype="int64", na_value=0)[ok], qty[ok])
+        actual = line_cents.to_numpy(dtype="int64", na_value=0)
+        # Rebill/DRA lines are priced from the unrounded unit price: each unit can be up to half a
+        # cent off the shown one (whole qty: at most qty // 2 cents in all; fractional qty: plus
+        # the rounding of qty x shown price)
+        q = np.abs(np.nan_to_num(qty))
+        slack = np.where(q == np.floor(q), np.floor(q / 2), np.ceil(q / 2) + 1).astype("int64")
+        _collect(found, sheet, df, "line_amount_mismatch", "Line Amount Excl. Tax",
+                 ok & (np.abs(actual - expected) > slack), "line amount is not quantity x unit price")
+    _length_rules(found, sheet, df, ["Description"])
+
+
+_CHECKS = {
+    "journal": _check_journal,
+    "sales_header": _check_sales_header,
+    "sales_line": _check_sales_line,
+    "export_lines": _check_export_lines,
+}
+
+
+def _finish(found):
+    if not found:
+        return pd.DataFrame(columns=VIOLATION_COLUMNS)
+    return pd.concat(found, ignore_index=True)[VIOLATION_COLUMNS]
+
+
+def validate_frame(df, layout=None, sheet="Sheet1"):
+    """Violations for one generated frame; layout is detected from the columns when not given."""
+    layout = layout or detect_layout(df)
+    if layout not in _CHECKS:
+        raise ValueError(f"Unrecognized NAV layout for sheet {sheet!r}: {list(df.columns)}")
+    found = []
+    frame = df.reset_index(drop=True)
+    frame.attrs = {}   # pandas deep-copies attrs (posting keys) on every derived object
+    _CHECKS[layout](found, sheet, frame)
+    return _finish(found)
+
+
+def validate_credit_memo(header_df, line_df, header_sheet="Sales Header", line_sheet="Sales Line"):
+    """Both credit memo tabs plus the cross-tab rule: every line needs a header and vice versa."""
+    found = [validate_frame(header_df, "sales_header", header_sheet),
+             validate_frame(line_df, "sales_line", line_sheet)]
+    header_no = _text(header_df["No."])
+    line_doc = _text(line_df["Document No."])
+    cross = []
+    _collect(cross, line_sheet, line_df.reset_index(drop=True), "orphan_line", "Document No.",
+             ~line_doc.isin(set(header_no)).to_numpy(), "no Sales Header with this number")
+    _collect(cross, header_sheet, header_df.reset_index(drop=True), "header_without_lines", "No.",
+             ~header_no.isin(set(line_doc)).to_numpy(), "no Sales Line for this credit memo")
+    return _finish([f for f in found if len(f)] + cross)
+
+
+def validate_workbook(path):
+    """Every recognized sheet of a written workbook; Sales Header/Line pairs also get the cross-tab rule."""
+    sheets = pd.read_excel(path, sheet_name=None)
+    layouts = {name: detect_layout(df) for name, df in sheets.items()}
+    headers = [n for n, lay in layouts.items() if lay == "sales_header"]
+    lines = [n for n, lay in layouts.items() if lay == "sales_line"]
+    found = []
+    if len(headers) == 1 and len(lines) == 1:
+        found.append(validate_credit_memo(sheets[headers[0]], sheets[lines[0]], headers[0], lines[0]))
+        done = {headers[0], lines[0]}
+    else:
+        done = set()
+    for name, df in sheets.items():
+        if name in done or layouts[name] is None or df.empty:
+            continue
+        found.append(validate_frame(df, layouts[name], name))
+    return _finish([f for f in found if len(f)])
+
+
+def warn_violations(violations, label, limit=5):
+    """Stderr summary used by the scripts right before they write; returns True when clean."""
+    if violations.empty:
+        return True
+    counts = violations["rule"].value_counts()
+    print(f"WARNING: {label}: {len(violations)} NAV import problem(s): "
+          + ", ".join(f"{rule}={n}" for rule, n in counts.items()), file=sys.stderr)
+    for v in violations.head(limit).itertuples(index=False):
+        print(f"  {v.sheet} row {v.row} {v.column}: {v.message} ({v.value!r})", file=sys.stderr)
+    return False
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Check generated NAV import workbooks before uploading them")
+    ap.add_argument("paths", nargs="+", help="Journal / credit memo / export workbooks")
+    ap.add_argument("--report", help="Write every violation to this .csv or .xlsx")
+    ap.add_argument("--limit", action="append", default=[], metavar="FIELD=N",
+                    help="Override a field length, e.g. --limit Description=50 for classic NAV")
+    args = ap.parse_args()
+    for item in args.limit:
+        field, _, n = item.rpartition("=")
+        if not field or not n.isdigit():
+            ap.error(f"--limit expects FIELD=N, got {item!r}")
+        LIMITS[field] = int(n)
+
+    reports = []
+    for path in args.paths:
+        violations = validate_workbook(path)
+        violations.insert(0, "file", str(path))
+        reports.append(violations)
+        print(f"{path}: {'OK' if violations.empty else f'{len(violations)} violation(s)'}")
+        for v in violations.head(20).itertuples(index=False):
+            print(f"  {v.sheet} row {v.row} [{v.rule}] {v.column}: {v.message} ({v.value!r})")
+    report = pd.concat(reports, ignore_index=True)
+    if args.report:
+        if Path(args.report).suffix.lower() == ".csv":
+            report.to_csv(args.report, index=False)
+        else:
+            report.to_excel(args.report, index=False)
+        print(f"Violation report written to: {args.report}")
+    return 1 if len(report) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
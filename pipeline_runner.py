@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+pipeline_runner.py
+- Runs the read -> transform -> write steps of the scripts as an asyncio pipeline so disk I/O of one
+  file overlaps with CPU work on another
+- Steps are joined by bounded asyncio queues (--queue-size), so a fast reader can't pile every
+  file into memory ahead of a slow transform
+- Blocking work is offloaded: "thread" steps (Excel reads/writes) run in a thread pool, "process"
+  steps (the pure-Python date fill loop) in a process pool, "inline" steps on the event loop
+  thread (anything touching the SQLite posting ledger)
+- Results come back in input order whatever order the workers finish in
+- Jobs:
+  parser:  Check_*.xlsx -> read_check_file (thread) -> fill_internal_invoice_dates (process, per
+           file) -> combine -> final_order -> clean -> [invoice index lookback] -> one output
+           (xlsx/csv/parquet)
+  walmart: remittance *.xlsx -> read + header (thread) -> process_walmart_file (inline, ledger
+           aware) -> journal .xlsx per check (thread) -> ledger record (inline)
+- CLI: python pipeline_runner.py parser --input ./checks --output Deductions_All.xlsx
+       python pipeline_runner.py walmart --input ./remittances --out-dir ./journals
+"""
+import argparse
+import asyncio
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+import stage_profiler
+from invoice_index import InvoiceIndex, fill_from_index
+from nav_scripts import load_script
+from nav_sharding import shard_rows_from_env, write_journal_shards
+from posting_ledger import PostingLedger
+from stage_profiler import stage
+
+STEP_KINDS = ("thread", "process", "inline")
+DEFAULT_QUEUE_SIZE = 4
+_DONE = object()
+
+
+class Step:
+    """
+    One pipeline step: func(item) -> item, run by `workers` concurrent workers. on_error
+    ("raise"/"skip") overrides the pipeline's default for this step only.
+    """
+
+    def __init__(self, name, func, kind="thread", workers=1, on_error=None):
+        if kind not in STEP_KINDS:
+            raise ValueError(f"Unknown step kind: {kind}")
+        if on_error not in (None, "raise", "skip"):
+            raise ValueError(f"Unknown on_error: {on_error}")
+        self.name = name
+        self.func = func
+        self.kind = kind
+        self.workers = max(1, int(workers))
+        self.on_error = on_error
+
+
+class ScriptCall:
+    """
+    Picklable reference to a function in one of the versioned scripts, for "process" steps.
+    The worker process loads the script by SCRIPTS key, so this also works with spawn.
+    """
+
+    def __init__(self, key, func_name, **kwargs):
+        self.key = key
+        self.func_name = func_name
+        self.kwargs = kwargs
+
+    def __call__(self, item):
+        return getattr(load_script(self.key), self.func_name)(item, **self.kwargs)
+
+
+async def _run(items, steps, queue_size, on_error, executors):
+    loop = asyncio.get_running_loop()
+    queues = [asyncio.Queue(maxsize=queue_size) for _ in steps]
+    results = {}
+
+    async def feed():
+        for i, item in enumerate(items):
+            await queues[0].put((i, item))
+        for _ in range(steps[0].workers):
+            await queues[0].put(_DONE)
+
+    async def worker(k):
+        step = steps[k]
+        q_in = queues[k]
+        skip = (step.on_error or on_error) == "skip"
+        while True:
+            msg = await q_in.get()
+            if msg is _DONE:
+                return
+            i, item = msg
+            try:
+                if step.kind == "inline":
+                    out = step.func(item)
+                else:
+                    out = await loop.run_in_executor(executors[step.kind], step.func, item)
+            except Exception as e:
+                if not skip:
+                    raise
+                print(f"WARNING: {step.name} failed for item {i}: {e}", file=sys.stderr)
+                continue
+            if k + 1 < len(steps):
+                await queues[k + 1].put((i, out))
+            else:
+                results[i] = out
+
+    async def run_step(k):
+        await asyncio.gather(*(worker(k) for _ in range(steps[k].workers)))
+        if k + 1 < len(steps):
+            for _ in range(steps[k + 1].workers):
+                await queues[k + 1].put(_DONE)
+
+    tasks = [asyncio.ensure_future(feed())] + [asyncio.ensure_future(run_step(k)) for k in range(len(steps))]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return [results[i] for i in sorted(results)]
+
+
+def run_pipeline(items, steps, queue_size=DEFAULT_QUEUE_SIZE, on_error="raise"):
+    """
+    Push items through steps and return the last step's outputs in input order. With
+    on_error="skip" a failing item is reported on stderr and dropped; otherwise the first
+    failure cancels the pipeline and is re-raised. A Step's own on_error takes precedence.
+    """
+    items = list(items)
+    if not steps or not items:
+        return items if not steps else []
+    executors = {}
+    threads = sum(s.workers for s in steps if s.kind == "thread")
+    procs = sum(s.workers for s in steps if s.kind == "process")
+    if threads:
+        executors["thread"] = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="nav-pipeline")
+    if procs:
+        executors["process"] = ProcessPoolExecutor(max_workers=procs)
+    try:
+        return asyncio.run(_run(items, steps, max(1, queue_size), on_error, executors))
+    finally:
+        for ex in executors.values():
+            ex.shutdown(wait=True, cancel_futures=True)
+
+
+# ---------- jobs ----------
+
+def run_parser_job(input_dir, output, fmt=None, constant_memory=False, compact=False,
+                   read_workers=2, cpu_workers=None, queue_size=DEFAULT_QUEUE_SIZE, invoice_index=None):
+    """
+    Walmart parser over a Check_*.xlsx folder; same output as the parser's own main. With an
+    InvoiceIndex, dates the same-file search missed are looked up across earlier checks.
+    """
+    parser = load_script("walmart_parser")
+    paths = sorted(Path(input_dir).glob("Check_*.xlsx"))
+    steps = [
+        # An unreadable file is reported and left out; a failing date fill stops the job
+        Step("read", lambda p: parser.read_check_file(p, compact=compact), "thread", read_workers,
+             on_error="skip"),
+        # fill_internal_invoice_dates only matches rows within the same file, so it runs per file
+        Step("date_fill", ScriptCall("walmart_parser", "fill_internal_invoice_dates"), "process",
+             cpu_workers or os.cpu_count() or 1),
+    ]
+    with stage("pipeline.parser", rows_in=len(paths)) as st:
+        frames = run_pipeline(paths, steps, queue_size=queue_size)
+        df = parser.combine_check_frames(frames, compact=compact)
+        if "Internal Invoice Date" not in df.columns:
+            df["Internal Invoice Date"] = pd.NaT
+        df = parser.final_order(df, drop_col_o=not compact)
+        df = parser.clean_rows_postparse(df)
+        if invoice_index is not None:
+            # Index the batch first: a deduction may fill from an earlier check of this same batch
+            invoice_index.add(df)
+            df = fill_from_index(df, invoice_index)
+        fmt = parser.output_format(output, fmt)
+        if fmt == "csv":
+            parser.write_csv(df, output)
+        elif fmt == "parquet":
+            parser.write_parquet(df, output)
+        elif constant_memory:
+            parser.write_xlsx_streaming(df, output)
+        else:
+            parser.write_xlsx(df, output)
+        st.rows_out = len(df)
+    return df
+
+
+def run_walmart_job(paths, out_dir=".", ledger=None, read_workers=2, write_workers=2,
+                    queue_size=DEFAULT_QUEUE_SIZE, shard_rows=None):
+    """
+    Journal every remittance file. Returns one (input path, output path or None) per input, in
+    input order; None means every line was already posted. Journals over shard_rows rows are
+    written as _partNN files and the output path is their index.
+    """
+    walmart = load_script("walmart_processing")
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    def read(path):
+        df = pd.read_excel(path)
+        check_number, posting_date, payment_cents = walmart.remittance_header(df, Path(path).name)
+        return {"path": path, "df": df, "check": check_number, "posting_date": posting_date,
+                "payment_cents": payment_cents}
+
+    def build(job):
+        job["journal"] = walmart.process_walmart_file(job.pop("df"), job["check"], job["posting_date"],
+                                                      ledger=ledger)
+        return job
+
+    def write(job):
+        journal = job["journal"]
+        job["output"] = None
+        if ledger is None or journal.attrs["posting_keys"]:
+            job["output"] = out_dir / walmart.output_file_name(job["check"], job["payment_cents"])
+            if shard_rows and len(journal) > shard_rows:
+                _, job["output"] = write_journal_shards(journal, job["output"], shard_rows, workers=1)
+            else:
+                journal.to_excel(job["output"], index=False)
+        return job
+
+    def record(job):
+        if ledger is not None and job["output"] is not None:
+            ledger.record(job["journal"].attrs["posting_keys"], output=job["output"])
+        return (job["path"], job["output"])
+
+    steps = [
+        # Unreadable remittances are reported and left out; journal/write/record failures stop the
+        # job (a written journal that isn't recorded would be posted again)
+        Step("read", read, "thread", read_workers, on_error="skip"),
+        Step("journal", build, "inline"),
+        Step("write", write, "thread", write_workers),
+        Step("record", record, "inline"),
+    ]
+    with stage("pipeline.walmart", rows_in=len(paths)) as st:
+        done = run_pipeline(paths, steps, queue_size=queue_size)
+        st.rows_out = len(done)
+    return done
+
+
+def _remittance_paths(inputs):
+    paths = []
+    for item in inputs:
+        p = Path(item)
+        paths.extend(sorted(p.glob("*.xlsx")) if p.is_dir() else [p])
+    return paths
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run the NAV scripts as an overlapped read/transform/write pipeline")
+    ap.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                    help="Items allowed to wait between two steps")
+    ap.add_argument("--read-workers", type=int, default=2, help="Concurrent file reads")
+    ap.add_argument("--profile", nargs="?", const="", default=None,
+                    help="Record per-stage timings to an NDJSON trace (default nav_profile.ndjson)")
+    sub = ap.add_subparsers(dest="job", required=True)
+
+    p = sub.add_parser("parser", help="Walmart CHRGBK parser over a Check_*.xlsx folder")
+    p.add_argument("--input", required=True, help="Directory with Check_*.xlsx files")
+    p.add_argument("--output", required=True, help="Final output path (.xlsx, .csv or .parquet)")
+    p.add_argument("--format", choices=("xlsx", "csv", "parquet"), default=None)
+    p.add_argument("--constant-memory", action="store_true")
+    p.add_argument("--compact", action="store_true")
+    p.add_argument("--cpu-workers", type=int, default=None,
+                   help="Processes for the date fill (default: CPU count)")
+    p.add_argument("--invoice-index", nargs="?", const="", default=None,
+                   help="Cross-check date lookback via the invoice index (default NAV_INVOICE_INDEX)")
+
+    w = sub.add_parser("walmart", help="Walmart CHRGBK journals for many remittance files")
+    w.add_argument("--input", nargs="+", required=True, help="Remittance .xlsx files or directories")
+    w.add_argument("--out-dir", default=".", help="Where the journal workbooks go")
+    w.add_argument("--write-workers", type=int, default=2, help="Concurrent workbook writes")
+    w.add_argument("--no-ledger", action="store_true", help="Don't consult/record the posting ledger")
+    w.add_argument("--shard-rows", type=int, default=shard_rows_from_env(),
+                   help="Split journals longer than this into _partNN files (default NAV_SHARD_ROWS)")
+    args = ap.parse_args()
+    if args.profile is not None:
+        stage_profiler.enable(args.profile or None)
+
+    if args.job == "parser":
+        index = None
+        if args.invoice_index is not None:
+            index = InvoiceIndex(args.invoice_index) if args.invoice_index else InvoiceIndex.from_env()
+        try:
+            df = run_parser_job(args.input, args.output, fmt=args.format, constant_memory=args.constant_memory,
+                                compact=args.compact, read_workers=args.read_workers,
+                                cpu_workers=args.cpu_workers, queue_size=args.queue_size, invoice_index=index)
+        finally:
+            if index is not None:
+                index.close()
+        print(f"Deductions_All ({len(df)} rows) written to: {args.output}")
+        return 0
+
+    ledger = None if args.no_ledger else PostingLedger.from_env()
+    try:
+        done = run_walmart_job(_remittance_paths(args.input), out_dir=args.out_dir, ledger=ledger,
+                               read_workers=args.read_workers, write_workers=args.write_workers,
+                               queue_size=args.queue_size, shard_rows=args.shard_rows)
+    finally:
+        if ledger is not None:
+            ledger.close()
+    for path, output in done:
+        print(f"{path} -> {output if output is not None else 'nothing new to post'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+posting_ledger.py
+- Local SQLite ledger of lines already journaled, so a re-run never double-posts a check,
+  Amazon payment, COOP invoice or Walmart credit memo
+- Key: (source, check/payment/customer ref, invoice, deduction code, amount in cents, seq); the key
+  is the table's primary key (WITHOUT ROWID), so lookups are index seeks
+- seq numbers repeats of the same line within one batch (number_keys(): 0 for the first, 1 for the
+  second ...), so two real lines with the same invoice, code and amount are both posted; ledgers
+  written before seq existed are migrated in place with seq 0
+- Keys handed out by split_posted() stay reserved until record(), so the same check file twice in
+  one run (pipeline_runner) is only journaled once
+- posted_mask() checks a whole batch in one query (keys are bulk-loaded into a temp table and joined)
+- record() inserts a batch in a single transaction, called only after the output file was written
+- Location: NAV_POSTING_LEDGER=<path> (default nav_posting_ledger.sqlite in the working directory);
+  NAV_POSTING_LEDGER=off disables it for the script entry points
+- CLI: python posting_ledger.py [--source walmart] lists keys; --forget --source walmart --ref 001256261
+"""
+import argparse
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+import numpy as np
+
+DEFAULT_LEDGER_PATH = "nav_posting_ledger.sqlite"
+KEY_FIELDS = ("source", "ref", "invoice", "code", "amount_cents", "seq")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS posted (
+    source       TEXT    NOT NULL,
+    ref          TEXT    NOT NULL,
+    invoice      TEXT    NOT NULL,
+    code         TEXT    NOT NULL,
+    amount_cents INTEGER NOT NULL,
+    seq          INTEGER NOT NULL DEFAULT 0,
+    output       TEXT,
+    posted_at    TEXT    NOT NULL,
+    PRIMARY KEY (source, ref, invoice, code, amount_cents, seq)
+) WITHOUT ROWID;
+"""
+
+# Ledgers from before seq: every stored line is the first of its kind
+_MIGRATE_SEQ = f"""
+BEGIN;
+ALTER TABLE posted RENAME TO posted_noseq;
+{_SCHEMA}
+INSERT INTO posted (source, ref, invoice, code, amount_cents, seq, output, posted_at)
+    SELECT source, ref, invoice, code, amount_cents, 0, output, posted_at FROM posted_noseq;
+DROP TABLE posted_noseq;
+COMMIT;
+"""
+
+
+def make_key(source, ref, invoice, code, amount_cents, seq=0):
+    """Normalized ledger key; None/NaN text parts become ''."""
+    def _s(v):
+        if v is None or (isinstance(v, float) and np.isnan(v)):
+            return ""
+        return str(v).strip()
+    return (_s(source), _s(ref), _s(invoice), _s(code), int(amount_cents), int(seq))
+
+
+def number_keys(keys):
+    """Keys of one batch in order, with seq set to how many identical lines came before."""
+    seen = {}
+    out = []
+    for k in keys:
+        base = tuple(k[:5])
+        out.append(base + (seen.get(base, 0),))
+        seen[base] = seen.get(base, 0) + 1
+    return out
+
+
+class PostingLedger:
+    def __init__(self, path=DEFAULT_LEDGER_PATH):
+        self.path = str(path)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        columns = [r[1] for r in self.conn.execute("PRAGMA table_info(posted)")]
+        self.conn.executescript(_MIGRATE_SEQ if columns and "seq" not in columns else _SCHEMA)
+        # Keys split_posted() let through that aren't recorded yet
+        self.reserved = set()
+
+    @classmethod
+    def from_env(cls):
+        """Ledger at NAV_POSTING_LEDGER (or the default path); None when set to off/0/false."""
+        val = os.environ.get("NAV_POSTING_LEDGER", "").strip()
+        if val.lower() in ("off", "0", "false", "no"):
+            return None
+        return cls(val or DEFAULT_LEDGER_PATH)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def posted_mask(self, keys):
+        """Boolean array, True where keys[i] is already in the ledger or reserved."""
+        keys = [tuple(k) for k in keys]
+        mask = np.zeros(len(keys), dtype=bool)
+        if not keys:
+            return mask
+        cur = self.conn.cursor()
+        cur.execute("CREATE TEMP TABLE IF NOT EXISTS probe "
+                    "(pos INTEGER, source TEXT, ref TEXT, invoice TEXT, code TEXT, amount_cents INTEGER, seq INTEGER)")
+        cur.execute("DELETE FROM probe")
+        cur.executemany("INSERT INTO probe VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        ((i,) + k for i, k in enumerate(keys)))
+        hits = cur.execute(
+            "SELECT p.pos FROM probe p JOIN posted t "
+            "ON t.source = p.source AND t.ref = p.ref AND t.invoice = p.invoice "
+            "AND t.code = p.code AND t.amount_cents = p.amount_cents AND t.seq = p.seq"
+        ).fetchall()
+        cur.execute("DELETE FROM probe")
+        if hits:
+            mask[np.fromiter((h[0] for h in hits), dtype=np.int64, count=len(hits))] = True
+        if self.reserved:
+            mask |= np.fromiter((k in self.reserved for k in keys), dtype=bool, count=len(keys))
+        return mask
+
+    def reserve(self, keys):
+        """Treat keys as posted for this connection until record() stores them."""
+        self.reserved.update(tuple(k) for k in keys)
+
+    def record(self, keys, output=None):
+        """Insert keys in one transaction (all or nothing); already-present keys are left alone."""
+        keys = [tuple(k) for k in keys]
+        now = datetime.now().isoformat(timespec="seconds")
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO posted (source, ref, invoice, code, amount_cents, seq, output, posted_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (k + (None if output is None else str(output), now) for k in keys),
+            )
+        self.reserved.difference_update(keys)
+
+    def forget(self, source, ref):
+        """Remove every key of one check/payment, e.g. after a batch was deleted in NAV."""
+        with self.conn:
+            cur = self.conn.execute("DELETE FROM posted WHERE source = ? AND ref = ?", (source, ref))
+        return cur.rowcount
+
+    def rows(self, source=None):
+        sql = "SELECT source, ref, invoice, code, amount_cents, seq, output, posted_at FROM posted"
+        args = ()
+        if source:
+            sql += " WHERE source = ?"
+            args = (source,)
+        return self.conn.execute(sql + " ORDER BY posted_at, source, ref", args).fetchall()
+
+
+def split_posted(ledger, keys, label, repost=False):
+    """
+    Shared entry-point behaviour: returns a keep-mask for the batch. Already-posted lines are
+    dropped (or kept with a warning when repost=True); the count is reported on stderr. The kept
+    keys are reserved until record(), so a second batch with the same lines in this run is dropped.
+    """
+    if ledger is None:
+        return np.ones(len(keys), dtype=bool)
+    posted = ledger.posted_mask(keys)
+    if posted.any():
+        action = "kept (repost)" if repost else "skipped"
+        print(f"WARNING: {int(posted.sum())} {label} line(s) already posted per {ledger.path}; {action}",
+              file=sys.stderr)
+    keep = np.ones(len(keys), dtype=bool) if repost else ~posted
+    ledger.reserve(k for k, f in zip(keys, keep) if f)
+    return keep
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect or edit the local posting ledger")
+    ap.add_argument("--ledger", default=os.environ.get("NAV_POSTING_LEDGER") or DEFAULT_LEDGER_PATH)
+    ap.add_argument("--forget", action="store_true", help="Delete all keys for --source/--ref")
+    ap.add_argument("--source")
+    ap.add_argument("--ref")
+    args = ap.parse_args()
+
+    with PostingLedger(args.ledger) as ledger:
+        if args.forget:
+            if not (args.source and args.ref):
+                ap.error("--forget needs --source and --ref")
+            print(f"Removed {ledger.forget(args.source, args.ref)} key(s)")
+        else:
+            for row in ledger.rows(args.source):
+                print("\t".join("" if v is None else str(v) for v in row))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+stage_profiler.py
+- Lightweight per-stage instrumentation shared by the processing scripts
+- Records wall time, CPU time and rows in/out for each stage
+- Enabled with --profile on the script command line, or NAV_PROFILE=1 / NAV_PROFILE=<trace path>
+- NAV_PROFILE_MEMORY=1 also records peak traced memory (plus traced memory at entry) per stage;
+  it is a separate opt-in because tracemalloc slows every allocation and inflates the timings
+- Emits one NDJSON record per stage to the trace file (default: nav_profile.ndjson)
+- NAV_PROFILE_CPROFILE=<stage name> also dumps a cProfile .prof file for that stage
+- When disabled, stage() hands back a shared no-op record (one flag check, no timers, no tracemalloc)
+"""
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+
+DEFAULT_TRACE_PATH = "nav_profile.ndjson"
+
+_state = {
+    "enabled": False,
+    "trace_path": None,
+    "cprofile_stage": None,
+    "run_id": None,
+    "stack": [],
+    "memory": False,
+    "owns_tracemalloc": False,
+}
+
+
+def row_count(obj):
+    """Rows in a DataFrame/list/dict-like result, or None when it has no length."""
+    if obj is None:
+        return None
+    shape = getattr(obj, "shape", None)
+    if shape is not None and len(shape) > 0:
+        return int(shape[0])
+    try:
+        return len(obj)
+    except TypeError:
+        return None
+
+
+def _env_flag(name):
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def enable(trace_path=None, cprofile_stage=None, memory=None):
+    """
+    Turn profiling on for this process; every stage appends a line to trace_path.
+    memory=True (default: NAV_PROFILE_MEMORY) also traces allocations with tracemalloc.
+    """
+    _state["enabled"] = True
+    _state["trace_path"] = Path(trace_path or DEFAULT_TRACE_PATH)
+    _state["cprofile_stage"] = cprofile_stage or os.environ.get("NAV_PROFILE_CPROFILE") or None
+    _state["run_id"] = f"{datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    _state["memory"] = _env_flag("NAV_PROFILE_MEMORY") if memory is None else bool(memory)
+    if _state["memory"] and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _state["owns_tracemalloc"] = True
+
+
+def disable():
+    _state["enabled"] = False
+    _state["stack"].clear()
+    if _state["owns_tracemalloc"] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _state["owns_tracemalloc"] = False
+    _state["memory"] = False
+
+
+def is_enabled():
+    return _state["enabled"]
+
+
+def configure_from_env():
+    """NAV_PROFILE=1 uses the default trace path; any other non-empty value is the path."""
+    val = os.environ.get("NAV_PROFILE", "").strip()
+    if not val or val.lower() in ("0", "false", "no", "off"):
+        return
+    path = None if val.lower() in ("1", "true", "yes", "on") else val
+    enable(path)
+
+
+class _NullStage:
+    """Returned while profiling is disabled; accepts rows_out and extra fields and drops them."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, name, rows_in=None, meta=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.meta = dict(meta or {})
+        self._peak_seen = 0
+        self._mem0 = None
+
+    def __enter__(self):
+        stack = _state["stack"]
+        if _state["memory"]:
+            if stack:
+                # Fold the parent's peak so far in before resetting for this stage
+                stack[-1]._peak_seen = max(stack[-1]._peak_seen, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self._mem0 = tracemalloc.get_traced_memory()[0]
+        stack.append(self)
+        self._profiler = None
+        if _state["cprofile_stage"] == self.name:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._cpu0 = time.process_time()
+        self._wall0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._wall0
+        cpu = time.process_time() - self._cpu0
+        if self._profiler is not None:
+            self._profiler.disable()
+            trace_path = _state["trace_path"]
+            prof_path = trace_path.with_name(f"{trace_path.stem}.{self.name}.prof")
+            self._profiler.dump_stats(str(prof_path))
+        peak = max(self._peak_seen, tracemalloc.get_traced_memory()[1]) if _state["memory"] else None
+        stack = _state["stack"]
+        if stack and stack[-1] is self:
+            stack.pop()
+        if stack and peak is not None:
+            stack[-1]._peak_seen = max(stack[-1]._peak_seen, peak)
+        record = {
+            "run_id": _state["run_id"],
+            "script": Path(sys.argv[0]).name if sys.argv and sys.argv[0] else None,
+            "stage": self.name,
+            "parent": stack[-1].name if stack else None,
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "mem_start_bytes": self._mem0,
+            "peak_mem_bytes": peak,
+            "ok": exc_type is None,
+            "ts": datetime.now().isoformat(timespec="seconds"),
+        }
+        record.update(self.meta)
+        _write_record(record)
+        return False
+
+
+def _write_record(record):
+    try:
+        with open(_state["trace_path"], "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(record, default=str) + "\n")
+    except OSError as e:
+        print(f"WARNING: failed to write profile trace {_state['trace_path']}: {e}", file=sys.stderr)
+
+
+def stage(name, rows_in=None, **meta):
+    """
+    Context manager timing one pipeline stage:
+
+        with stage("walmart.read", rows_in=n_files) as st:
+            df = read_check_files(input_dir)
+            st.rows_out = len(df)
+    """
+    if not _state["enabled"]:
+        return _NULL_STAGE
+    return _Stage(name, rows_in=rows_in, meta=meta)
+
+
+def profiled(name):
+    """
+    Decorator form of stage(). rows_in is taken from the first argument and rows_out
+    from the return value when either has a length.
+    """
+    def deco(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state["enabled"]:
+                return func(*args, **kwargs)
+            with _Stage(name, rows_in=row_count(args[0]) if args else None) as st:
+                result = func(*args, **kwargs)
+                st.rows_out = row_count(result)
+            return result
+        return wrapper
+    return deco
+
+
+configure_from_env()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+synthetic_data.py
+- Generates realistic synthetic inputs for every processing script (seeded, reproducible)
+- Walmart Check_*.xlsx frames: positive invoice lines with their [NNNN] deductions below them,
+  a few '|' filter rows and blank-invoice rows; amounts are numeric cells, or $1,234.56 /
+  ($1,234.56) text with money_text=True (the formatted remittance export)
+- Amazon remittance rows (dicts shaped like the rows process_chargebacks reads), with reversals
+  of earlier rows (full, partial or exceeding the original) and reversals with no original
+- COOP and Walmart CM TXT files (tab and 2+ space delimited)
+- Price adjustment, rebill and DRA audit trails
+- CLI: python synthetic_data.py --kind walmart --rows 10000 --out ./synthetic
+"""
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+WALMART_CODES = [
+    ("0100", "UNSEAL/QUANTITY ALLOWANCE"),
+    ("0022", "MERCHANDISE SHORTAGE"),
+    ("0024", "CARTON SHORTAGE FREIGHT"),
+    ("0780", "TRANSPORTATION RELATED BILLING"),
+    ("0059", "DEFECTIVE ALLOWANCE"),
+    ("0057", "QUANTITY DISC ALLOWANCE"),
+    ("0775", "MARKDOWN BILLING"),
+    ("0025", "POD/NO MERCHANDISE SHORTAGE"),
+    ("0088", "MERCHANDISE RETURNS"),
+    ("0762", "COMPLIANCE BILLING"),
+    ("0130", "SUBSTITUTION OVERCHARGE"),
+    ("0054", "WAREHOUSE ALLOWANCE"),
+    ("0087", "OTHER"),
+]
+
+WALMART_COLUMNS = [
+    "Invoice Number", "Invoice Date", "Date Paid", "Store Number", "DC Number", "Division",
+    "PO Number", "Micro Film Number", "Invoice Amount($)", "Discount Amount($)",
+    "Amount Paid($)", "DEDUCTION CODE", "Pay Type", "Tax Amount($)",
+]
+
+AMAZON_DESCRIPTIONS = [
+    "Co-op - Marketing Development Funds {inv}",
+    "Prep-Bagging - {inv}",
+    "Shortage Claim for Invoice {inv}",
+    "Missed Adjustment Claim for Invoice {inv}",
+    "Ship In Own Container - {inv}",
+    "Price Claim for Invoice {inv}",
+    "PO on-time accuracy - {inv}",
+    "PROVISION_FOR_RECEIVABLE, {inv}",
+    "Damage Allowance - {inv}",
+    "Quantity/Bulk Buy Allowance - {inv}",
+    "Bulk Buy Allowance - {inv}",
+]
+
+
+def parse_size(size):
+    """'10k' / '1M' / 2500 -> int row count."""
+    if isinstance(size, int):
+        return size
+    key = str(size).strip().lower()
+    return SIZES[key] if key in SIZES else int(key.replace("_", ""))
+
+
+def _money_strings(values):
+    """Format amounts the way the remittance exports do: $1,234.56 and ($1,234.56) for negatives."""
+    return [f"(${-v:,.2f})" if v < 0 else f"${v:,.2f}" for v in values]
+
+
+def make_walmart_check_frame(n_rows, seed=0, deduction_ratio=0.6, noise_ratio=0.01,
+                             base_date="2025-01-06", money_text=False):
+    """
+    One Walmart remittance detail frame with n_rows rows. Rows come in groups: a deduction
+    (negative, with a [NNNN] code) followed by its positive invoice line, matching invoice number,
+    store, DC and division, so fill_internal_invoice_dates has realistic work to do. Some
+    deductions reference invoices that are not on this check. noise_ratio of the rows are
+    '|' filter rows or blank-invoice rows that clean_rows_postparse has to drop.
+    money_text=True writes the amounts as formatted text instead of numbers (same values).
+    """
+    rng = np.random.default_rng(seed)
+    base = pd.Timestamp(base_date)
+    inv_numbers = rng.integers(10_000_000, 99_999_999, size=n_rows).astype(str)
+    is_deduction = rng.random(n_rows) < deduction_ratio
+    # Deductions copy the invoice/store/DC/division of the next row (their original invoice)
+    nxt = np.minimum(np.arange(n_rows) + 1, n_rows - 1)
+    has_original = is_deduction & ~is_deduction[nxt] & (rng.random(n_rows) < 0.8)
+
+    stores = rng.integers(1, 6000, size=n_rows).astype(str)
+    dcs = rng.choice(["6006", "6009", "6011", "6017", "6020", "7045"], size=n_rows)
+    divisions = rng.choice(["1", "18", "44"], size=n_rows, p=[0.8, 0.15, 0.05])
+    pos = np.arange(n_rows)
+    src = np.where(has_original, nxt, pos)
+    inv_numbers = inv_numbers[src]
+    stores, dcs, divisions = stores[src], dcs[src], divisions[src]
+    po_numbers = rng.integers(1_000_000_000, 9_999_999_999, size=n_rows).astype(str)[src]
+
+    amounts = np.round(rng.gamma(2.0, 150.0, size=n_rows), 2)
+    amounts = np.where(is_deduction, -np.round(amounts / 10, 2), amounts)
+    code_idx = rng.integers(0, len(WALMART_CODES), size=n_rows)
+    codes = np.where(
+        is_deduction,
+        [f"[{WALMART_CODES[i][0]}] {WALMART_CODES[i][1]}" for i in code_idx],
+        "",
+    )
+    inv_dates = base - pd.to_timedelta(rng.integers(5, 120, size=n_rows), unit="D")
+    paid = base + pd.to_timedelta(rng.integers(0, 3, size=n_rows), unit="D")
+
+    paid_amounts = _money_strings(amounts) if money_text else amounts
+    zero = "$0.00" if money_text else 0.0
+    df = pd.DataFrame({
+        "Invoice Number": inv_numbers,
+        "Invoice Date": inv_dates.strftime("%m/%d/%Y"),
+        "Date Paid": paid.strftime("%m/%d/%Y"),
+        "Store Number": stores,
+        "DC Number": dcs,
+        "Division": divisions,
+        "PO Number": po_numbers,
+        "Micro Film Number": rng.integers(100_000, 999_999, size=n_rows).astype(str),
+        "Invoice Amount($)": paid_amounts,
+        "Discount Amount($)": zero,
+        "Amount Paid($)": paid_amounts,
+        "DEDUCTION CODE": codes,
+        "Pay Type": "ACH",
+        "Tax Amount($)": zero,
+    }, columns=WALMART_COLUMNS)
+
+    noise = rng.random(n_rows) < noise_ratio
+    if noise.any():
+        idx = np.flatnonzero(noise)
+        half = len(idx) // 2
+        df.loc[idx[:half], "Invoice Number"] = "SI10000001|SI10000002"
+        df.loc[idx[half:], "Invoice Number"] = ""
+    return df
+
+
+def write_walmart_check_files(out_dir, n_rows, rows_per_check=2_000, seed=0, first_check=1_256_261):
+    """Split n_rows across Check_<9-digit>.xlsx files in out_dir; returns the written paths."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    remaining, k = n_rows, 0
+    while remaining > 0:
+        take = min(rows_per_check, remaining)
+        df = make_walmart_check_frame(take, seed=seed + k)
+        path = out_dir / f"Check_{first_check + k:09d}.xlsx"
+        df.to_excel(path, index=False)
+        paths.append(path)
+        remaining -= take
+        k += 1
+    return paths
+
+
+def make_amazon_remittance(n_rows, seed=0, reversal_ratio=0.03, starred_ratio=0.02, paired_ratio=0.03):
+    """
+    Amazon remittance rows: Invoice Number, Description, Amount Paid, Amount Remaining.
+    reversal_ratio of the rows reverse a chargeback that isn't in the file; paired_ratio reverse
+    an earlier row of the file (same invoice and description) in full, half or 125% of it, so
+    net_reversals has full, partial and exceeding pairs to net.
+    """
+    rng = np.random.default_rng(seed)
+    invoices = rng.integers(100_000_000, 999_999_999, size=n_rows)
+    desc_idx = rng.integers(0, len(AMAZON_DESCRIPTIONS), size=n_rows)
+    paid = -np.round(rng.gamma(1.5, 40.0, size=n_rows), 2)
+    remaining = np.where(rng.random(n_rows) < 0.1, -np.round(rng.random(n_rows) * 10, 2), 0.0)
+    reversal = rng.random(n_rows) < reversal_ratio
+    starred = rng.random(n_rows) < starred_ratio
+    paired = rng.random(n_rows) < paired_ratio
+    earlier = (rng.random(n_rows) * np.arange(n_rows)).astype(np.int64)
+    factor = rng.choice([1.0, 0.5, 1.25], size=n_rows, p=[0.5, 0.3, 0.2])
+    rows, totals = [], []
+    for i in range(n_rows):
+        inv = f"{invoices[i]}"
+        desc = AMAZON_DESCRIPTIONS[desc_idx[i]].format(inv=inv)
+        amt, rem = paid[i], remaining[i]
+        j = earlier[i]
+        if paired[i] and i and totals[j] is not None:
+            # Reverse row j: its invoice and description, the opposite sign of (part of) its total
+            inv, desc = rows[j]["Invoice Number"], f"Reversal for {rows[j]['Description']}"
+            amt, rem = round(-totals[j] * factor[i], 2), 0.0
+        elif reversal[i]:
+            desc = f"Reversal for {desc}"
+            amt = -amt
+        amt_str = f"({-amt:,.2f})" if amt < 0 else f"{amt:,.2f}"
+        if starred[i]:
+            amt_str += "*"
+        rows.append({
+            "Invoice Number": inv,
+            "Description": desc,
+            "Amount Paid": amt_str,
+            "Amount Remaining": f"{rem:.2f}",
+        })
+        # Only plain chargebacks can be reversed later
+        plain = not starred[i] and not desc.startswith("Reversal for")
+        totals.append(round(amt + rem, 2) if plain else None)
+    return rows
+
+
+def write_txt_file(path, n_rows, kind="coop", seed=0):
+    """
+    COOP: customer, invoice (SI... or free-text description), amount; mixed tab/2+ space delimiters.
+    Walmart CM: customer, chargeback number, amount; 2+ space delimited.
+    """
+    rng = np.random.default_rng(seed)
+    customers = rng.choice(["8501", "1287", "C00123", "C00456"], size=n_rows)
+    amounts = np.round(rng.gamma(2.0, 250.0, size=n_rows), 2)
+    numbers = rng.integers(100_000, 999_999, size=n_rows)
+    use_tab = rng.random(n_rows) < 0.5
+    is_si = rng.random(n_rows) < 0.7
+    lines = []
+    for i in range(n_rows):
+        if kind == "coop":
+            middle = f"SI{numbers[i]}" if is_si[i] else f"Q{numbers[i] % 4 + 1} CIRCULAR  AD  {numbers[i]}"
+            sep = "\t" if use_tab[i] else "   "
+            lines.append(f"{customers[i]}{sep}{middle}{sep}${amounts[i]:,.2f}")
+        elif kind == "walmart_cm":
+            lines.append(f"{customers[i]}    CB{numbers[i]:07d}    {amounts[i]:.2f}")
+        else:
+            raise ValueError(f"Unknown TXT kind: {kind}")
+    Path(path).write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return Path(path)
+
+
+def make_walmart_cm_descriptions(n_rows, seed=0):
+    """Descriptions aligned with write_txt_file(kind='walmart_cm') records."""
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(WALMART_CODES), size=n_rows)
+    return [f"{WALMART_CODES[i][1]} {1000 + k}" for k, i in enumerate(idx)]
+
+
+def make_price_data(n_rows, seed=0):
+    """(item_no, PO_price, Invoice_price, qty) tuples; ~70% of lines are overcharged."""
+    rng = np.random.default_rng(seed)
+    po = np.round(rng.uniform(2, 200, size=n_rows), 2)
+    inv = np.round(po + np.where(rng.random(n_rows) < 0.7, rng.uniform(0.01, 5, size=n_rows), 0), 2)
+    qty = rng.integers(1, 48, size=n_rows)
+    return [(f"ITEM{i:06d}", float(po[i]), float(inv[i]), int(qty[i])) for i in range(n_rows)]
+
+
+def make_audit_trails(n_rows, seed=0, n_invoices=None):
+    """(invoice, item_no, qty, unit_price) tuples used by the DRA and rebill exporters."""
+    rng = np.random.default_rng(seed)
+    n_invoices = n_invoices or max(1, n_rows // 20)
+    inv = rng.integers(500_000, 600_000, size=n_invoices)
+    pick = rng.integers(0, n_invoices, size=n_rows)
+    qty = rng.integers(1, 12, size=n_rows)
+    price = np.round(rng.uniform(1, 300, size=n_rows), 2)
+    return [(f"SI{inv[pick[i]]}", f"ITEM{i:06d}", int(qty[i]), float(price[i])) for i in range(n_rows)]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Write synthetic inputs for the NAV processing scripts")
+    ap.add_argument("--kind", required=True, choices=["walmart", "coop", "walmart_cm"])
+    ap.add_argument("--rows", default="10k", help="Row count: 1k, 10k, 100k, 1m or an integer")
+    ap.add_argument("--out", required=True, help="Output directory")
+    ap.add_argument("--rows-per-check", type=int, default=2_000)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    n = parse_size(args.rows)
+    out = Path(args.out)
+    if args.kind == "walmart":
+        paths = write_walmart_check_files(out, n, rows_per_check=args.rows_per_check, seed=args.seed)
+        print(f"Wrote {len(paths)} Check_*.xlsx files ({n} rows) to: {out}")
+    else:
+        out.mkdir(parents=True, exist_ok=True)
+        path = write_txt_file(out / f"{args.kind}_{args.rows}.txt", n, kind=args.kind, seed=args.seed)
+        print(f"Wrote {n} rows to: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+txt_chunks.py
+- Parallel reader for the large COOP / Walmart CM TXT uploads (year-end true-ups reach gigabytes)
+- The file is memory-mapped and cut into newline-aligned byte ranges; each range is decoded and
+  parsed line by line in a process pool with the caller's per-line parser (the worker processes
+  rebuild it from the script's SCRIPTS key, since the scripts aren't importable modules)
+- Range results are concatenated in file order, so records (and the ASCR numbers assigned from
+  them) come out exactly as the sequential reader produces them
+- Lines are split the way text-mode open() splits them (universal newlines), so both paths see
+  the same lines
+- Files under PARALLEL_MIN_BYTES (or workers=1) take the sequential path; NAV_TXT_WORKERS=<n>
+  sets the default pool size (default: CPU count)
+"""
+import io
+import locale
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from nav_scripts import load_script
+
+PARALLEL_MIN_BYTES = 32 * 1024 * 1024
+CHUNKS_PER_WORKER = 4
+
+
+def workers_from_env():
+    val = os.environ.get("NAV_TXT_WORKERS", "").strip()
+    return int(val) if val.isdigit() and int(val) > 0 else (os.cpu_count() or 1)
+
+
+def line_ranges(buf, count):
+    """(start, end) byte ranges covering buf, `count` at most, each ending just after a newline (or at EOF)."""
+    size = len(buf)
+    step = max(1, size // max(1, count))
+    ranges, start = [], 0
+    while start < size:
+        cut = buf.find(b"\n", min(start + step, size) - 1)
+        end = size if cut < 0 else cut + 1
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def parse_lines(lines, parse_line):
+    """Records from an iterable of text lines; parse_line returns a record or None."""
+    out = []
+    for line in lines:
+        rec = parse_line(line)
+        if rec is not None:
+            out.append(rec)
+    return out
+
+
+def _parse_range(task):
+    """Worker: decode one byte range of the file and parse it with the caller's line parser."""
+    path, start, end, encoding, parse_line, script_key = task
+    if script_key is not None:
+        parse_line = getattr(load_script(script_key), parse_line)
+    with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        text = mm[start:end].decode(encoding)
+    return parse_lines(io.StringIO(text, newline=None), parse_line)
+
+
+def read_records(path, parse_line, script_key=None, encoding=None, workers=None):
+    """
+    Parse a TXT file with parse_line(line) -> record | None. Large files are split into
+    newline-aligned ranges parsed in a process pool; results keep file order. script_key
+    (SCRIPTS key of the module defining parse_line) lets the workers look the parser up by name;
+    without it parse_line itself must be picklable.
+    encoding=None uses the locale encoding, like open() without one.
+    """
+    path = Path(path)
+    encoding = encoding or locale.getpreferredencoding(False)
+    workers = workers or workers_from_env()
+    size = path.stat().st_size
+    if workers <= 1 or size < PARALLEL_MIN_BYTES:
+        with open(path, "r", encoding=encoding) as fh:
+            return parse_lines(fh, parse_line)
+
+    with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        ranges = line_ranges(mm, workers * CHUNKS_PER_WORKER)
+    func = parse_line.__name__ if script_key is not None else parse_line
+    tasks = [(str(path), a, b, encoding, func, script_key) for a, b in ranges]
+    records = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        for part in pool.map(_parse_range, tasks):
+            records.extend(part)
+    return records